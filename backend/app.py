@@ -7,14 +7,19 @@ from collections import defaultdict, deque
 from typing import Deque, Dict
 
 from flask import Flask, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_socketio import SocketIO
 
-from . import auth, chat, hazards, posts, disasters
+from . import auth, bus, chat, hazards, images, live, posts, disasters, schemas, sync
 from .validators import ValidationError
 
 FRONTEND_ORIGIN = os.environ.get("FRONTEND_ORIGIN", "http://localhost:5173")
 RATE_LIMIT = int(os.environ.get("RATE_LIMIT", 120))
 RATE_WINDOW = int(os.environ.get("RATE_WINDOW", 60))
+# backend.serve switches this to "gevent"; the dev server stays on threads
+SOCKETIO_ASYNC_MODE = os.environ.get("SOCKETIO_ASYNC_MODE", "threading")
+SOCKETIO_PING_INTERVAL = float(os.environ.get("SOCKETIO_PING_INTERVAL", 25))
+SOCKETIO_PING_TIMEOUT = float(os.environ.get("SOCKETIO_PING_TIMEOUT", 20))
 
 
 class SimpleRateLimiter:
@@ -37,8 +42,19 @@ class SimpleRateLimiter:
         return True
 
 
+class RecordJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, taught to encode the stored record types."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, schemas.SlotRecord):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
+
 def create_app() -> Flask:
     app = Flask(__name__)
+    app.json = RecordJSONProvider(app)
     app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-secret")
     app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
     app.config["SESSION_COOKIE_HTTPONLY"] = True
@@ -71,17 +87,32 @@ def create_app() -> Flask:
     app.register_blueprint(disasters.bp)
     app.register_blueprint(chat.bp)
     app.register_blueprint(hazards.bp)
+    app.register_blueprint(images.bp)
+    app.register_blueprint(sync.bp)
 
     @app.route("/health")
     def health():
         return jsonify({"ok": True})
 
+    @app.route("/metrics")
+    def metrics():
+        return jsonify({"principal_cache": auth.principals.stats(), "chat_writer": chat.writer.stats()})
+
     return app
 
 
 app = create_app()
-socketio = SocketIO(app, cors_allowed_origins="*", manage_session=True)
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    manage_session=True,
+    async_mode=SOCKETIO_ASYNC_MODE,
+    ping_interval=SOCKETIO_PING_INTERVAL,
+    ping_timeout=SOCKETIO_PING_TIMEOUT,
+    **bus.socketio_options(),
+)
 chat.register_socketio(socketio)
+live.register_socketio(socketio)
 
 
 if __name__ == "__main__":
@@ -1,44 +1,147 @@
 """Authentication blueprint handling register/login/session helpers."""
 from __future__ import annotations
 
-from pathlib import Path
-from typing import Dict, Optional
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
 
 import bcrypt
 from flask import Blueprint, jsonify, request, session
 
 from . import storage
+from .indexes import HashIndex
 from .schemas import user_schema
 from .validators import ValidationError, require_fields, validate_email, validate_password
 
-USERS_PATH = Path("users.json")
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL = float(os.environ.get("PRINCIPAL_CACHE_TTL", 30))
 
 bp = Blueprint("auth", __name__, url_prefix="/api")
 
 
+class PrincipalCache:
+    """
+    Bounded LRU of sanitized users keyed by id, each entry valid for ``ttl`` seconds.
+
+    Changes committed by this process invalidate entries immediately; the TTL
+    bounds how long a change made by another worker can go unnoticed.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, Tuple[float, Dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, user_id: str, principal: Dict, generation: int) -> None:
+        """Cache ``principal`` unless an invalidation happened since ``generation``."""
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[user_id] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """Forget ``user_id`` (or everyone when omitted)."""
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+principals = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+
 def _sanitize(user: Dict) -> Dict:
     data = user.copy()
     data.pop("password_hash", None)
     return data
 
 
-def _load_users() -> list[Dict]:
-    return storage.read_json(USERS_PATH)
+storage.register_index("users", "id", lambda: HashIndex(lambda user: user["id"]))
+storage.register_index("users", "email", lambda: HashIndex(lambda user: user["email"].lower()))
 
 
 def get_user_by_id(user_id: str) -> Optional[Dict]:
-    return next((u for u in _load_users() if u["id"] == user_id), None)
+    with storage.indexed("users", "id") as by_id:
+        return by_id.get(user_id)
 
 
 def get_user_by_email(email: str) -> Optional[Dict]:
-    return next((u for u in _load_users() if u["email"] == email.lower()), None)
+    with storage.indexed("users", "email") as by_email:
+        return by_email.get(email.lower())
+
+
+def _on_users_changed(changes) -> None:
+    if changes is None:
+        principals.invalidate()
+        return
+    for old, new in changes:
+        principals.invalidate((old or new)["id"])
+
+
+storage.subscribe("users", _on_users_changed)
+
+
+def get_principal(user_id: str) -> Optional[Dict]:
+    """Sanitized user for ``user_id``, served from the principal cache when possible."""
+    principal = principals.get(user_id)
+    if principal is not None:
+        return principal
+    generation = principals.generation
+    user = get_user_by_id(user_id)
+    if not user:
+        return None
+    principal = _sanitize(user)
+    principals.put(user_id, principal, generation)
+    return principal
 
 
 def require_auth() -> Dict:
+    """Return the signed-in user's principal (sanitized, shared: don't mutate)."""
     user_id = session.get("user_id")
     if not user_id:
         raise ValidationError("Authentication required")
-    user = get_user_by_id(user_id)
+    user = get_principal(user_id)
     if not user:
         raise ValidationError("Session expired")
     return user
@@ -60,11 +163,7 @@ def register():
     password_hash = bcrypt.hashpw(payload["password"].encode(), bcrypt.gensalt()).decode()
     new_user = user_schema(payload["email"], payload["name"], password_hash)
 
-    def _insert(users: list[Dict]):
-        users.append(new_user)
-        return users
-
-    storage.update_json(USERS_PATH, _insert)
+    storage.put("users", new_user)
     session["user_id"] = new_user["id"]
     return jsonify(_sanitize(new_user)), 201
 
@@ -97,5 +196,4 @@ def me():
     user_id = session.get("user_id")
     if not user_id:
         return jsonify({"user": None})
-    user = get_user_by_id(user_id)
-    return jsonify({"user": _sanitize(user) if user else None})
+    return jsonify({"user": get_principal(user_id)})
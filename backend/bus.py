@@ -0,0 +1,216 @@
+"""Cross-process Socket.IO fan-out.
+
+Each backend process only knows the sockets connected to it, so room emits
+have to travel through a shared bus to reach clients of the other workers.
+``SOCKETIO_BUS`` selects it:
+
+* unset: single process, emits reach local clients only;
+* ``redis://``, ``rediss://``, ``kafka://``, ``zmq+tcp://``, ``amqp://``, ...:
+  handed to Flask-SocketIO as its ``message_queue`` (install the matching
+  client package);
+* ``local:///path/to/bus.sock``: ``LocalBusManager`` talking to a
+  ``LocalBroker`` on a UNIX socket, for development and tests on one host.
+  Start the broker with ``python -m backend.bus /path/to/bus.sock``.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import socketio
+
+SOCKETIO_BUS = os.environ.get("SOCKETIO_BUS", "")
+SOCKETIO_CHANNEL = os.environ.get("SOCKETIO_CHANNEL", "relink")
+LOCAL_SCHEME = "local://"
+RECONNECT_DELAY = 0.5
+
+_FRAME = struct.Struct("!I")
+# first frame of every broker connection: does the peer want to receive?
+_PUBLISHER, _SUBSCRIBER = b"pub", b"sub"
+
+
+def _send_frame(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(_FRAME.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv_frame(sock: socket.socket) -> Optional[bytes]:
+    header = _recv_exact(sock, _FRAME.size)
+    if header is None:
+        return None
+    return _recv_exact(sock, _FRAME.unpack(header)[0])
+
+
+class LocalBroker:
+    """Relays every frame a peer sends to all subscribed peers, sender included."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._server: Optional[socket.socket] = None
+        self._subscribers: List[socket.socket] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> "LocalBroker":
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # left behind by a broker that did not shut down
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen()
+        threading.Thread(target=self._accept, name="bus-accept", daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        with self._lock:
+            for peer in self._subscribers:
+                peer.close()
+            self._subscribers.clear()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def serve_forever(self) -> None:
+        self.start()
+        try:
+            while True:
+                time.sleep(3600)
+        finally:
+            self.close()
+
+    def _accept(self) -> None:
+        while self._server is not None:
+            try:
+                peer, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(peer,), name="bus-peer", daemon=True).start()
+
+    def _serve(self, peer: socket.socket) -> None:
+        try:
+            role = _recv_frame(peer)
+            if role == _SUBSCRIBER:
+                with self._lock:
+                    self._subscribers.append(peer)
+            while (frame := _recv_frame(peer)) is not None:
+                self._relay(frame)
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                if peer in self._subscribers:
+                    self._subscribers.remove(peer)
+            peer.close()
+
+    def _relay(self, frame: bytes) -> None:
+        with self._lock:
+            for subscriber in list(self._subscribers):
+                try:
+                    _send_frame(subscriber, frame)
+                except OSError:
+                    self._subscribers.remove(subscriber)
+                    subscriber.close()
+
+
+class LocalBusManager(socketio.PubSubManager):
+    """Socket.IO client manager publishing through a ``LocalBroker``."""
+
+    name = "local"
+
+    def __init__(
+        self,
+        url: str = "local:///tmp/relink-bus.sock",
+        channel: str = "socketio",
+        write_only: bool = False,
+        logger: Any = None,
+        json: Any = None,
+    ):
+        if not url.startswith(LOCAL_SCHEME):
+            raise ValueError(f"Expected a {LOCAL_SCHEME} URL, got {url!r}")
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = url[len(LOCAL_SCHEME) :]
+        self._publisher: Optional[socket.socket] = None
+        self._publish_lock = threading.Lock()
+
+    def _connect(self, role: bytes) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+            _send_frame(sock, role)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _publish(self, data: Dict[str, Any]) -> None:
+        payload = self.json.dumps({"channel": self.channel, "data": data}).encode()
+        with self._publish_lock:
+            # retry once on a fresh connection in case the broker restarted
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = self._connect(_PUBLISHER)
+                    _send_frame(self._publisher, payload)
+                    return
+                except OSError:
+                    if self._publisher is not None:
+                        self._publisher.close()
+                        self._publisher = None
+                    if attempt:
+                        raise
+
+    def _listen(self) -> Iterator[Dict[str, Any]]:
+        # the base class gives up on the bus if this generator ends, so it
+        # reconnects for as long as the process runs
+        while True:
+            try:
+                sock = self._connect(_SUBSCRIBER)
+            except OSError:
+                time.sleep(RECONNECT_DELAY)
+                continue
+            try:
+                while (frame := _recv_frame(sock)) is not None:
+                    message = self.json.loads(frame)
+                    if message.get("channel") == self.channel:
+                        yield message["data"]
+            except OSError:
+                pass
+            finally:
+                sock.close()
+            time.sleep(RECONNECT_DELAY)
+
+
+def socketio_options(url: str = SOCKETIO_BUS, channel: str = SOCKETIO_CHANNEL) -> Dict[str, Any]:
+    """Keyword arguments for ``SocketIO(...)`` wiring it to the configured bus."""
+    if not url:
+        return {}
+    if url.startswith(LOCAL_SCHEME):
+        return {"client_manager": LocalBusManager(url, channel=channel)}
+    return {"message_queue": url, "channel": channel}
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description="Run the local Socket.IO bus broker.")
+    parser.add_argument("path", nargs="?", default="/tmp/relink-bus.sock", help="UNIX socket to listen on")
+    args = parser.parse_args()
+    print(f"Relaying Socket.IO messages on {args.path}; set SOCKETIO_BUS=local://{args.path}")
+    LocalBroker(args.path).serve_forever()
+
+
+if __name__ == "__main__":
+    run()
@@ -1,28 +1,211 @@
 """Chat HTTP + Socket.IO handlers."""
 from __future__ import annotations
 
-from pathlib import Path
-from typing import Dict, List
+import atexit
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 
 from flask import Blueprint, jsonify, request
 from flask_socketio import Namespace, SocketIO, emit, join_room
 
 from .auth import require_auth
 from . import storage
-from .schemas import message_schema
+from .schemas import id_time, message_schema
 from .validators import ValidationError
 
-CHATS_PATH = Path("chats.json")
-
 bp = Blueprint("chat", __name__, url_prefix="/api")
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+CHAT_FLUSH_MS = float(os.environ.get("CHAT_FLUSH_MS", 5))
+CHAT_MAX_BATCH = int(os.environ.get("CHAT_MAX_BATCH", 512))
+# "batch": one fsync per group commit; "message": one fsync per message
+CHAT_FSYNC = os.environ.get("CHAT_FSYNC", "batch").lower()
+
+log = logging.getLogger(__name__)
+
+
+class MessageWriter:
+    """
+    Write-behind queue for chat messages.
+
+    ``submit`` only enqueues, so the sender's broadcast never waits on disk. A
+    background thread waits up to ``flush_ms`` for a batch to fill (or until
+    ``max_batch`` messages are pending) and appends the messages of every chat
+    in one storage call. ``sync`` blocks until everything submitted so far is
+    on disk; ``close`` drains the queue and runs at interpreter exit.
+    """
+
+    def __init__(self, flush_ms: float, max_batch: int, fsync: str = "batch"):
+        if fsync not in ("batch", "message"):
+            raise ValueError(f"Unknown CHAT_FSYNC {fsync!r}; expected batch or message")
+        self.flush_interval = flush_ms / 1000
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self._pending: List[Tuple[str, Dict]] = []
+        self._cond = threading.Condition()
+        self._submitted = 0
+        self._done = 0
+        self._waiting = 0
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.failed = 0
+
+    def submit(self, chat_id: str, message: Dict) -> None:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Message writer is closed")
+            self._pending.append((chat_id, message))
+            self._submitted += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+                self._thread.start()
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+
+    def sync(self) -> None:
+        """Wait until every message submitted before the call has been written."""
+        with self._cond:
+            target = self._submitted
+            self._waiting += 1
+            self._cond.notify_all()
+            try:
+                while self._done < target:
+                    self._cond.wait()
+            finally:
+                self._waiting -= 1
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "written": self._done - self.failed,
+                "failed": self.failed,
+                "batches": self.batches,
+            }
+
+    def _next_batch(self) -> List[Tuple[str, Dict]]:
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            # let the batch fill unless it is full, someone is waiting on it,
+            # or we are shutting down
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._pending) < self.max_batch and not self._waiting and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            try:
+                self._write(batch)
+            except Exception:
+                # the messages were already broadcast; record the loss and keep going
+                log.exception("Failed to persist %d chat messages", len(batch))
+                failed = len(batch)
+            else:
+                failed = 0
+            with self._cond:
+                self._done += len(batch)
+                self.failed += failed
+                self.batches += 1
+                self._cond.notify_all()
 
-def _load_chats() -> List[Dict]:
-    return storage.read_json(CHATS_PATH)
+    def _write(self, batch: List[Tuple[str, Dict]]) -> None:
+        if self.fsync == "message":
+            for chat_id, message in batch:
+                storage.append_log("messages", chat_id, [message])
+            return
+        by_chat: Dict[str, List[Dict]] = {}
+        for chat_id, message in batch:
+            by_chat.setdefault(chat_id, []).append(message)
+        storage.append_logs("messages", by_chat)
+
+
+writer = MessageWriter(CHAT_FLUSH_MS, CHAT_MAX_BATCH, CHAT_FSYNC)
+atexit.register(writer.close)
 
 
 def _get_chat(chat_id: str) -> Dict | None:
-    return next((c for c in _load_chats() if c["id"] == chat_id), None)
+    return storage.get("chats", chat_id)
+
+
+# one migration at a time, so two readers of a legacy chat don't both append
+_moving = threading.Lock()
+
+
+def move_inline_messages(chat_id: str) -> int:
+    """
+    Move messages stored inside a pre-log chat record into its message log.
+
+    The messages are appended first, skipping ids the log already holds, and
+    only then stripped from the chat, so a crash or failed append in between
+    leaves them in place for the next attempt instead of losing them.
+    """
+    with _moving:
+        chat = storage.get("chats", chat_id)
+        if chat is None or "messages" not in chat:
+            return 0
+        logged = {message["id"] for message in storage.read_log("messages", chat_id)}
+        missing = [message for message in chat["messages"] if message["id"] not in logged]
+        if missing:
+            storage.append_log("messages", chat_id, missing)
+        moved = logged | {message["id"] for message in missing}
+
+        def _strip(chat: Dict) -> Dict | None:
+            if "messages" not in chat:
+                return None
+            rest = [message for message in chat["messages"] if message["id"] not in moved]
+            if rest:
+                chat["messages"] = rest
+            else:
+                del chat["messages"]
+            return chat
+
+        storage.update("chats", chat_id, _strip)
+        return 1
+
+
+def _cursor(message: Dict) -> str:
+    return f"{message['ts']}:{message['id']}"
+
+
+def _parse_cursor(cursor: Optional[str]) -> Optional[storage.LogCursor]:
+    """
+    ``ts:id`` from a previous page, a bare message id (whose time-ordered id
+    carries its ``ts``), or a bare ``ts``, which stands for the whole second:
+    ``after=<ts>`` starts past its end and ``before=<ts>`` stops short of its
+    start.
+    """
+    if not cursor:
+        return None
+    ts, _, message_id = cursor.partition(":")
+    if not message_id and not ts.isdigit():
+        ms = id_time(ts)
+        if ms is None:
+            raise ValueError(cursor)
+        return (ms // 1000, ts)
+    return (int(ts), message_id or None)
 
 
 @bp.route("/chats/<chat_id>/messages", methods=["GET"])
@@ -33,9 +216,32 @@ def list_messages(chat_id: str):
         return jsonify({"error": "Chat not found"}), 404
     if user["id"] not in chat["member_ids"]:
         return jsonify({"error": "Join the offer to chat"}), 403
-    after = int(request.args.get("after", 0))
-    messages = [m for m in chat["messages"] if m["ts"] > after]
-    return jsonify({"messages": messages})
+    args = request.args
+    try:
+        limit = min(int(args.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        after = _parse_cursor(args.get("after"))
+        before = _parse_cursor(args.get("before"))
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+    if limit < 1:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+    if "messages" in chat:
+        move_inline_messages(chat_id)
+    # read your own writes: messages are broadcast before they are persisted
+    writer.sync()
+
+    # one extra entry tells us whether another page follows
+    messages = storage.read_log(
+        "messages",
+        chat_id,
+        after=after,
+        before=before,
+        limit=limit + 1,
+        descending=args.get("order") == "desc",
+    )
+    more = len(messages) > limit
+    messages = messages[:limit]
+    return jsonify({"messages": messages, "next_cursor": _cursor(messages[-1]) if more else None})
 
 
 def register_socketio(socketio: SocketIO) -> None:
@@ -69,20 +275,12 @@ def register_socketio(socketio: SocketIO) -> None:
             if not text or not chat_id:
                 emit("error", {"error": "Missing chat_id/text"})
                 return
-            chats = _load_chats()
-            chat = next((c for c in chats if c["id"] == chat_id), None)
+            chat = _get_chat(chat_id)
             if not chat or user["id"] not in chat["member_ids"]:
                 emit("error", {"error": "Not allowed"})
                 return
             msg = message_schema(user["id"], text)
-            def _persist(entries: List[Dict]) -> List[Dict]:
-                for entry in entries:
-                    if entry["id"] == chat_id:
-                        entry["messages"].append(msg)
-                        break
-                return entries
-
-            storage.update_json(CHATS_PATH, _persist)
+            writer.submit(chat_id, msg)
             emit("message", {"chat_id": chat_id, "message": msg}, room=chat_id)
 
     socketio.on_namespace(ChatNamespace(ChatNamespace.namespace))
@@ -2,15 +2,25 @@
 from __future__ import annotations
 
 import json
+import os
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 from flask import Blueprint, jsonify
 
+from . import storage
+from .http_cache import conditional
+
 DATA_DIR = Path(__file__).resolve().parent.parent / "frontend" / "disaster"
-EONET_URL = "https://eonet.gsfc.nasa.gov/api/v3/events?status=open&days=7"
+EONET_URL = os.environ.get("EONET_URL", "https://eonet.gsfc.nasa.gov/api/v3/events?status=open&days=7")
+# seconds between background polls; older data is still served, but revalidated
+EONET_REFRESH = float(os.environ.get("EONET_REFRESH", 300))
+EONET_TIMEOUT = float(os.environ.get("EONET_TIMEOUT", 10))
+EONET_CACHE_FILE = Path("eonet_events.json")
 MAJOR_CATEGORIES = {
     "Wildfires",
     "Severe Storms",
@@ -22,6 +32,14 @@ MAJOR_CATEGORIES = {
 bp = Blueprint("disaster", __name__, url_prefix="/api/disaster")
 
 
+def _file_version(name: str):
+    try:
+        stat = os.stat(DATA_DIR / name)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
 def _load_file(name: str) -> List[Dict[str, Any]]:
     path = DATA_DIR / name
     if not path.exists():
@@ -31,24 +49,19 @@ def _load_file(name: str) -> List[Dict[str, Any]]:
 
 
 @bp.route("/map", methods=["GET"])
+@conditional(lambda: _file_version("locations.json"))
 def map_locations():
     return jsonify({"locations": _load_file("locations.json")})
 
 
 @bp.route("/areas", methods=["GET"])
+@conditional(lambda: _file_version("regions.json"))
 def area_polygons():
     return jsonify({"areas": _load_file("regions.json")})
 
 
-@bp.route("/events", methods=["GET"])
-def live_events():
-    try:
-        resp = requests.get(EONET_URL, timeout=10)
-        resp.raise_for_status()
-        payload = resp.json()
-    except requests.RequestException:
-        return jsonify({"error": "Unable to fetch live events"}), 502
-
+def _major_events(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Reduce an EONET response to major events with coordinates, newest first."""
     events: List[Dict[str, Any]] = []
     for event in payload.get("events", []):
         categories = {item["title"] for item in event.get("categories", [])}
@@ -82,4 +95,104 @@ def live_events():
         key=lambda item: item.get("date") or "",
         reverse=True,
     )
-    return jsonify({"events": events})
+    return events
+
+
+class EventFeed:
+    """
+    Upstream EONET events kept in memory by a background poller.
+
+    Requests never wait on NASA once something has been fetched: data older
+    than ``refresh`` seconds is served as-is while one background fetch
+    revalidates it. Only a cold start with no copy on disk waits, and
+    concurrent waiters share a single upstream request.
+    """
+
+    def __init__(self, url: str, refresh: float, timeout: float = EONET_TIMEOUT):
+        self.url = url
+        self.refresh_interval = refresh
+        self.timeout = timeout
+        self._events: Optional[List[Dict[str, Any]]] = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._inflight: Optional[threading.Event] = None
+        self._poller: Optional[threading.Thread] = None
+        self.fetches = 0
+        self.failures = 0
+
+    def events(self) -> Tuple[Optional[List[Dict[str, Any]]], float]:
+        """Current events and when they were fetched; ``None`` if none could be loaded."""
+        self._start_poller()
+        if self._events is None:
+            self._load_cached()
+        if self._events is None:
+            self.refresh(wait=True)
+        elif time.time() - self._fetched_at > self.refresh_interval:
+            self.refresh(wait=False)
+        return self._events, self._fetched_at
+
+    def refresh(self, *, wait: bool = True) -> None:
+        """Fetch upstream unless a fetch is already running; optionally wait for it."""
+        with self._lock:
+            flight = self._inflight
+            leader = flight is None
+            if leader:
+                flight = self._inflight = threading.Event()
+        if leader and wait:
+            self._fetch(flight)
+        elif leader:
+            threading.Thread(target=self._fetch, args=(flight,), name="eonet-refresh", daemon=True).start()
+        elif wait:
+            flight.wait(self.timeout * 2)
+
+    def _fetch(self, flight: threading.Event) -> None:
+        try:
+            resp = requests.get(self.url, timeout=self.timeout)
+            resp.raise_for_status()
+            events = _major_events(resp.json())
+        except (requests.RequestException, ValueError):
+            self.failures += 1
+        else:
+            fetched_at = time.time()
+            with self._lock:
+                self._events, self._fetched_at = events, fetched_at
+                self.fetches += 1
+            storage.write_json(EONET_CACHE_FILE, {"fetched_at": fetched_at, "events": events})
+        finally:
+            with self._lock:
+                self._inflight = None
+            flight.set()
+
+    def _load_cached(self) -> None:
+        """Warm start from the copy the last fetch left on disk."""
+        if not (storage.get_data_dir() / EONET_CACHE_FILE).exists():
+            return
+        cached = storage.read_json(EONET_CACHE_FILE)
+        with self._lock:
+            if self._events is None and isinstance(cached, dict):
+                self._events, self._fetched_at = cached["events"], cached["fetched_at"]
+
+    def _start_poller(self) -> None:
+        if self._poller is not None:
+            return
+        with self._lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name="eonet-poller", daemon=True)
+                self._poller.start()
+
+    def _poll(self) -> None:
+        while True:
+            time.sleep(self.refresh_interval)
+            self.refresh(wait=True)
+
+
+feed = EventFeed(EONET_URL, EONET_REFRESH)
+
+
+@bp.route("/events", methods=["GET"])
+@conditional(lambda: feed.events()[1])
+def live_events():
+    events, fetched_at = feed.events()
+    if events is None:
+        return jsonify({"error": "Unable to fetch live events"}), 502
+    return jsonify({"events": events, "updated_at": int(fetched_at)})
@@ -0,0 +1,159 @@
+"""On-disk encodings for files written through ``storage.write_json``.
+
+``RELINK_FORMAT`` picks how they are written:
+
+* ``json`` (default): compact JSON, via orjson when it is installed;
+* ``pretty``: indented JSON, the original layout, handy for hand-editing;
+* ``msgpack``: MessagePack behind a magic header; needs ``msgpack``, and
+  falls back to compact JSON without it.
+
+``RELINK_FORMATS`` overrides the choice per file stem, e.g.
+``posts=msgpack,users=pretty``. Reads sniff the encoding from the first bytes,
+so files keep their names and switching formats needs no migration: each file
+is converted on its next write.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from .schemas import plain
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised when orjson is absent
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - exercised when msgpack is absent
+    msgpack = None
+
+log = logging.getLogger(__name__)
+
+# JSON can't start with a NUL byte, so this can't be mistaken for it
+MSGPACK_MAGIC = b"\x00RLMP1\n"
+
+
+class Format:
+    """Turns a JSON-friendly payload into bytes and back."""
+
+    name = "base"
+
+    def dump(self, payload: Any) -> bytes:
+        raise NotImplementedError
+
+    def load(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+    def dump_records(self, records: Sequence[Any]) -> Tuple[bytes, List[Tuple[int, int]]]:
+        """Encode a list record by record; also returns each record's ``(offset, length)``."""
+        raise NotImplementedError
+
+    def load_record(self, data: bytes) -> Any:
+        """Decode one record cut out of ``dump_records`` output."""
+        return self.load(data)
+
+
+def _join(head: bytes, parts: List[bytes], separator: bytes, tail: bytes) -> Tuple[bytes, List[Tuple[int, int]]]:
+    spans = []
+    offset = len(head)
+    for part in parts:
+        spans.append((offset, len(part)))
+        offset += len(part) + len(separator)
+    return head + separator.join(parts) + tail, spans
+
+
+class JsonFormat(Format):
+    def __init__(self, name: str = "json", *, indent: bool = False, use_orjson: bool = True):
+        self.name = name
+        self.indent = indent
+        self.use_orjson = use_orjson and orjson is not None
+
+    def dump(self, payload: Any) -> bytes:
+        if self.use_orjson:
+            # the stdlib turns non-string keys into strings too
+            option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if self.indent else 0)
+            return orjson.dumps(payload, default=plain, option=option)
+        if self.indent:
+            return json.dumps(payload, ensure_ascii=False, indent=2, default=plain).encode()
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=plain).encode()
+
+    def load(self, data: bytes) -> Any:
+        if self.use_orjson:
+            return orjson.loads(data)
+        return json.loads(data)
+
+    def dump_records(self, records: Sequence[Any]) -> Tuple[bytes, List[Tuple[int, int]]]:
+        parts = [self.dump(record) for record in records]
+        if self.indent:
+            return _join(b"[\n", parts, b",\n", b"\n]") if parts else (b"[]", [])
+        return _join(b"[", parts, b",", b"]")
+
+
+class MsgpackFormat(Format):
+    name = "msgpack"
+
+    def dump(self, payload: Any) -> bytes:
+        return MSGPACK_MAGIC + msgpack.packb(payload, use_bin_type=True, default=plain)
+
+    def load(self, data: bytes) -> Any:
+        if msgpack is None:
+            raise RuntimeError("This file is MessagePack-encoded; pip install msgpack to read it")
+        return msgpack.unpackb(memoryview(data)[len(MSGPACK_MAGIC) :], raw=False)
+
+    def dump_records(self, records: Sequence[Any]) -> Tuple[bytes, List[Tuple[int, int]]]:
+        packer = msgpack.Packer(use_bin_type=True, default=plain)
+        head = MSGPACK_MAGIC + packer.pack_array_header(len(records))
+        return _join(head, [packer.pack(record) for record in records], b"", b"")
+
+    def load_record(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+JSON = JsonFormat()
+PRETTY = JsonFormat("pretty", indent=True)
+MSGPACK = MsgpackFormat()
+FORMATS: Dict[str, Format] = {fmt.name: fmt for fmt in (JSON, PRETTY, MSGPACK)}
+
+
+def _pick(name: str) -> Format:
+    fmt = FORMATS.get(name.strip().lower())
+    if fmt is None:
+        raise ValueError(f"Unknown storage format {name!r}; expected one of {', '.join(FORMATS)}")
+    if fmt is MSGPACK and msgpack is None:
+        log.warning("msgpack is not installed; writing compact JSON instead")
+        return JSON
+    return fmt
+
+
+def _parse_overrides(raw: str) -> Dict[str, Format]:
+    overrides = {}
+    for item in filter(None, (part.strip() for part in raw.split(","))):
+        stem, _, name = item.partition("=")
+        overrides[stem.strip()] = _pick(name)
+    return overrides
+
+
+DEFAULT_FORMAT = _pick(os.environ.get("RELINK_FORMAT", "json"))
+FILE_FORMATS = _parse_overrides(os.environ.get("RELINK_FORMATS", ""))
+
+
+def format_for(path: Path) -> Format:
+    """The format new writes of ``path`` use."""
+    return FILE_FORMATS.get(Path(path).stem, DEFAULT_FORMAT)
+
+
+def decode(data: bytes) -> Any:
+    """Parse file contents written in any of the formats."""
+    if data.startswith(MSGPACK_MAGIC):
+        return MSGPACK.load(data)
+    return JSON.load(data)
+
+
+def record_decoder(head: bytes) -> Callable[[bytes], Any]:
+    """How to decode single records of a file that starts with ``head``."""
+    return MSGPACK.load_record if head.startswith(MSGPACK_MAGIC) else JSON.load_record
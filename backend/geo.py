@@ -0,0 +1,464 @@
+"""Geographic helpers: great-circle distance, grid indexes for radius, box and
+point-in-circle queries, and batch many-to-many distance/containment over
+arrays of points.
+
+NumPy is optional; without it the batch helpers fall back to plain Python
+loops with the same results.
+"""
+from __future__ import annotations
+
+import math
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .storage import Index, Record
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised when numpy is absent
+    np = None
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+Cell = Tuple[int, int]
+# (min_lat, min_lng, max_lat, max_lng); min_lng > max_lng wraps across 180
+Box = Tuple[float, float, float, float]
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return EARTH_RADIUS_KM * c
+
+
+def bounding_box(lat: float, lng: float, km: float) -> Tuple[float, float, float]:
+    """
+    ``(min_lat, max_lat, d_lng)`` degree extents containing every point within
+    ``km`` of ``(lat, lng)``. ``d_lng`` is the half-width in longitude and is
+    ``180`` when the circle covers a pole and therefore every longitude.
+    """
+    d_lat = km / KM_PER_DEGREE
+    min_lat, max_lat = lat - d_lat, lat + d_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), 180.0
+    # widest longitude span of the circle is at the latitude nearest the pole
+    d_lng = d_lat / math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    return min_lat, max_lat, min(d_lng, 180.0)
+
+
+def circle_box(lat: float, lng: float, km: float) -> Box:
+    """Box around everything within ``km`` of ``(lat, lng)``."""
+    min_lat, max_lat, d_lng = bounding_box(lat, lng, km)
+    if d_lng >= 180:
+        return min_lat, -180.0, max_lat, 180.0
+    return min_lat, (lng - d_lng + 180) % 360 - 180, max_lat, (lng + d_lng + 180) % 360 - 180
+
+
+def _lng_delta(a: float, b: float) -> float:
+    delta = abs(a - b) % 360
+    return 360 - delta if delta > 180 else delta
+
+
+class GridIndex(Index):
+    """
+    Fixed-size lat/lng grid over the point stored at ``record[field]``.
+
+    Radius queries visit only the cells overlapping the circle's bounding box,
+    drop points outside the box with two subtractions, and run the exact
+    haversine on what is left. Cells are ``cell_deg`` degrees on a side; the
+    default (~28 km of latitude) keeps a 25 km query to a handful of cells.
+    """
+
+    def __init__(self, field: str = "location", cell_deg: float = 0.25):
+        self.field = field
+        self.cell_deg = cell_deg
+        self.columns = math.ceil(360 / cell_deg)
+        self.rows = math.ceil(180 / cell_deg)
+        self._cells: Dict[Cell, Dict[str, Tuple[float, float, Record]]] = {}
+        self._where: Dict[str, Cell] = {}
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        row = min(int((lat + 90) / self.cell_deg), self.rows - 1)
+        col = int((lng + 180) / self.cell_deg) % self.columns
+        return row, col
+
+    def clear(self) -> None:
+        self._cells = {}
+        self._where = {}
+
+    def add(self, record: Record) -> None:
+        point = record.get(self.field)
+        if not point:
+            return
+        lat, lng = float(point["lat"]), float(point["lng"])
+        cell = self._cell(lat, lng)
+        self._cells.setdefault(cell, {})[record["id"]] = (lat, lng, record)
+        self._where[record["id"]] = cell
+
+    def remove(self, record: Record) -> None:
+        cell = self._where.pop(record["id"], None)
+        if cell is None:
+            return
+        bucket = self._cells[cell]
+        bucket.pop(record["id"], None)
+        if not bucket:
+            del self._cells[cell]
+
+    def _span(self, min_lat: float, max_lat: float, lng: float, d_lng: float) -> Tuple[range, Sequence[int]]:
+        """Grid rows and columns covered by a box ``d_lng`` either side of ``lng``."""
+        first_row, _ = self._cell(min_lat, 0)
+        last_row, _ = self._cell(max_lat, 0)
+        if d_lng >= 180:
+            return range(first_row, last_row + 1), range(self.columns)
+        first_col = math.floor((lng - d_lng + 180) / self.cell_deg)
+        last_col = math.floor((lng + d_lng + 180) / self.cell_deg)
+        columns = [col % self.columns for col in range(first_col, min(last_col, first_col + self.columns - 1) + 1)]
+        return range(first_row, last_row + 1), columns
+
+    def _candidate_cells(self, min_lat: float, max_lat: float, lng: float, d_lng: float) -> Iterator[Cell]:
+        rows, columns = self._span(min_lat, max_lat, lng, d_lng)
+        if len(rows) * len(columns) > len(self._cells):
+            # huge radius: walking occupied cells is cheaper than the box
+            wanted = set(columns)
+            yield from (cell for cell in self._cells if cell[0] in rows and cell[1] in wanted)
+            return
+        for row in rows:
+            for col in columns:
+                yield row, col
+
+    def within(self, lat: float, lng: float, km: float) -> List[Tuple[float, Record]]:
+        """``(distance_km, record)`` pairs for every point within ``km``."""
+        min_lat, max_lat, d_lng = bounding_box(lat, lng, km)
+        hits: List[Tuple[float, Record]] = []
+        for cell in self._candidate_cells(min_lat, max_lat, lng, d_lng):
+            bucket = self._cells.get(cell)
+            if not bucket:
+                continue
+            for p_lat, p_lng, record in bucket.values():
+                if p_lat < min_lat or p_lat > max_lat or _lng_delta(p_lng, lng) > d_lng:
+                    continue
+                distance = haversine_km(lat, lng, p_lat, p_lng)
+                if distance <= km:
+                    hits.append((distance, record))
+        return hits
+
+
+def _box_columns(box: Box) -> Tuple[float, float]:
+    """``(centre_lng, half_width)`` of a box whose ``min_lng > max_lng`` if it crosses 180."""
+    _, min_lng, _, max_lng = box
+    width = max_lng - min_lng if min_lng <= max_lng else max_lng + 360 - min_lng
+    centre = min_lng + width / 2
+    return (centre + 180) % 360 - 180, width / 2
+
+
+def _in_lng_range(lng: float, min_lng: float, max_lng: float) -> bool:
+    if min_lng <= max_lng:
+        return min_lng <= lng <= max_lng
+    return lng >= min_lng or lng <= max_lng
+
+
+def _distance_to_meridian_km(lat: float, lng: float, edge_lng: float, min_lat: float, max_lat: float) -> float:
+    """Great-circle km from a point to the meridian segment ``edge_lng`` x ``[min_lat, max_lat]``."""
+    d_lambda = math.radians(edge_lng - lng)
+    # latitude of the foot of the perpendicular; distance is unimodal along the
+    # meridian, so the nearest point is the clamped foot or one of the ends
+    foot = math.degrees(math.atan2(math.tan(math.radians(lat)), math.cos(d_lambda)))
+    return min(
+        haversine_km(lat, lng, min(max(foot, min_lat), max_lat), edge_lng),
+        haversine_km(lat, lng, min_lat, edge_lng),
+        haversine_km(lat, lng, max_lat, edge_lng),
+    )
+
+
+def distance_to_box_km(lat: float, lng: float, box: Box) -> float:
+    """Great-circle km from a point to the nearest point of a lat/lng box (0 inside)."""
+    min_lat, min_lng, max_lat, max_lng = box
+    if _in_lng_range(lng, min_lng, max_lng):
+        if lat < min_lat:
+            return (min_lat - lat) * KM_PER_DEGREE
+        if lat > max_lat:
+            return (lat - max_lat) * KM_PER_DEGREE
+        return 0.0
+    return min(
+        _distance_to_meridian_km(lat, lng, min_lng, min_lat, max_lat),
+        _distance_to_meridian_km(lat, lng, max_lng, min_lat, max_lat),
+    )
+
+
+class CircleGridIndex(GridIndex):
+    """
+    Grid over circles: centres at ``record[field]`` with radius
+    ``record[radius_field] * radius_scale`` km.
+
+    A circle is filed under every cell its bounding box touches, so "which
+    circles contain this point" reads one cell and a box query reads the cells
+    under the box, each followed by an exact test of the few candidates.
+    Circles covering more than ``max_cells`` cells (continent-sized or polar)
+    are kept in a short list that every query checks instead.
+    """
+
+    def __init__(
+        self,
+        field: str = "center",
+        radius_field: str = "radius_m",
+        radius_scale: float = 0.001,
+        cell_deg: float = 0.5,
+        max_cells: int = 1024,
+    ):
+        super().__init__(field, cell_deg)
+        self.radius_field = radius_field
+        self.radius_scale = radius_scale
+        self.max_cells = max_cells
+        self._circles: Dict[str, Tuple[float, float, float, Record]] = {}
+        self._spans: Dict[str, List[Cell]] = {}
+        self._wide: Dict[str, Tuple[float, float, float, Record]] = {}
+
+    def __len__(self) -> int:
+        return len(self._circles)
+
+    def clear(self) -> None:
+        self._cells = {}
+        self._circles = {}
+        self._spans = {}
+        self._wide = {}
+
+    def add(self, record: Record) -> None:
+        point = record.get(self.field)
+        if not point:
+            return
+        lat, lng = float(point["lat"]), float(point["lng"])
+        radius_km = float(record.get(self.radius_field) or 0) * self.radius_scale
+        entry = (lat, lng, radius_km, record)
+        self._circles[record["id"]] = entry
+        min_lat, max_lat, d_lng = bounding_box(lat, lng, radius_km)
+        rows, columns = self._span(min_lat, max_lat, lng, d_lng)
+        if len(rows) * len(columns) > self.max_cells:
+            self._wide[record["id"]] = entry
+            return
+        cells = [(row, col) for row in rows for col in columns]
+        for cell in cells:
+            self._cells.setdefault(cell, {})[record["id"]] = entry
+        self._spans[record["id"]] = cells
+
+    def remove(self, record: Record) -> None:
+        if self._circles.pop(record["id"], None) is None:
+            return
+        self._wide.pop(record["id"], None)
+        for cell in self._spans.pop(record["id"], ()):
+            bucket = self._cells[cell]
+            bucket.pop(record["id"], None)
+            if not bucket:
+                del self._cells[cell]
+
+    def containing(self, lat: float, lng: float) -> List[Tuple[float, Record]]:
+        """``(distance_km, record)`` for every circle covering ``(lat, lng)``."""
+        hits: List[Tuple[float, Record]] = []
+        bucket = self._cells.get(self._cell(lat, lng), {})
+        for entries in (bucket.values(), self._wide.values()):
+            for c_lat, c_lng, radius_km, record in entries:
+                distance = haversine_km(lat, lng, c_lat, c_lng)
+                if distance <= radius_km:
+                    hits.append((distance, record))
+        return hits
+
+    def intersecting(self, box: Box) -> List[Record]:
+        """
+        Circles overlapping ``(min_lat, min_lng, max_lat, max_lng)``; a box
+        with ``min_lng > max_lng`` wraps across the antimeridian.
+        """
+        min_lat, _, max_lat, _ = box
+        centre, half_width = _box_columns(box)
+        hits: List[Record] = []
+        seen = set()
+        cells = self._candidate_cells(min_lat, max_lat, centre, half_width)
+        for bucket in [self._wide, *(self._cells.get(cell, {}) for cell in cells)]:
+            for record_id, (c_lat, c_lng, radius_km, record) in bucket.items():
+                if record_id in seen:
+                    continue
+                seen.add(record_id)
+                if distance_to_box_km(c_lat, c_lng, box) <= radius_km:
+                    hits.append(record)
+        return hits
+
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat: float, lng: float, precision: int) -> str:
+    """Standard base-32 geohash of ``(lat, lng)`` with ``precision`` characters."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        # bits alternate longitude, latitude, starting with longitude
+        span, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (span[0] + span[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            span[0] = mid
+        else:
+            span[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def _geohash_cell_deg(precision: int) -> Tuple[float, float]:
+    """``(height, width)`` in degrees of a geohash cell."""
+    total = 5 * precision
+    return 180 / 2 ** (total // 2), 360 / 2 ** (total - total // 2)
+
+
+def geohash_cover(box: Box, precision: int, max_cells: int) -> List[str]:
+    """
+    Geohashes tiling ``(min_lat, min_lng, max_lat, max_lng)``, at ``precision``
+    or the finest coarser precision that needs at most ``max_cells`` of them.
+    A box with ``min_lng > max_lng`` wraps across the antimeridian.
+    """
+    min_lat, min_lng, max_lat, max_lng = box
+    width = max_lng - min_lng if min_lng <= max_lng else max_lng + 360 - min_lng
+    for level in range(precision, 0, -1):
+        height_deg, width_deg = _geohash_cell_deg(level)
+        first_row, last_row = math.floor((min_lat + 90) / height_deg), math.floor((max_lat + 90) / height_deg)
+        last_row = min(last_row, round(180 / height_deg) - 1)
+        columns = round(360 / width_deg)
+        first_col = math.floor((min_lng + 180) / width_deg)
+        count = min(math.floor((min_lng + width + 180) / width_deg) - first_col + 1, columns)
+        if (last_row - first_row + 1) * count <= max_cells or level == 1:
+            return [
+                geohash(-90 + (row + 0.5) * height_deg, -180 + ((col % columns) + 0.5) * width_deg, level)
+                for row in range(first_row, last_row + 1)
+                for col in range(first_col, first_col + count)
+            ]
+    return []
+
+
+class PointSet:
+    """
+    Coordinates of many records as parallel arrays with radians precomputed.
+
+    ``radius_km`` is set for circle sets (hazards) and holds each circle's
+    radius; ``hav_radius`` caches ``sin^2(r / 2R)`` so containment can compare
+    haversine terms without taking square roots or arcsines.
+    """
+
+    def __init__(
+        self,
+        ids: Sequence[str],
+        lat: Sequence[float],
+        lng: Sequence[float],
+        radius_km: Optional[Sequence[float]] = None,
+    ):
+        self.ids = list(ids)
+        self.records: List[Record] = []
+        if np is not None:
+            self.lat = np.radians(np.asarray(lat, dtype=np.float64))
+            self.lng = np.radians(np.asarray(lng, dtype=np.float64))
+            self.cos_lat = np.cos(self.lat)
+            self.radius_km = None if radius_km is None else np.asarray(radius_km, dtype=np.float64)
+            self.hav_radius = (
+                None if radius_km is None else np.sin(self.radius_km / (2 * EARTH_RADIUS_KM)) ** 2
+            )
+        else:
+            self.lat = [math.radians(value) for value in lat]
+            self.lng = [math.radians(value) for value in lng]
+            self.cos_lat = [math.cos(value) for value in self.lat]
+            self.radius_km = None if radius_km is None else [float(value) for value in radius_km]
+            self.hav_radius = (
+                None
+                if radius_km is None
+                else [math.sin(value / (2 * EARTH_RADIUS_KM)) ** 2 for value in self.radius_km]
+            )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_records(
+        cls,
+        records: Iterable[Record],
+        field: str,
+        radius_field: Optional[str] = None,
+        radius_scale: float = 1.0,
+    ) -> "PointSet":
+        """Build from ``record[field]`` points; ``radius_scale`` converts radii to km."""
+        kept, ids, lat, lng, radii = [], [], [], [], []
+        for record in records:
+            point = record.get(field)
+            if not point:
+                continue
+            kept.append(record)
+            ids.append(record["id"])
+            lat.append(float(point["lat"]))
+            lng.append(float(point["lng"]))
+            if radius_field:
+                radii.append(float(record[radius_field]) * radius_scale)
+        points = cls(ids, lat, lng, radii if radius_field else None)
+        points.records = kept
+        return points
+
+
+def _hav_terms(a: PointSet, b: PointSet, rows: slice):
+    """Haversine ``a`` term for a block of rows of ``a`` against all of ``b``."""
+    lat1 = a.lat[rows][:, None]
+    d_phi = b.lat[None, :] - lat1
+    d_lambda = b.lng[None, :] - a.lng[rows][:, None]
+    return np.sin(d_phi / 2) ** 2 + a.cos_lat[rows][:, None] * b.cos_lat[None, :] * np.sin(d_lambda / 2) ** 2
+
+
+def _hav_term(a: PointSet, i: int, b: PointSet, j: int) -> float:
+    return (
+        math.sin((b.lat[j] - a.lat[i]) / 2) ** 2
+        + a.cos_lat[i] * b.cos_lat[j] * math.sin((b.lng[j] - a.lng[i]) / 2) ** 2
+    )
+
+
+def distance_matrix(a: PointSet, b: PointSet):
+    """
+    Great-circle km between every point of ``a`` and every point of ``b``:
+    an ``(len(a), len(b))`` array with NumPy, otherwise a list of row lists.
+    """
+    if np is not None:
+        hav = _hav_terms(a, b, slice(None))
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(hav, 0.0, 1.0)))
+    return [
+        [
+            2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, _hav_term(a, i, b, j))))
+            for j in range(len(b))
+        ]
+        for i in range(len(a))
+    ]
+
+
+def containment(points: PointSet, circles: PointSet, chunk: int = 2048) -> List[List[int]]:
+    """
+    For each point, the positions in ``circles`` whose radius covers it.
+
+    Rows are processed ``chunk`` points at a time so the intermediate matrix
+    stays bounded (``chunk * len(circles)`` floats) for large post sets.
+    """
+    if circles.hav_radius is None:
+        raise ValueError("containment() needs a PointSet built with radii")
+    hits: List[List[int]] = [[] for _ in range(len(points))]
+    if not len(points) or not len(circles):
+        return hits
+    if np is not None:
+        for start in range(0, len(points), chunk):
+            mask = _hav_terms(points, circles, slice(start, start + chunk)) <= circles.hav_radius[None, :]
+            for row, col in zip(*np.nonzero(mask)):
+                hits[start + int(row)].append(int(col))
+        return hits
+    for i in range(len(points)):
+        for j in range(len(circles)):
+            if _hav_term(points, i, circles, j) <= circles.hav_radius[j]:
+                hits[i].append(j)
+    return hits
@@ -1,45 +1,143 @@
 """Hazard reporting endpoints."""
 from __future__ import annotations
 
-from pathlib import Path
-from typing import Dict, List
+import logging
+import os
+import threading
 import time
+from typing import Dict, List, Optional, Tuple
 
 from flask import Blueprint, jsonify, request
 
 from .auth import require_auth
 from . import storage
+from .geo import CircleGridIndex
+from .http_cache import conditional
+from .indexes import SortedIndex
 from .schemas import hazard_schema
 from .validators import ValidationError, require_fields, validate_location, validate_radius
 
-HAZARDS_PATH = Path("hazards.json")
 HAZARD_TYPES = {"fire", "flood", "tornado", "earthquake", "storm"}
+HAZARD_MAX_AGE = 172800
+# how often expired hazards are deleted from storage; reads filter by age anyway
+HAZARD_SWEEP_INTERVAL = float(os.environ.get("HAZARD_SWEEP_INTERVAL", 600))
+ALL_HAZARDS = "*"
+
+log = logging.getLogger(__name__)
 
 bp = Blueprint("hazards", __name__, url_prefix="/api")
 
 
-def _load() -> List[Dict]:
-    return storage.read_json(HAZARDS_PATH)
+def _age_key(hazard: Dict) -> tuple:
+    return (hazard.get("created_at", 0), hazard["id"])
+
+
+storage.register_index("hazards", "by_age", lambda: SortedIndex(lambda hazard: (ALL_HAZARDS,), _age_key))
+storage.register_index("hazards", "spatial", lambda: CircleGridIndex("center", "radius_m", radius_scale=0.001))
+
+
+def _cutoff(max_age_seconds: Optional[int]) -> float:
+    return time.time() - (HAZARD_MAX_AGE if max_age_seconds is None else max_age_seconds)
+
+
+def active_hazards(max_age_seconds: Optional[int] = None) -> List[Dict]:
+    """Hazards reported within ``max_age_seconds``, oldest first; an in-memory index walk."""
+    sweeper.start()
+    cutoff = _cutoff(max_age_seconds)
+    with storage.indexed("hazards", "by_age") as index:
+        return list(index.walk(ALL_HAZARDS, after=(cutoff, "")))
+
+
+def hazards_in_box(box: Tuple[float, float, float, float], max_age_seconds: Optional[int] = None) -> List[Dict]:
+    """Active hazards whose circle overlaps ``(min_lat, min_lng, max_lat, max_lng)``, oldest first."""
+    sweeper.start()
+    cutoff = _cutoff(max_age_seconds)
+    with storage.indexed("hazards", "spatial") as index:
+        hits = index.intersecting(box)
+    return sorted((hazard for hazard in hits if hazard.get("created_at", 0) >= cutoff), key=_age_key)
+
+
+def hazards_containing(lat: float, lng: float, max_age_seconds: Optional[int] = None) -> List[Dict]:
+    """Active hazards covering ``(lat, lng)``, nearest centre first, with ``distance_km``."""
+    sweeper.start()
+    cutoff = _cutoff(max_age_seconds)
+    with storage.indexed("hazards", "spatial") as index:
+        hits = index.containing(lat, lng)
+    hits = [(distance, hazard) for distance, hazard in hits if hazard.get("created_at", 0) >= cutoff]
+    hits.sort(key=lambda hit: hit[0])
+    # copy so the distance doesn't leak into the shared cached record
+    return [{**hazard, "distance_km": round(distance, 3)} for distance, hazard in hits]
+
 
+def prune_old_hazards(max_age_seconds: Optional[int] = None) -> int:
+    """Drop hazards older than ``max_age_seconds``; returns how many went."""
+    cutoff = _cutoff(max_age_seconds)
+    return storage.delete_where("hazards", lambda entry: entry.get("created_at", 0) < cutoff)
 
-def prune_old_hazards(max_age_seconds: int = 172800) -> List[Dict]:
-    """Drop hazards older than ``max_age_seconds`` and persist the rest."""
 
-    def _prune(entries: List[Dict]) -> List[Dict]:
-        cutoff = time.time() - max_age_seconds
-        fresh = [entry for entry in entries if entry.get("created_at", 0) >= cutoff]
-        # only write if pruning occurred to avoid unnecessary disk churn
-        if len(fresh) != len(entries):
-            return fresh
-        return entries
+class ExpirySweeper:
+    """Background job deleting expired hazards every ``interval`` seconds."""
 
-    return storage.update_json(HAZARDS_PATH, _prune)
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="hazard-expiry", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                prune_old_hazards()
+            except Exception:
+                log.exception("Hazard expiry sweep failed")
+
+
+sweeper = ExpirySweeper(HAZARD_SWEEP_INTERVAL)
+
+
+def _hazards_version():
+    # hazards age out of the listing between writes, so count them in
+    cutoff = time.time() - HAZARD_MAX_AGE
+    with storage.indexed("hazards", "by_age") as index:
+        expired = index.rank(ALL_HAZARDS, (cutoff, ""))
+    return (storage.version("hazards"), expired)
 
 
 @bp.route("/hazards", methods=["GET"])
+@conditional(_hazards_version)
 def list_hazards():
-    fresh = prune_old_hazards()
-    return jsonify({"hazards": fresh})
+    bbox = request.args.get("bbox")
+    if not bbox:
+        return jsonify({"hazards": active_hazards()})
+    try:
+        min_lat, min_lng, max_lat, max_lng = (float(part) for part in bbox.split(","))
+    except ValueError:
+        return jsonify({"error": "Invalid bbox format"}), 400
+    # min_lng > max_lng is a box across the antimeridian
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+        return jsonify({"error": "bbox out of bounds"}), 400
+    return jsonify({"hazards": hazards_in_box((min_lat, min_lng, max_lat, max_lng))})
+
+
+@bp.route("/hazards/containing", methods=["GET"])
+@conditional(_hazards_version)
+def list_hazards_containing():
+    try:
+        point = validate_location({"lat": request.args.get("lat"), "lng": request.args.get("lng")})
+    except ValidationError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify({"hazards": hazards_containing(point["lat"], point["lng"])})
 
 
 @bp.route("/hazards", methods=["POST"])
@@ -57,9 +155,5 @@ def create_hazard():
         return jsonify({"error": str(exc)}), 400
 
     hazard = hazard_schema(user["id"], hazard_type, center, radius, payload.get("note", ""))
-    def _add(existing: List[Dict]) -> List[Dict]:
-        existing.append(hazard)
-        return existing
-
-    storage.update_json(HAZARDS_PATH, _add)
+    storage.put("hazards", hazard)
     return jsonify(hazard), 201
@@ -0,0 +1,54 @@
+"""Content-addressed image storage and the endpoint that serves it."""
+from __future__ import annotations
+
+import re
+
+from flask import Blueprint, jsonify, send_file
+
+from . import storage
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+ONE_YEAR = 365 * 24 * 3600
+SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+bp = Blueprint("images", __name__, url_prefix="/api")
+
+
+def image_url(digest: str) -> str:
+    return f"/api/images/{digest}"
+
+
+def store_image(raw: bytes) -> str:
+    """Persist decoded image bytes and return the URL posts reference them by."""
+    return image_url(storage.put_blob(raw))
+
+
+def _sniff(head: bytes) -> str:
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for magic, mime in SIGNATURES:
+        if head.startswith(magic):
+            return mime
+    return "application/octet-stream"
+
+
+@bp.route("/images/<digest>", methods=["GET"])
+def get_image(digest: str):
+    if not DIGEST_RE.match(digest):
+        return jsonify({"error": "Image not found"}), 404
+    path = storage.blob_path(digest)
+    if not path.exists():
+        return jsonify({"error": "Image not found"}), 404
+    with path.open("rb") as handle:
+        mimetype = _sniff(handle.read(12))
+    # the digest names the bytes, so it doubles as a strong validator and the
+    # body can be cached forever; send_file streams via wsgi.file_wrapper
+    resp = send_file(path, mimetype=mimetype, etag=digest, conditional=True, max_age=ONE_YEAR)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
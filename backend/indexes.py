@@ -0,0 +1,101 @@
+"""Reusable secondary indexes for ``storage.register_index``."""
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from .storage import Index, Record
+
+SortKey = Tuple[Any, str]
+
+
+class SortedIndex(Index):
+    """
+    Records grouped into buckets, each kept ordered by ``sort_key``.
+
+    ``buckets(record)`` names every bucket a record belongs to (a creator id,
+    each member id, ...), so a filtered, ordered page is a bisect into one
+    bucket followed by a walk of ``limit`` entries instead of a full scan.
+    Sort keys end with the record id, which makes them unique and lets a
+    ``(key)`` cursor resume exactly where the previous page stopped.
+    """
+
+    def __init__(
+        self,
+        buckets: Callable[[Record], Iterable[Hashable]],
+        sort_key: Callable[[Record], SortKey],
+    ):
+        self.buckets = buckets
+        self.sort_key = sort_key
+        self._lists: Dict[Hashable, List[SortKey]] = {}
+        self._records: Dict[str, Record] = {}
+
+    def clear(self) -> None:
+        self._lists = {}
+        self._records = {}
+
+    def add(self, record: Record) -> None:
+        key = self.sort_key(record)
+        self._records[record["id"]] = record
+        for bucket in self.buckets(record):
+            insort(self._lists.setdefault(bucket, []), key)
+
+    def remove(self, record: Record) -> None:
+        key = self.sort_key(record)
+        self._records.pop(record["id"], None)
+        for bucket in self.buckets(record):
+            keys = self._lists.get(bucket)
+            if not keys:
+                continue
+            pos = bisect_left(keys, key)
+            if pos < len(keys) and keys[pos] == key:
+                del keys[pos]
+            if not keys:
+                del self._lists[bucket]
+
+    def count(self, bucket: Hashable) -> int:
+        return len(self._lists.get(bucket, ()))
+
+    def rank(self, bucket: Hashable, key: SortKey) -> int:
+        """Number of records in ``bucket`` ordered before ``key``."""
+        return bisect_left(self._lists.get(bucket, []), key)
+
+    def walk(
+        self, bucket: Hashable, *, after: Optional[SortKey] = None, descending: bool = False
+    ) -> Iterator[Record]:
+        """Records of ``bucket`` in key order, starting just past ``after``."""
+        keys = self._lists.get(bucket, [])
+        if descending:
+            stop = bisect_left(keys, after) if after is not None else len(keys)
+            positions: Iterable[int] = range(stop - 1, -1, -1)
+        else:
+            start = bisect_right(keys, after) if after is not None else 0
+            positions = range(start, len(keys))
+        for pos in positions:
+            yield self._records[keys[pos][-1]]
+
+
+class HashIndex(Index):
+    """Unique ``key(record) -> record`` lookup table."""
+
+    def __init__(self, key: Callable[[Record], Hashable]):
+        self.key = key
+        self._map: Dict[Hashable, Record] = {}
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+    def clear(self) -> None:
+        self._map = {}
+
+    def add(self, record: Record) -> None:
+        self._map[self.key(record)] = record
+
+    def remove(self, record: Record) -> None:
+        key = self.key(record)
+        current = self._map.get(key)
+        if current is not None and current["id"] == record["id"]:
+            del self._map[key]
+
+    def get(self, key: Hashable) -> Optional[Record]:
+        return self._map.get(key)
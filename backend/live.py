@@ -0,0 +1,147 @@
+"""Live change stream: post and hazard deltas pushed over Socket.IO.
+
+Clients connect to the ``/live`` namespace and send ``subscribe`` with either
+nothing (every change), ``{"bbox": [min_lat, min_lng, max_lat, max_lng]}`` or
+``{"lat": .., "lng": .., "km": ..}``. Every commit to a streamed collection
+is then pushed as a ``change`` event::
+
+    {"collection": "posts", "op": "create" | "update" | "delete", "id": ..., "record": {...} | None}
+
+and a wholesale replacement as ``reset`` (``{"collection": ...}``), after
+which the client should re-fetch the list.
+
+Area subscriptions are geohash rooms. A subscriber joins ``geo:<cell>`` for
+the cells tiling its area plus ``geo-in:<prefix>`` for every coarser cell
+containing them; a change is emitted to ``geo:`` rooms for its own cells and
+their prefixes and to ``geo-in:`` rooms for its own cells, so the two meet
+whichever side picked the coarser precision. Delivery is per cell, so clients
+may see changes just outside their area. Emits go through the Socket.IO
+client manager and therefore reach clients of every worker on the bus.
+"""
+from __future__ import annotations
+
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from flask import request
+from flask_socketio import Namespace, SocketIO, emit, join_room, leave_room, rooms
+
+from . import storage
+from .geo import Box, circle_box, geohash_cover
+from .validators import ValidationError, validate_location
+
+LIVE_NAMESPACE = "/live"
+# precision 5 cells are about 4.9 x 4.9 km at the equator
+LIVE_GEOHASH_PRECISION = int(os.environ.get("LIVE_GEOHASH_PRECISION", 5))
+# areas needing more cells than this fall back to a coarser precision
+LIVE_MAX_CELLS = int(os.environ.get("LIVE_MAX_CELLS", 32))
+ALL_ROOM = "live:all"
+
+# collection -> (point field, radius field in metres or None)
+STREAMS: Dict[str, Tuple[str, Optional[str]]] = {
+    "posts": ("location", None),
+    "hazards": ("center", "radius_m"),
+}
+
+
+def _record_box(record: storage.Record, field: str, radius_field: Optional[str]) -> Optional[Box]:
+    point = record.get(field)
+    if not point:
+        return None
+    lat, lng = float(point["lat"]), float(point["lng"])
+    km = float(record.get(radius_field) or 0) / 1000 if radius_field else 0.0
+    return circle_box(lat, lng, km) if km else (lat, lng, lat, lng)
+
+
+def change_rooms(record: storage.Record, field: str, radius_field: Optional[str]) -> Set[str]:
+    """Rooms that should hear about a change to ``record``."""
+    box = _record_box(record, field, radius_field)
+    if box is None:
+        return set()
+    targets = set()
+    for cell in geohash_cover(box, LIVE_GEOHASH_PRECISION, LIVE_MAX_CELLS):
+        targets.update(f"geo:{cell[:size]}" for size in range(1, len(cell) + 1))
+        targets.add(f"geo-in:{cell}")
+    return targets
+
+
+def subscriber_rooms(box: Box) -> Set[str]:
+    """Rooms a client watching ``box`` joins."""
+    targets = set()
+    for cell in geohash_cover(box, LIVE_GEOHASH_PRECISION, LIVE_MAX_CELLS):
+        targets.add(f"geo:{cell}")
+        targets.update(f"geo-in:{cell[:size]}" for size in range(1, len(cell)))
+    return targets
+
+
+def _parse_area(data: Dict) -> Optional[Box]:
+    """The box a ``subscribe`` payload asks for; None means everything."""
+    if data.get("bbox") is not None:
+        try:
+            min_lat, min_lng, max_lat, max_lng = (float(value) for value in data["bbox"])
+        except (TypeError, ValueError) as exc:
+            raise ValidationError("bbox must be [min_lat, min_lng, max_lat, max_lng]") from exc
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+            raise ValidationError("bbox out of bounds")
+        return (min_lat, min_lng, max_lat, max_lng)
+    if data.get("lat") is not None or data.get("lng") is not None:
+        point = validate_location(data)
+        try:
+            km = float(data.get("km", 25))
+        except (TypeError, ValueError) as exc:
+            raise ValidationError("km must be a number") from exc
+        if not km > 0:
+            raise ValidationError("km must be positive")
+        return circle_box(point["lat"], point["lng"], km)
+    return None
+
+
+def _deltas(collection: str, changes: storage.Changes) -> Iterable[Tuple[Dict, List[str]]]:
+    field, radius_field = STREAMS[collection]
+    for old, new in changes:
+        current = new if new is not None else old
+        op = "create" if old is None else "delete" if new is None else "update"
+        targets = {ALL_ROOM}
+        for record in (old, new):
+            if record is not None:
+                targets |= change_rooms(record, field, radius_field)
+        # plain dicts: Socket.IO encodes with the stdlib json module
+        record = dict(new) if new is not None else None
+        payload = {"collection": collection, "op": op, "id": current["id"], "record": record}
+        yield payload, sorted(targets)
+
+
+def register_socketio(socketio: SocketIO) -> None:
+    """Add the ``/live`` namespace and start streaming commits to it."""
+
+    def _listener(collection: str):
+        def _on_commit(changes: Optional[storage.Changes]) -> None:
+            if changes is None:
+                socketio.emit("reset", {"collection": collection}, namespace=LIVE_NAMESPACE)
+                return
+            for payload, targets in _deltas(collection, changes):
+                socketio.emit("change", payload, namespace=LIVE_NAMESPACE, to=targets)
+
+        return _on_commit
+
+    for collection in STREAMS:
+        storage.subscribe(collection, _listener(collection))
+
+    class LiveNamespace(Namespace):
+        namespace = LIVE_NAMESPACE
+
+        def on_subscribe(self, data=None):  # type: ignore[override]
+            try:
+                box = _parse_area(data or {})
+            except ValidationError as exc:
+                emit("error", {"error": str(exc)})
+                return
+            for room in rooms():
+                if room != request.sid:
+                    leave_room(room)
+            targets = {ALL_ROOM} if box is None else subscriber_rooms(box)
+            for room in targets:
+                join_room(room)
+            emit("subscribed", {"bbox": list(box) if box else None})
+
+    socketio.on_namespace(LiveNamespace(LiveNamespace.namespace))
@@ -0,0 +1,235 @@
+"""Append-only JSON Lines logs with an in-memory offset index.
+
+A log (one per chat for messages) is a directory of numbered segments,
+``00000000.jsonl``, ``00000001.jsonl``, ... Appends go to the newest segment
+under a file lock and never rewrite earlier bytes, so sending a message costs
+one short write no matter how long the history is. Entries are ordered by
+``ts`` and then by append order (timestamps are whole seconds, so ties are
+common). Each open log keeps the sorted timestamps and ids next to the
+segment/offset/length of every line, so a page of entries around a
+``(ts, id)`` cursor is found by bisection and only the lines returned are
+read back with ``pread``. Lines appended by other processes are picked up by
+scanning the newest segment past the last indexed offset, and segments that
+``trim`` deleted are noticed when the oldest indexed one has gone missing.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+import threading
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .storage import LogCursor, Record, with_lock
+
+SEGMENT_BYTES = int(os.environ.get("RELINK_SEGMENT_BYTES", 4 * 1024 * 1024))
+KEY_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+Location = Tuple[int, int, int]
+
+
+def fsync_paths(paths: Iterable[Path]) -> None:
+    """Flush files written without ``sync`` to disk, once each."""
+    for path in set(paths):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def check_key(key: str) -> str:
+    """Log keys become directory names, so only allow id-like strings."""
+    if not KEY_RE.match(key or ""):
+        raise ValueError(f"Invalid log key {key!r}")
+    return key
+
+
+class SegmentLog:
+    """One append-only log; see the module docstring."""
+
+    def __init__(self, directory: Path, segment_bytes: Optional[int] = None):
+        self.directory = directory
+        self.segment_bytes = segment_bytes or SEGMENT_BYTES
+        self.keys: List[int] = []
+        self._ids: List[str] = []
+        self._locations: List[Location] = []
+        self._segment = 0  # newest segment seen
+        self._indexed = 0  # bytes of the newest segment already indexed
+        self._lock = threading.Lock()
+
+    def _segment_path(self, number: int) -> Path:
+        return self.directory / f"{number:08d}.jsonl"
+
+    def _index_line(self, record: Record, location: Location) -> None:
+        key = record["ts"]
+        if not self.keys or key >= self.keys[-1]:
+            self.keys.append(key)
+            self._ids.append(record["id"])
+            self._locations.append(location)
+            return
+        # clocks of different writers can disagree; keep keys sorted anyway
+        pos = bisect_right(self.keys, key)
+        self.keys.insert(pos, key)
+        self._ids.insert(pos, record["id"])
+        self._locations.insert(pos, location)
+
+    def _retain(self, segments: set) -> None:
+        """Drop index entries outside ``segments``."""
+        kept = [pos for pos, location in enumerate(self._locations) if location[0] in segments]
+        self.keys = [self.keys[pos] for pos in kept]
+        self._ids = [self._ids[pos] for pos in kept]
+        self._locations = [self._locations[pos] for pos in kept]
+
+    def _forget_trimmed(self) -> None:
+        if not self._locations:
+            if self._indexed == 0 and not self._segment_path(self._segment).exists():
+                # a fresh view of a log whose first segments were trimmed
+                numbers = sorted(int(path.stem) for path in self.directory.glob("*.jsonl"))
+                self._segment = numbers[0] if numbers else self._segment
+            return
+        oldest = self._locations[0][0]
+        if oldest == self._segment or self._segment_path(oldest).exists():
+            return
+        present = {location[0] for location in self._locations if self._segment_path(location[0]).exists()}
+        self._retain(present)
+
+    def _catch_up(self) -> None:
+        """Index complete lines written since we last looked (by anyone)."""
+        self._forget_trimmed()
+        while True:
+            path = self._segment_path(self._segment)
+            try:
+                size = os.stat(path).st_size
+            except FileNotFoundError:
+                size = 0
+            if size > self._indexed:
+                with path.open("rb") as handle:
+                    handle.seek(self._indexed)
+                    chunk = handle.read(size - self._indexed)
+                # a writer may be mid-line; leave the torn tail for next time
+                complete = chunk[: chunk.rfind(b"\n") + 1]
+                offset = self._indexed
+                for line in complete.splitlines(keepends=True):
+                    self._index_line(json.loads(line), (self._segment, offset, len(line)))
+                    offset += len(line)
+                self._indexed = offset
+            if not self._segment_path(self._segment + 1).exists():
+                return
+            self._segment += 1
+            self._indexed = 0
+
+    def append(self, records: Sequence[Record], *, sync: bool = True) -> Optional[Path]:
+        """Append ``records``; returns the segment written so callers can fsync it later."""
+        if not records:
+            return None
+        lines = [
+            json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode() + b"\n" for record in records
+        ]
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with with_lock(self.directory), self._lock:
+            self._catch_up()
+            if self._indexed >= self.segment_bytes:
+                self._segment += 1
+                self._indexed = 0
+            with self._segment_path(self._segment).open("ab") as handle:
+                if handle.tell() != self._indexed:
+                    # we hold the lock, so any unindexed tail is a torn line
+                    # left by a writer that crashed mid-append
+                    handle.truncate(self._indexed)
+                handle.write(b"".join(lines))
+                handle.flush()
+                if sync:
+                    os.fsync(handle.fileno())
+            offset = self._indexed
+            for record, line in zip(records, lines):
+                self._index_line(record, (self._segment, offset, len(line)))
+                offset += len(line)
+            self._indexed = offset
+            return self._segment_path(self._segment)
+
+    def _load(self, locations: Sequence[Location]) -> List[Record]:
+        records: List[Record] = []
+        handles: Dict[int, int] = {}
+        try:
+            for segment, offset, length in locations:
+                fd = handles.get(segment)
+                if fd is None:
+                    fd = handles[segment] = os.open(self._segment_path(segment), os.O_RDONLY)
+                records.append(json.loads(os.pread(fd, length, offset)))
+        finally:
+            for fd in handles.values():
+                os.close(fd)
+        return records
+
+    def _position(self, cursor: LogCursor, *, past: bool) -> int:
+        """Index just past (or at) the entry ``cursor`` names."""
+        ts, entry_id = cursor
+        lo, hi = bisect_left(self.keys, ts), bisect_right(self.keys, ts)
+        if entry_id is not None:
+            for pos in range(lo, hi):
+                if self._ids[pos] == entry_id:
+                    return pos + 1 if past else pos
+        return hi if past else lo
+
+    def read(
+        self,
+        *,
+        after: Optional[LogCursor] = None,
+        before: Optional[LogCursor] = None,
+        limit: Optional[int] = None,
+        descending: bool = False,
+    ) -> List[Record]:
+        """
+        Entries strictly between the ``after`` and ``before`` cursors.
+
+        At most ``limit`` entries are returned: the oldest ones first, or with
+        ``descending`` the newest ones, newest first.
+        """
+        for attempt in range(2):
+            with self._lock:
+                self._catch_up()
+                start = self._position(after, past=True) if after is not None else 0
+                stop = self._position(before, past=False) if before is not None else len(self.keys)
+                if limit is not None:
+                    if descending:
+                        start = max(start, stop - limit)
+                    else:
+                        stop = min(stop, start + limit)
+                locations = self._locations[start:stop]
+            if descending:
+                locations.reverse()
+            try:
+                return self._load(locations)
+            except FileNotFoundError:
+                # another process trimmed a segment in between; catch up again
+                if attempt:
+                    raise
+        return []
+
+    def trim(self, before: LogCursor) -> None:
+        """
+        Delete the segments holding only entries older than ``before``.
+
+        Whole segments go at once and the newest one always stays, so some
+        older entries may survive a trim.
+        """
+        with with_lock(self.directory), self._lock:
+            self._catch_up()
+            stop = self._position(before, past=False)
+            if stop == 0:
+                return
+            keep_from = min((location[0] for location in self._locations[stop:]), default=self._segment)
+            doomed = {location[0] for location in self._locations[:stop] if location[0] < keep_from}
+            for number in doomed:
+                self._segment_path(number).unlink(missing_ok=True)
+            self._retain({location[0] for location in self._locations} - doomed)
+
+    def drop(self) -> None:
+        with with_lock(self.directory), self._lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.keys, self._ids, self._locations = [], [], []
+            self._segment = self._indexed = 0
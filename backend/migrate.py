@@ -0,0 +1,105 @@
+"""One-shot migration of the JSON data files into the SQLite backend.
+
+    python -m backend.migrate            # data/*.json -> data/relink.db
+    python -m backend.migrate --force    # overwrite collections already migrated
+
+Afterwards start the app with RELINK_STORAGE=sqlite. The JSON files are left
+untouched so switching back is just a matter of unsetting the variable.
+
+    python -m backend.migrate --images   # move inline data-URL images to blobs
+
+rewrites posts created before the blob store so they reference
+``/api/images/<sha256>`` instead of carrying the image inline.
+
+    python -m backend.migrate --messages # move inline chat messages to logs
+
+appends the messages stored inside each chat record to that chat's
+append-only message log and drops them from the record.
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+from pathlib import Path
+
+from . import storage
+from .chat import move_inline_messages
+from .images import store_image
+from .logstore import SegmentLog
+from .sqlite_backend import SqliteBackend
+
+COLLECTIONS = ("users", "posts", "chats", "hazards")
+
+
+def migrate(data_dir: Path, *, force: bool = False) -> dict[str, int]:
+    """Copy every JSON collection and chat message log under ``data_dir`` into ``relink.db``."""
+    target = SqliteBackend(data_dir / "relink.db")
+    counts: dict[str, int] = {}
+    for collection in COLLECTIONS:
+        source = data_dir / f"{collection}.json"
+        if not source.exists():
+            continue
+        if target.all_records(collection) and not force:
+            raise SystemExit(
+                f"{collection} already has records in {target.path}; re-run with --force to overwrite."
+            )
+        records = storage.read_json(source)
+        target.replace_all(collection, records)
+        counts[collection] = len(records)
+    for chat in target.all_records("chats"):
+        messages = SegmentLog(data_dir / "logs" / "messages" / chat["id"]).read()
+        target.drop_log("messages", chat["id"])
+        target.append_log("messages", chat["id"], messages)
+        if messages:
+            counts["messages"] = counts.get("messages", 0) + len(messages)
+    return counts
+
+
+def externalize_images() -> int:
+    """Replace inline ``data:`` images in the active backend with blob URLs."""
+    moved = 0
+    for post in storage.all_records("posts"):
+        image = post.get("image")
+        if not image or not image.startswith("data:") or "," not in image:
+            continue
+        url = store_image(base64.b64decode(image.split(",", 1)[1]))
+
+        def _swap(record: dict, url: str = url) -> dict:
+            record["image"] = url
+            return record
+
+        storage.update("posts", post["id"], _swap)
+        moved += 1
+    return moved
+
+
+def externalize_messages() -> int:
+    """Move inline ``chat["messages"]`` in the active backend into message logs."""
+    return sum(move_inline_messages(chat["id"]) for chat in storage.all_records("chats"))
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description="Migrate data/*.json into the SQLite backend.")
+    parser.add_argument("--data-dir", type=Path, default=None, help="Defaults to RELINK_DATA_DIR or ./data")
+    parser.add_argument("--force", action="store_true", help="Overwrite collections that already have rows")
+    parser.add_argument(
+        "--images", action="store_true", help="Move inline post images into the blob store instead"
+    )
+    parser.add_argument(
+        "--messages", action="store_true", help="Move inline chat messages into message logs instead"
+    )
+    args = parser.parse_args()
+    if args.messages:
+        print(f"Moved the inline messages of {externalize_messages()} chats to message logs.")
+        return
+    if args.images:
+        print(f"Moved {externalize_images()} inline images to the blob store.")
+        return
+    data_dir = args.data_dir or storage.get_data_dir()
+    for collection, count in migrate(data_dir, force=args.force).items():
+        print(f"{collection}: {count} records")
+    print(f"Done. Start the backend with RELINK_STORAGE=sqlite to use {data_dir / 'relink.db'}.")
+
+
+if __name__ == "__main__":
+    run()
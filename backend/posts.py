@@ -2,56 +2,190 @@
 from __future__ import annotations
 
 import base64
-import math
 from binascii import Error as BinasciiError
-from pathlib import Path
-from typing import Dict, List
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
 
 from flask import Blueprint, jsonify, request
 
 from .auth import require_auth
-from . import storage
+from . import chat, storage
+from .geo import GridIndex, PointSet, containment
+from .hazards import active_hazards
+from .http_cache import conditional
+from .images import store_image
+from .indexes import SortedIndex
 from .schemas import chat_schema, post_schema
 from .validators import ValidationError, require_fields, validate_capacity, validate_location
 
-POSTS_PATH = Path("posts.json")
-CHATS_PATH = Path("chats.json")
 MAX_IMAGE_BYTES = 1_500_000
 
 bp = Blueprint("posts", __name__, url_prefix="/api")
 
 
-def _load_posts() -> List[Dict]:
-    return storage.read_json(POSTS_PATH)
+def _load_posts() -> Sequence[Dict]:
+    return storage.all_records("posts")
 
 
-def _haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    R = 6371
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    d_phi = math.radians(lat2 - lat1)
-    d_lambda = math.radians(lng2 - lng1)
-    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+MAX_PAGE_SIZE = 200
+ALL_POSTS = "*"
+OPEN_POSTS = "open"
+
+
+def _has_capacity(post: Dict) -> bool:
+    return max(0, len(post["members"]) - 1) < post["capacity"]
+
+
+def _listing_buckets(post: Dict) -> Iterator[Hashable]:
+    yield ALL_POSTS
+    yield ("creator", post["creator_id"])
+    for member in post["members"]:
+        yield ("member", member)
+    if _has_capacity(post):
+        yield OPEN_POSTS
+
+
+def _listing_key(post: Dict) -> tuple:
+    return (post["created_at"], post["id"])
+
+
+storage.register_index("posts", "geo", lambda: GridIndex("location"))
+storage.register_index("posts", "listing", lambda: SortedIndex(_listing_buckets, _listing_key))
+
+
+def _posts_near(lat: float, lng: float, radius_km: float, by_distance: bool) -> List[Dict]:
+    with storage.indexed("posts", "geo") as index:
+        hits = index.within(lat, lng, radius_km)
+    if by_distance:
+        hits.sort(key=lambda hit: hit[0])
+    else:
+        hits.sort(key=lambda hit: _listing_key(hit[1]))
+    # copy so the distance doesn't leak into the shared cached record
+    return [{**post, "distance_km": round(distance, 3)} for distance, post in hits]
+
+
+Filter = Tuple[Optional[Hashable], Callable[[Dict], bool]]
+
+
+def _parse_filters(args) -> List[Filter]:
+    """Turn query args into ``(bucket, predicate)`` pairs; bucket is None if unindexed."""
+    filters: List[Filter] = []
+    creator_id = args.get("creator_id")
+    if creator_id:
+        filters.append((("creator", creator_id), lambda post: post["creator_id"] == creator_id))
+    member_id = args.get("member_id")
+    if member_id:
+        filters.append((("member", member_id), lambda post: member_id in post["members"]))
+    has_capacity = args.get("has_capacity")
+    if has_capacity is not None:
+        if has_capacity.lower() in ("1", "true", "yes"):
+            filters.append((OPEN_POSTS, _has_capacity))
+        else:
+            filters.append((None, lambda post: not _has_capacity(post)))
+    return filters
+
+
+def _parse_fields(raw: Optional[str]) -> Optional[set]:
+    if not raw:
+        return None
+    return {"id", "distance_km", *raw.split(",")}
+
+
+def _cursor(post: Dict) -> str:
+    return f"{post['created_at']}:{post['id']}"
+
+
+def _parse_cursor(cursor: str) -> tuple:
+    created_at, post_id = cursor.split(":", 1)
+    return (int(created_at), post_id)
+
+
+def _project(posts: Sequence[Dict], fields: Optional[set]) -> Sequence[Dict]:
+    if not fields:
+        return posts
+    return [{key: value for key, value in post.items() if key in fields} for post in posts]
+
+
+def _page(
+    filters: List[Filter], after: Optional[tuple], limit: Optional[int], descending: bool
+) -> Tuple[List[Dict], bool]:
+    """Walk the smallest matching index bucket; returns the page and whether more follow."""
+    with storage.indexed("posts", "listing") as index:
+        buckets = [bucket for bucket, _ in filters if bucket is not None] or [ALL_POSTS]
+        bucket = min(buckets, key=index.count)
+        page: List[Dict] = []
+        for post in index.walk(bucket, after=after, descending=descending):
+            if all(predicate(post) for _, predicate in filters):
+                if limit is not None and len(page) == limit:
+                    return page, True
+                page.append(post)
+    return page, False
 
 
 @bp.route("/posts", methods=["GET"])
+@conditional(lambda: storage.version("posts"))
 def list_posts():
-    posts = _load_posts()
-    near = request.args.get("near")
-    radius_km = float(request.args.get("km", 25))
+    args = request.args
+    fields = _parse_fields(args.get("fields"))
+    try:
+        filters = _parse_filters(args)
+        limit = min(int(args["limit"]), MAX_PAGE_SIZE) if "limit" in args else None
+        after = _parse_cursor(args["cursor"]) if args.get("cursor") else None
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+    if limit is not None and limit < 1:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+
+    near = args.get("near")
     if near:
         try:
             lat_str, lng_str = near.split(",")
             lat, lng = float(lat_str), float(lng_str)
+            radius_km = float(args.get("km", 25))
         except ValueError:
             return jsonify({"error": "Invalid near format"}), 400
-        posts = [
-            post
-            for post in posts
-            if _haversine(lat, lng, post["location"]["lat"], post["location"]["lng"]) <= radius_km
-        ]
-    return jsonify({"posts": posts})
+        by_distance = args.get("sort") == "distance"
+        if by_distance and (after is not None or "order" in args):
+            return jsonify({"error": "cursor and order don't apply to sort=distance"}), 400
+        posts = _posts_near(lat, lng, radius_km, by_distance)
+        posts = [post for post in posts if all(predicate(post) for _, predicate in filters)]
+        if by_distance:
+            return jsonify({"posts": _project(posts[:limit], fields)})
+        descending = args.get("order") == "desc"
+        if descending:
+            posts.reverse()
+        if after is not None:
+            if descending:
+                posts = [post for post in posts if _listing_key(post) < after]
+            else:
+                posts = [post for post in posts if _listing_key(post) > after]
+        body = {"posts": _project(posts[:limit], fields)}
+        if limit is not None:
+            body["next_cursor"] = _cursor(posts[limit - 1]) if len(posts) > limit else None
+        return jsonify(body)
+
+    if not filters and limit is None and after is None:
+        return jsonify({"posts": _project(_load_posts(), fields)})
+
+    page, more = _page(filters, after, limit, args.get("order") == "desc")
+    body: Dict = {"posts": _project(page, fields)}
+    if limit is not None:
+        body["next_cursor"] = _cursor(page[-1]) if more else None
+    return jsonify(body)
+
+
+@bp.route("/posts/at-risk", methods=["GET"])
+def posts_at_risk():
+    """Offers inside at least one active hazard circle, with the hazards' ids."""
+    circles = PointSet.from_records(active_hazards(), "center", "radius_m", radius_scale=0.001)
+    points = storage.snapshot("posts").derive(
+        "points", lambda records: PointSet.from_records(records, "location")
+    )
+    at_risk = [
+        {**post, "hazard_ids": [circles.ids[col] for col in cols]}
+        for post, cols in zip(points.records, containment(points, circles))
+        if cols
+    ]
+    return jsonify({"posts": at_risk})
 
 
 @bp.route("/posts", methods=["POST"])
@@ -77,23 +211,17 @@ def create_post():
     )
     new_chat = chat_schema(new_post["id"], member_ids=new_post["members"], chat_id=new_post["chat_id"])
 
-    def _add_post(posts: List[Dict]):
-        posts.append(new_post)
-        return posts
-
-    def _add_chat(chats: List[Dict]):
-        chats.append(new_chat)
-        return chats
+    def _create(txn: storage.Transaction) -> None:
+        txn.put("posts", new_post)
+        txn.put("chats", new_chat)
 
-    storage.update_json(POSTS_PATH, _add_post)
-    storage.update_json(CHATS_PATH, _add_chat)
+    storage.transaction(_create)
     return jsonify(new_post), 201
 
 
 @bp.route("/posts/<post_id>", methods=["GET"])
 def get_post(post_id: str):
-    posts = _load_posts()
-    post = next((p for p in posts if p["id"] == post_id), None)
+    post = storage.get("posts", post_id)
     if not post:
         return jsonify({"error": "Post not found"}), 404
     return jsonify(post)
@@ -103,115 +231,94 @@ def get_post(post_id: str):
 def join_post(post_id: str):
     user = require_auth()
     status = {"error": None}
-    updated_post: Dict | None = None
-
-    def _join(posts: List[Dict]) -> List[Dict]:
-        nonlocal updated_post
-        for post in posts:
-            if post["id"] == post_id:
-                updated_post = post
-                break
-        if not updated_post:
-            status["error"] = ("not_found", 404)
-            return posts
-        if user["id"] in updated_post["members"]:
-            return posts
-        filled_slots = max(0, len(updated_post["members"]) - 1)
-        if filled_slots >= updated_post["capacity"]:
+
+    def _join(post: Dict) -> Dict | None:
+        # reset on every attempt, so a retry that finds a free slot isn't reported full
+        status["error"] = None
+        if user["id"] in post["members"]:
+            return None
+        filled_slots = max(0, len(post["members"]) - 1)
+        if filled_slots >= post["capacity"]:
             status["error"] = ("full", 400)
-            return posts
-        updated_post["members"].append(user["id"])
-        return posts
+            return None
+        post["members"].append(user["id"])
+        return post
 
-    storage.update_json(POSTS_PATH, _join)
+    def _sync_chat(chat: Dict) -> Dict | None:
+        if user["id"] in chat["member_ids"]:
+            return None
+        chat["member_ids"].append(user["id"])
+        return chat
 
-    if status["error"]:
-        code = status["error"][1]
-        message = "Post not found" if code == 404 else "Offer is full"
-        return jsonify({"error": message}), code
-    if updated_post is None:
-        return jsonify({"error": "Post not found"}), 404
+    def _join_both(txn: storage.Transaction) -> Dict | None:
+        post = txn.update("posts", post_id, _join)
+        if post is not None and not status["error"]:
+            txn.update("chats", post["chat_id"], _sync_chat)
+        return post
 
-    def _sync_chat(chats: List[Dict]) -> List[Dict]:
-        for chat in chats:
-            if chat["id"] == updated_post["chat_id"] and user["id"] not in chat["member_ids"]:
-                chat["member_ids"].append(user["id"])
-                break
-        return chats
+    updated_post = storage.transaction(_join_both)
 
-    storage.update_json(CHATS_PATH, _sync_chat)
+    if updated_post is None:
+        return jsonify({"error": "Post not found"}), 404
+    if status["error"]:
+        return jsonify({"error": "Offer is full"}), 400
     return jsonify(updated_post)
 
 
 @bp.route("/posts/<post_id>/leave", methods=["POST"])
 def leave_post(post_id: str):
     user = require_auth()
-    state: Dict[str, Dict | tuple[str, int] | None] = {"post": None, "error": None}
-
-    def _leave(posts: List[Dict]) -> List[Dict]:
-        for post in posts:
-            if post["id"] == post_id:
-                state["post"] = post
-                break
-        if state["post"] is None:
-            state["error"] = ("Post not found", 404)
-            return posts
-        post = state["post"]
+    state: Dict[str, tuple[str, int] | None] = {"error": None}
+
+    def _leave(post: Dict) -> Dict | None:
+        state["error"] = None
         if user["id"] not in post["members"]:
             state["error"] = ("You are not part of this offer", 400)
-            return posts
+            return None
         if post["creator_id"] == user["id"]:
             state["error"] = ("Creators must delete their offers instead of leaving them", 400)
-            return posts
+            return None
         post["members"] = [member for member in post["members"] if member != user["id"]]
-        return posts
+        return post
+
+    def _sync_chat(chat: Dict) -> Dict:
+        chat["member_ids"] = [member for member in chat["member_ids"] if member != user["id"]]
+        return chat
+
+    def _leave_both(txn: storage.Transaction) -> Dict | None:
+        post = txn.update("posts", post_id, _leave)
+        if post is not None and not state["error"]:
+            txn.update("chats", post["chat_id"], _sync_chat)
+        return post
 
-    storage.update_json(POSTS_PATH, _leave)
+    post = storage.transaction(_leave_both)
 
+    if post is None:
+        return jsonify({"error": "Post not found"}), 404
     if state["error"]:
         message, code = state["error"]
         return jsonify({"error": message}), code
-
-    def _sync_chat(chats: List[Dict]) -> List[Dict]:
-        for chat in chats:
-            if chat["id"] == state["post"]["chat_id"]:
-                chat["member_ids"] = [member for member in chat["member_ids"] if member != user["id"]]
-                break
-        return chats
-
-    storage.update_json(CHATS_PATH, _sync_chat)
-    return jsonify(state["post"])
+    return jsonify(post)
 
 
 @bp.route("/posts/<post_id>", methods=["DELETE"])
 def delete_post(post_id: str):
     user = require_auth()
-    state: Dict[str, Dict | tuple[str, int] | None] = {"post": None, "error": None}
-
-    def _delete(posts: List[Dict]) -> List[Dict]:
-        for idx, post in enumerate(posts):
-            if post["id"] != post_id:
-                continue
-            if post["creator_id"] != user["id"]:
-                state["error"] = ("You can only take down offers you created", 403)
-                return posts
-            state["post"] = post
-            posts.pop(idx)
-            break
-        else:
-            state["error"] = ("Post not found", 404)
-        return posts
-
-    storage.update_json(POSTS_PATH, _delete)
-
-    if state["error"]:
-        message, code = state["error"]
-        return jsonify({"error": message}), code
-
-    def _delete_chat(chats: List[Dict]) -> List[Dict]:
-        return [chat for chat in chats if chat["id"] != state["post"]["chat_id"]]
-
-    storage.update_json(CHATS_PATH, _delete_chat)
+    post = storage.get("posts", post_id)
+    if post is None:
+        return jsonify({"error": "Post not found"}), 404
+    # creator_id never changes, so checking it before the delete is race-free
+    if post["creator_id"] != user["id"]:
+        return jsonify({"error": "You can only take down offers you created"}), 403
+
+    def _delete(txn: storage.Transaction) -> None:
+        txn.delete("posts", post_id)
+        txn.delete("chats", post["chat_id"])
+
+    storage.transaction(_delete)
+    # let queued messages land first so they do not recreate the dropped log
+    chat.writer.sync()
+    storage.drop_log("messages", post["chat_id"])
     return jsonify({"success": True})
 
 
@@ -233,5 +340,4 @@ def _sanitize_image(data: str | None) -> str | None:
         raise ValidationError("Could not decode image") from exc
     if len(raw) > MAX_IMAGE_BYTES:
         raise ValidationError("Image must be smaller than 1.5MB")
-    encoded = base64.b64encode(raw).decode()
-    return f"{header},{encoded}"
+    return store_image(raw)
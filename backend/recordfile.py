@@ -0,0 +1,118 @@
+"""Memory-mapped single-record reads for large collections.
+
+For the files named in ``RELINK_MMAP`` (stems, e.g. ``posts,chats``),
+``storage.write_json`` encodes the record list one record at a time and also
+writes a sidecar ``<file>.idx``: the stamp of the data file it describes, then
+fixed-width ``(id, offset, length)`` entries sorted by id. ``RecordFile`` maps
+both files and answers ``get(id)`` with a binary search plus a decode of just
+that record's bytes, so looking one record up costs neither a full parse nor
+memory for the whole collection, and pages are shared with the OS cache.
+
+The index is derived data: it isn't fsynced, and one whose stamp doesn't
+match the data file (written by an older version, or a crash in between) is
+ignored until the next write replaces it. ``open_record_file`` then returns
+None and callers fall back to the parsed snapshot.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from . import formats
+
+MMAP_FILES = frozenset(filter(None, (stem.strip() for stem in os.environ.get("RELINK_MMAP", "").split(","))))
+
+INDEX_MAGIC = b"RLIX1\n"
+# ids are stored NUL-padded; longer ids make a file unindexable
+ID_WIDTH = 40
+_HEADER = struct.Struct("<6sQQQQ")  # magic, stamp (mtime_ns, size, inode), count
+_ENTRY = struct.Struct(f"<{ID_WIDTH}sQI")  # id, offset, length
+
+Span = Tuple[str, int, int]
+
+
+def index_path(target: Path) -> Path:
+    return Path(f"{target}.idx")
+
+
+def wants_index(path: Path) -> bool:
+    return Path(path).stem in MMAP_FILES
+
+
+def write_index(target: Path, stamp: Tuple[int, int, int], spans: Sequence[Span]) -> bool:
+    """Describe the data file ``target`` (at ``stamp``); False if an id doesn't fit."""
+    entries = []
+    for record_id, offset, length in spans:
+        key = record_id.encode()
+        if len(key) > ID_WIDTH:
+            index_path(target).unlink(missing_ok=True)
+            return False
+        entries.append(_ENTRY.pack(key, offset, length))
+    entries.sort()
+    with NamedTemporaryFile("wb", delete=False, dir=target.parent, suffix=".tmp") as tmp:
+        tmp.write(_HEADER.pack(INDEX_MAGIC, *stamp, len(entries)))
+        tmp.write(b"".join(entries))
+    os.replace(tmp.name, index_path(target))
+    return True
+
+
+class RecordFile:
+    """A mapped data file plus its index; see the module docstring."""
+
+    def __init__(
+        self,
+        stamp: Tuple[int, int, int],
+        data: mmap.mmap,
+        index: mmap.mmap,
+        count: int,
+        decode: Callable[[bytes], Any],
+    ):
+        self.stamp = stamp
+        self._decode = decode
+        self._data = data
+        self._index = index
+        self._count = count
+
+    def _entry(self, position: int) -> Tuple[bytes, int, int]:
+        return _ENTRY.unpack_from(self._index, _HEADER.size + position * _ENTRY.size)
+
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        key = record_id.encode().ljust(ID_WIDTH, b"\0")
+        if len(key) > ID_WIDTH:
+            return None
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self._count:
+            return None
+        found, offset, length = self._entry(low)
+        if found != key:
+            return None
+        return self._decode(self._data[offset : offset + length])
+
+
+def open_record_file(target: Path) -> Optional[RecordFile]:
+    """Map ``target`` and its index, or None if the index is missing or stale."""
+    try:
+        with open(target, "rb") as data_file, open(index_path(target), "rb") as index_file:
+            st = os.fstat(data_file.fileno())
+            stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+            header = index_file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return None
+            magic, mtime_ns, size, inode, count = _HEADER.unpack(header)
+            if magic != INDEX_MAGIC or (mtime_ns, size, inode) != stamp or not size:
+                return None
+            data = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+            index = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+    return RecordFile(stamp, data, index, count, formats.record_decoder(data[: len(formats.MSGPACK_MAGIC)]))
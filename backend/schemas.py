@@ -1,17 +1,110 @@
-"""Simple helpers for constructing JSON-friendly objects."""
+"""Simple helpers for constructing JSON-friendly objects.
+
+The ``*_schema`` builders return plain dicts, with ids from ``new_id``.
+Stored records are cached as those dicts unless ``RELINK_SLOT_RECORDS=1``
+asks for the compact ``__slots__`` types further down (``Post``, ``Chat``,
+``Message``, ``Hazard``, ``User``), which read like them: less memory per
+record, at the cost of converting each one back whenever it is encoded, which
+makes whole-file rewrites on the JSON engine several times slower.
+"""
 from __future__ import annotations
 
+import copy
+import os
+import secrets
+import sys
+import threading
 import time
-import uuid
-from typing import Any, Dict, List
+from collections.abc import Mapping, MutableMapping
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Type
+
+# Crockford's base32, lower case: digits sort before letters, so the text
+# of a fixed-width id sorts the same way as the number it encodes
+ID_ALPHABET = "0123456789abcdefghjkmnpqrstvwxyz"
+_ID_PAIRS = [high + low for high in ID_ALPHABET for low in ID_ALPHABET]
+_ID_DECODE = str.maketrans(ID_ALPHABET, "0123456789abcdefghijklmnopqrstuv")
+# id body: milliseconds since the epoch, node, then a per-millisecond counter
+ID_TIME_CHARS, ID_NODE_CHARS, ID_COUNTER_CHARS = 10, 6, 4
+ID_BODY_CHARS = ID_TIME_CHARS + ID_NODE_CHARS + ID_COUNTER_CHARS
+ID_NODE_BITS = 5 * ID_NODE_CHARS
+ID_COUNTER_MAX = 32**ID_COUNTER_CHARS - 1
 
 
 def _ts() -> int:
     return int(time.time())
 
 
-def new_id(prefix: str) -> str:
-    return f"{prefix}_{uuid.uuid4().hex[:8]}"
+def _base32(value: int, width: int) -> str:
+    chars = []
+    for _ in range(width):
+        chars.append(ID_ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+class IdGenerator:
+    """
+    Time-ordered ids, ``<prefix>_<time><node><counter>`` (Snowflake-style).
+
+    The time is the wall clock in milliseconds, held back from ever running
+    backwards; the counter numbers the ids of one millisecond and, should it
+    run out, borrows the next one. Within a process ids are therefore unique
+    and strictly increasing. The node tells processes apart, so it must be
+    unique per process: ``RELINK_NODE_ID`` (below 2**30) pins it (and
+    ``backend.serve`` gives each worker its own), otherwise every process,
+    forked workers included, draws a random one.
+    """
+
+    def __init__(self, node: Optional[int] = None):
+        self._lock = threading.Lock()
+        self._pinned = node is not None
+        self.reseed(node)
+
+    def reseed(self, node: Optional[int] = None) -> None:
+        if node is None:
+            node = secrets.randbits(ID_NODE_BITS)
+        if not 0 <= node < 2**ID_NODE_BITS:
+            raise ValueError(f"Node id must be below 2**{ID_NODE_BITS}")
+        with self._lock:
+            self.node = node
+            self._node_chars = _base32(node, ID_NODE_CHARS)
+            self._ms = -1
+            self._counter = 0
+            self._head = ""
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        if not self._pinned:
+            self.reseed()
+
+    def __call__(self, prefix: str) -> str:
+        with self._lock:
+            now = time.time_ns() // 1_000_000
+            if now > self._ms:
+                self._ms, self._counter = now, 0
+                self._head = _base32(now, ID_TIME_CHARS) + self._node_chars
+            elif self._counter < ID_COUNTER_MAX:
+                self._counter += 1
+            else:
+                self._ms, self._counter = self._ms + 1, 0
+                self._head = _base32(self._ms, ID_TIME_CHARS) + self._node_chars
+            head, counter = self._head, self._counter
+        return f"{prefix}_{head}{_ID_PAIRS[counter >> 10]}{_ID_PAIRS[counter & 1023]}"
+
+
+_node_env = os.environ.get("RELINK_NODE_ID")
+new_id = IdGenerator(int(_node_env) if _node_env else None)
+if hasattr(os, "register_at_fork"):  # pragma: no branch - absent on Windows
+    os.register_at_fork(after_in_child=new_id._after_fork)
+
+
+def id_time(record_id: str) -> Optional[int]:
+    """Milliseconds encoded in a ``new_id`` id; None for older (random) ids."""
+    _, _, body = record_id.rpartition("_")
+    if len(body) != ID_BODY_CHARS or body.strip(ID_ALPHABET):
+        return None
+    return int(body[:ID_TIME_CHARS].translate(_ID_DECODE), 32)
 
 
 def user_schema(email: str, name: str, password_hash: str) -> Dict[str, Any]:
@@ -56,16 +149,17 @@ def chat_schema(post_id: str, member_ids: List[str], chat_id: str | None = None)
         "id": chat_id or new_id("c"),
         "post_id": post_id,
         "member_ids": member_ids,
-        "messages": [],
     }
 
 
 def message_schema(user_id: str, text: str) -> Dict[str, Any]:
+    message_id = new_id("m")
     return {
-        "id": new_id("m"),
+        "id": message_id,
         "user_id": user_id,
         "text": text,
-        "ts": _ts(),
+        # the second the id was minted, so an id alone can serve as a cursor
+        "ts": id_time(message_id) // 1000,
     }
 
 
@@ -85,3 +179,215 @@ def hazard_schema(
         "note": note,
         "created_at": _ts(),
     }
+
+
+# a field the record doesn't have (slots can't just be left out)
+_MISSING: Any = object()
+
+
+def _intern(value: Any) -> Any:
+    if type(value) is str:
+        return sys.intern(value)
+    if type(value) is list:
+        return [sys.intern(item) if type(item) is str else item for item in value]
+    return value
+
+
+class SlotRecord(MutableMapping):
+    """
+    A stored record with one slot per known field instead of a dict.
+
+    It reads and compares like the dict it was built from (``record["id"]``,
+    ``.get``, ``{**record}``, ``== {...}``), so callers needn't care which one
+    they hold, at a fraction of the memory. Keys outside ``FIELDS`` go to an
+    overflow dict that only exists when needed. The ids named in ``INTERN``
+    (single ids or lists of them) are interned, so the copies of one user id
+    across thousands of posts and chats are a single string.
+    """
+
+    __slots__ = ("_extra",)
+    FIELDS: Tuple[str, ...] = ()
+    INTERN: Tuple[str, ...] = ()
+    _readers: Dict[str, Callable[[Any], Any]] = {}
+    _values: Callable[[Any], Tuple[Any, ...]] = staticmethod(lambda record: ())
+    _plan: Tuple[Tuple[str, bool], ...] = ()
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._readers = {name: attrgetter(name) for name in cls.FIELDS}
+        cls._values = staticmethod(attrgetter(*cls.FIELDS))
+        cls._plan = tuple((name, name in cls.INTERN) for name in cls.FIELDS)
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "SlotRecord":
+        record = cls.__new__(cls)
+        get = data.get
+        present = 0
+        for name, interned in cls._plan:
+            value = get(name, _MISSING)
+            if value is not _MISSING:
+                present += 1
+                if interned:
+                    value = _intern(value)
+            setattr(record, name, value)
+        extra = None
+        if len(data) > present:
+            readers = cls._readers
+            extra = {key: value for key, value in data.items() if key not in readers}
+        record._extra = extra
+        return record
+
+    def to_dict(self) -> Dict[str, Any]:
+        """A plain dict with the same contents (what JSON encoders are given)."""
+        out = {name: value for name, value in zip(self.FIELDS, self._values(self)) if value is not _MISSING}
+        if self._extra:
+            out.update(self._extra)
+        return out
+
+    def copy(self) -> Dict[str, Any]:
+        """A shallow, plain-dict copy, like ``dict.copy`` gives for dicts."""
+        return self.to_dict()
+
+    def __getitem__(self, key: str) -> Any:
+        reader = self._readers.get(key)
+        if reader is not None:
+            value = reader(self)
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        reader = self._readers.get(key)
+        if reader is not None:
+            value = reader(self)
+            return default if value is _MISSING else value
+        return default if self._extra is None else self._extra.get(key, default)
+
+    def __contains__(self, key: object) -> bool:
+        reader = self._readers.get(key)  # type: ignore[call-overload]
+        if reader is not None:
+            return reader(self) is not _MISSING
+        return self._extra is not None and key in self._extra
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in self._readers:
+            setattr(self, key, value)
+        elif self._extra is None:
+            self._extra = {key: value}
+        else:
+            self._extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        if key in self._readers:
+            setattr(self, key, _MISSING)
+        else:
+            del self._extra[key]  # type: ignore[index]
+
+    def __iter__(self) -> Iterator[str]:
+        for name, value in zip(self.FIELDS, self._values(self)):
+            if value is not _MISSING:
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        present = sum(1 for value in self._values(self) if value is not _MISSING)
+        return present + (len(self._extra) if self._extra else 0)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, SlotRecord):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, Mapping):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __copy__(self) -> "SlotRecord":
+        return type(self).from_dict(self.to_dict())
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "SlotRecord":
+        return type(self).from_dict(copy.deepcopy(self.to_dict(), memo))
+
+    def __reduce__(self):
+        return type(self).from_dict, (self.to_dict(),)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Post(SlotRecord):
+    FIELDS = (
+        "id",
+        "creator_id",
+        "title",
+        "description",
+        "image",
+        "capacity",
+        "members",
+        "chat_id",
+        "location",
+        "created_at",
+        "version",
+    )
+    INTERN = ("id", "creator_id", "members", "chat_id")
+    __slots__ = FIELDS
+
+
+class Chat(SlotRecord):
+    FIELDS = ("id", "post_id", "member_ids", "version")
+    INTERN = ("id", "post_id", "member_ids")
+    __slots__ = FIELDS
+
+
+class Message(SlotRecord):
+    FIELDS = ("id", "user_id", "text", "ts")
+    INTERN = ("user_id",)
+    __slots__ = FIELDS
+
+
+class Hazard(SlotRecord):
+    FIELDS = ("id", "type", "center", "radius_m", "reporter_id", "note", "created_at", "version")
+    INTERN = ("id", "type", "reporter_id")
+    __slots__ = FIELDS
+
+
+class User(SlotRecord):
+    FIELDS = ("id", "email", "name", "password_hash", "created_at", "version")
+    INTERN = ("id",)
+    __slots__ = FIELDS
+
+
+SLOT_RECORDS = os.environ.get("RELINK_SLOT_RECORDS", "0") == "1"
+# the record type each stored collection is cached as
+RECORD_TYPES: Dict[str, Type[SlotRecord]] = (
+    {"posts": Post, "chats": Chat, "hazards": Hazard, "users": User} if SLOT_RECORDS else {}
+)
+
+
+def as_record(collection: str, record: Any) -> Any:
+    """``record`` as ``collection``'s record type; anything but a plain dict passes through."""
+    record_type = RECORD_TYPES.get(collection)
+    if record_type is None or type(record) is not dict:
+        return record
+    return record_type.from_dict(record)
+
+
+def as_records(collection: str, records: Any) -> Any:
+    record_type = RECORD_TYPES.get(collection)
+    if record_type is None:
+        return records
+    return [record_type.from_dict(record) if type(record) is dict else record for record in records]
+
+
+def plain(value: Any) -> Dict[str, Any]:
+    """``default=`` hook for JSON/msgpack encoders: records encode as their dicts."""
+    # cheaper than an isinstance check against the ABC, once per record written
+    to_dict = getattr(value, "to_dict", None)
+    if to_dict is not None:
+        return to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
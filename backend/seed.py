@@ -20,14 +20,12 @@ def build_seed():
         {"lat": 51.0486, "lng": -114.0708},
     )
     chat = chat_schema(post["id"], [luca["id"], sky["id"]], chat_id=post["chat_id"])
-    chat["messages"].append(
-        {
-            "id": new_id("m"),
-            "user_id": luca["id"],
-            "text": "Welcome! Let us know dietary needs.",
-            "ts": post["created_at"],
-        }
-    )
+    welcome = {
+        "id": new_id("m"),
+        "user_id": luca["id"],
+        "text": "Welcome! Let us know dietary needs.",
+        "ts": post["created_at"],
+    }
 
     hazard = hazard_schema(
         sky["id"],
@@ -42,12 +40,16 @@ def build_seed():
         "posts.json": [post],
         "chats.json": [chat],
         "hazards.json": [hazard],
+        "messages": {chat["id"]: [welcome]},
     }
 
 
 def run():
     seed = build_seed()
+    messages = seed.pop("messages")
     storage.load_seed(seed.items())
+    for chat_id, entries in messages.items():
+        storage.append_log("messages", chat_id, entries)
     print("Seed data written. Accounts: luca@rel.ink / password123")
 
 
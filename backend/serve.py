@@ -0,0 +1,175 @@
+"""Production entry point: gevent workers instead of the threaded dev server.
+
+    python -m backend.serve --workers 4 --port 5050 --max-connections 2000
+
+``python -m backend.app`` runs Werkzeug's development server, which spends an
+OS thread on every open connection and every long-lived WebSocket. Here each
+worker is a process running a gevent WSGI server: connections are green
+threads multiplexed on one event loop, WebSockets go through gevent-websocket,
+and the standard library is monkey-patched so storage locks, the chat writer
+and the bus cooperate with the loop.
+
+With several workers they listen on consecutive ports starting at ``--port``.
+Socket.IO's long-polling transport needs sticky sessions, so put them behind a
+load balancer that pins a client to one worker (e.g. nginx ``ip_hash``). The
+workers share rooms through SOCKETIO_BUS; when it is unset a local broker is
+started next to them (see ``backend.bus``). A pinned ``RELINK_NODE_ID`` is
+handed out as consecutive id nodes, one per worker.
+
+Requires ``pip install gevent gevent-websocket``.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+
+def _options(argv: List[str] | None = None) -> argparse.Namespace:
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description="Run the backend on gevent workers.")
+    parser.add_argument("--host", default=env("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(env("PORT", 5050)), help="First worker's port")
+    parser.add_argument("--workers", type=int, default=int(env("WEB_CONCURRENCY", 1)))
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        default=int(env("MAX_CONNECTIONS", 1000)),
+        help="Open connections per worker; further clients wait to be accepted",
+    )
+    parser.add_argument(
+        "--keepalive",
+        type=float,
+        default=float(env("KEEPALIVE", 75)),
+        help="Seconds before an idle connection is closed",
+    )
+    parser.add_argument(
+        "--ping-interval", type=float, default=float(env("SOCKETIO_PING_INTERVAL", 25)), help="Socket.IO ping interval"
+    )
+    parser.add_argument(
+        "--ping-timeout", type=float, default=float(env("SOCKETIO_PING_TIMEOUT", 20)), help="Socket.IO ping timeout"
+    )
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.max_connections < 1:
+        parser.error("--workers and --max-connections must be at least 1")
+    node = env("RELINK_NODE_ID")
+    # schemas.new_id nodes are 30 bits; worker n mints ids as node + n
+    if node and not 0 <= int(node) <= 2**30 - args.workers:
+        parser.error(f"RELINK_NODE_ID must be between 0 and 2**30 - {args.workers} with {args.workers} workers")
+    if args.keepalive <= args.ping_interval + args.ping_timeout:
+        # idle Socket.IO clients only hear from us every ping interval
+        parser.error("--keepalive must exceed --ping-interval + --ping-timeout")
+    return args
+
+
+def serve_worker(args: argparse.Namespace) -> None:
+    """Run one gevent server in this process until SIGTERM/SIGINT."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        raise SystemExit("backend.serve needs gevent: pip install gevent gevent-websocket")
+    monkey.patch_all()
+
+    import gevent
+    from gevent.pool import Pool
+    from gevent.pywsgi import WSGIHandler, WSGIServer
+
+    try:
+        from geventwebsocket.handler import WebSocketHandler as BaseHandler
+    except ImportError:
+        print("gevent-websocket is not installed; clients will fall back to long-polling.", file=sys.stderr)
+        BaseHandler = WSGIHandler
+
+    os.environ["SOCKETIO_ASYNC_MODE"] = "gevent"
+    os.environ["SOCKETIO_PING_INTERVAL"] = str(args.ping_interval)
+    os.environ["SOCKETIO_PING_TIMEOUT"] = str(args.ping_timeout)
+    from .app import app
+
+    keepalive = args.keepalive
+
+    class Handler(BaseHandler):
+        def __init__(self, sock, address, server, rfile=None):
+            sock.settimeout(keepalive)
+            super().__init__(sock, address, server, rfile)
+
+    server = WSGIServer(
+        (args.host, args.port),
+        app,
+        spawn=Pool(args.max_connections),
+        handler_class=Handler,
+        log=None,
+    )
+    gevent.signal_handler(signal.SIGTERM, server.stop)
+    gevent.signal_handler(signal.SIGINT, server.stop)
+    print(f"Worker {os.getpid()} serving on http://{args.host}:{args.port}", flush=True)
+    server.serve_forever()
+
+
+def worker_env(env: Dict[str, str], index: int) -> Dict[str, str]:
+    """
+    ``env`` for worker ``index``. Id nodes must be unique per process, so a
+    pinned ``RELINK_NODE_ID`` becomes consecutive nodes, one per worker.
+    """
+    node = env.get("RELINK_NODE_ID")
+    if not node:
+        return env
+    return {**env, "RELINK_NODE_ID": str(int(node) + index)}
+
+
+def supervise(args: argparse.Namespace) -> int:
+    """Start one worker process per port and stop them all when one exits."""
+    broker = None
+    env = dict(os.environ)
+    if not env.get("SOCKETIO_BUS"):
+        from .bus import LocalBroker
+
+        path = os.path.join(tempfile.mkdtemp(prefix="relink-bus-"), "bus.sock")
+        broker = LocalBroker(path).start()
+        env["SOCKETIO_BUS"] = f"local://{path}"
+
+    def _command(port: int) -> List[str]:
+        return [
+            sys.executable, "-m", "backend.serve",
+            "--host", args.host,
+            "--port", str(port),
+            "--workers", "1",
+            "--max-connections", str(args.max_connections),
+            "--keepalive", str(args.keepalive),
+            "--ping-interval", str(args.ping_interval),
+            "--ping-timeout", str(args.ping_timeout),
+        ]  # fmt: skip
+
+    workers = [subprocess.Popen(_command(args.port + n), env=worker_env(env, n)) for n in range(args.workers)]
+
+    def _stop(signum, frame):
+        for worker in workers:
+            if worker.poll() is None:
+                worker.terminate()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    try:
+        while all(worker.poll() is None for worker in workers):
+            time.sleep(0.5)
+        _stop(None, None)
+        return max(worker.wait() for worker in workers)
+    finally:
+        if broker is not None:
+            broker.close()
+
+
+def run(argv: List[str] | None = None) -> None:
+    args = _options(argv)
+    if args.workers == 1:
+        serve_worker(args)
+    else:
+        sys.exit(supervise(args))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,332 @@
+"""SQLite storage engine (stdlib ``sqlite3``, WAL mode).
+
+Each record is one row keyed by ``(collection, id)``, so a write touches a
+single row instead of rewriting the whole collection. A per-collection version
+row is bumped in the same transaction as every write; readers compare it to
+decide whether their cached snapshot is still current, which also picks up
+writes made by other processes sharing the database.
+
+Logs (see ``Backend.append_log``) live in ``log_entries``; ``seq`` records
+append order and the ``(stream, key, ts, seq)`` index serves range reads.
+Appends never touch the collection versions. The change log of a collection
+is numbered by its version and written in the same transaction as the
+records, so the two can't disagree. ``update`` re-reads the record inside
+the write transaction and only writes it if its ``version`` is unchanged;
+``transaction`` commits several collections in one SQLite transaction.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+from . import schemas, storage
+from .storage import Backend, Changes, LogCursor, Record, Snapshot
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    body TEXT NOT NULL,
+    UNIQUE (collection, id)
+);
+CREATE TABLE IF NOT EXISTS versions (
+    collection TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS log_entries (
+    seq INTEGER PRIMARY KEY,
+    stream TEXT NOT NULL,
+    key TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS log_entries_by_ts ON log_entries (stream, key, ts, seq);
+"""
+
+
+def _dump(record: Record) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=schemas.plain)
+
+
+class _Txn:
+    """Connection plus the changes one write transaction made."""
+
+    __slots__ = ("conn", "changes", "rebuild")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.changes: Changes = []
+        self.rebuild = False
+
+
+class SqliteBackend(Backend):
+    """Row-per-record engine; see the module docstring for the layout."""
+
+    name = "sqlite"
+
+    def __init__(self, path: Path):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        self._snapshots: Dict[str, Snapshot] = {}
+        # SQLite already serializes writers; this lock additionally keeps the
+        # in-process index notifications in commit order.
+        self._write_lock = threading.RLock()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads, and Flask serves
+        # requests from a pool of them, so keep one connection per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self, collection: str) -> Iterator[_Txn]:
+        """Run one write transaction; the version is bumped only if it changed something."""
+        with self._writing((collection,)) as txns:
+            yield txns[collection]
+
+    @contextmanager
+    def _writing(self, collections: Sequence[str]) -> Iterator[Dict[str, _Txn]]:
+        """Like ``_write``, for several collections committed together."""
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            txns = {collection: _Txn(conn) for collection in collections}
+            try:
+                before = {collection: self._version(conn, collection) for collection in collections}
+                yield txns
+                for collection, txn in txns.items():
+                    if txn.changes or txn.rebuild:
+                        self._bump(conn, collection, before[collection] + 1, None if txn.rebuild else txn.changes)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            for collection, txn in txns.items():
+                if txn.changes or txn.rebuild:
+                    after = before[collection] + 1
+                    changes = None if txn.rebuild else txn.changes
+                    self._announce(collection, self._advance(collection, before[collection], after, changes))
+        # listeners run after the write lock is released, so they can't stall other writers
+        self._deliver()
+
+    def _bump(self, conn: sqlite3.Connection, collection: str, seq: int, changes: Optional[Changes]) -> None:
+        conn.execute(
+            "INSERT INTO versions (collection, version) VALUES (?, 1) "
+            "ON CONFLICT (collection) DO UPDATE SET version = version + 1",
+            (collection,),
+        )
+        retain = storage.CHANGELOG_RETAIN
+        self._insert_log(conn, storage.CHANGE_STREAM, {collection: storage.change_entries(seq, changes)})
+        if seq % storage.CHANGELOG_COMPACT_EVERY == 0 and seq > retain:
+            self._delete_log_before(conn, storage.CHANGE_STREAM, collection, seq - retain + 1)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # connections run in autocommit mode, so group statements explicitly
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _version(conn: sqlite3.Connection, collection: str) -> int:
+        row = conn.execute("SELECT version FROM versions WHERE collection = ?", (collection,)).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _select(conn: sqlite3.Connection, collection: str, record_id: str) -> Optional[Record]:
+        row = conn.execute(
+            "SELECT body FROM records WHERE collection = ? AND id = ?", (collection, record_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def stamp(self, collection: str) -> int:
+        return self._version(self._conn(), collection)
+
+    def snapshot(self, collection: str) -> Snapshot:
+        conn = self._conn()
+        cached = self._snapshots.get(collection) if storage.CACHE_ENABLED else None
+        if cached is not None and cached.stamp == self._version(conn, collection):
+            return cached
+        # read the version and the rows in one transaction so they agree
+        conn.execute("BEGIN")
+        try:
+            version = self._version(conn, collection)
+            rows = conn.execute(
+                "SELECT body FROM records WHERE collection = ? ORDER BY rowid", (collection,)
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        records = schemas.as_records(collection, [json.loads(body) for (body,) in rows])
+        snapshot = Snapshot(version, tuple(records))
+        if storage.CACHE_ENABLED:
+            self._snapshots[collection] = snapshot
+        return snapshot
+
+    def get(self, collection: str, record_id: str) -> Optional[Record]:
+        return self._select(self._conn(), collection, record_id)
+
+    def put(self, collection: str, record: Record) -> Record:
+        with self._write(collection) as txn:
+            old = self._select(txn.conn, collection, record["id"])
+            txn.conn.execute(
+                "INSERT INTO records (collection, id, body) VALUES (?, ?, ?) "
+                "ON CONFLICT (collection, id) DO UPDATE SET body = excluded.body",
+                (collection, record["id"], _dump(record)),
+            )
+            txn.changes.append((old, record))
+        return record
+
+    def _swap(self, collection: str, record_id: str, version: int, record: Record) -> Optional[Record]:
+        with self._write(collection) as txn:
+            current = self._select(txn.conn, collection, record_id)
+            if current is None:
+                return None
+            if current.get("version", 0) != version:
+                raise storage.VersionConflict(f"{collection}/{record_id} changed")
+            txn.conn.execute(
+                "UPDATE records SET body = ? WHERE collection = ? AND id = ?",
+                (_dump(record), collection, record_id),
+            )
+            txn.changes.append((current, record))
+        return record
+
+    def _commit_transaction(self, txn: storage.Transaction) -> None:
+        with self._writing(txn.collections) as txns:
+            conn = self._conn()
+            txn.check(lambda collection, record_id: self._select(conn, collection, record_id))
+            for collection, images in txn.staged.items():
+                for record_id, record in images.items():
+                    old = self._select(conn, collection, record_id)
+                    if old == record:
+                        continue
+                    if record is None:
+                        conn.execute("DELETE FROM records WHERE collection = ? AND id = ?", (collection, record_id))
+                    else:
+                        conn.execute(
+                            "INSERT INTO records (collection, id, body) VALUES (?, ?, ?) "
+                            "ON CONFLICT (collection, id) DO UPDATE SET body = excluded.body",
+                            (collection, record_id, _dump(record)),
+                        )
+                    txns[collection].changes.append((old, record))
+
+    def delete(self, collection: str, record_id: str) -> Optional[Record]:
+        with self._write(collection) as txn:
+            row = txn.conn.execute(
+                "DELETE FROM records WHERE collection = ? AND id = ? RETURNING body",
+                (collection, record_id),
+            ).fetchone()
+            removed = json.loads(row[0]) if row else None
+            if removed is not None:
+                txn.changes.append((removed, None))
+        return removed
+
+    def delete_where(self, collection: str, predicate: Callable[[Record], bool]) -> int:
+        with self._write(collection) as txn:
+            rows = txn.conn.execute("SELECT body FROM records WHERE collection = ?", (collection,))
+            doomed = [record for record in (json.loads(body) for (body,) in rows) if predicate(record)]
+            txn.conn.executemany(
+                "DELETE FROM records WHERE collection = ? AND id = ?",
+                [(collection, record["id"]) for record in doomed],
+            )
+            txn.changes.extend((record, None) for record in doomed)
+        return len(doomed)
+
+    def replace_all(self, collection: str, records: Sequence[Record]) -> None:
+        with self._write(collection) as txn:
+            txn.conn.execute("DELETE FROM records WHERE collection = ?", (collection,))
+            txn.conn.executemany(
+                "INSERT INTO records (collection, id, body) VALUES (?, ?, ?)",
+                [(collection, record["id"], _dump(record)) for record in records],
+            )
+            txn.rebuild = True
+
+    def append_log(self, stream: str, key: str, records: Sequence[Record], *, sync: bool = True) -> None:
+        self.append_logs(stream, {key: records}, sync=sync)
+
+    def append_logs(
+        self, stream: str, batches: Dict[str, Sequence[Record]], *, sync: bool = True
+    ) -> None:
+        # one transaction, so one WAL sync for the whole batch; every commit is
+        # durable (synchronous=FULL), so ``sync`` needs no extra work here
+        with self._transaction() as conn:
+            self._insert_log(conn, stream, batches)
+
+    @staticmethod
+    def _insert_log(conn: sqlite3.Connection, stream: str, batches: Dict[str, Sequence[Record]]) -> None:
+        conn.executemany(
+            "INSERT INTO log_entries (stream, key, ts, id, body) VALUES (?, ?, ?, ?, ?)",
+            [
+                (stream, key, record["ts"], record["id"], _dump(record))
+                for key, records in batches.items()
+                for record in records
+            ],
+        )
+
+    @staticmethod
+    def _delete_log_before(conn: sqlite3.Connection, stream: str, key: str, ts: int) -> None:
+        conn.execute("DELETE FROM log_entries WHERE stream = ? AND key = ? AND ts < ?", (stream, key, ts))
+
+    @staticmethod
+    def _log_bound(
+        conn: sqlite3.Connection, stream: str, key: str, cursor: LogCursor, op: str
+    ) -> tuple[str, list]:
+        """SQL condition for entries on the ``op`` side of ``cursor``."""
+        ts, entry_id = cursor
+        row = None
+        if entry_id is not None:
+            row = conn.execute(
+                "SELECT seq FROM log_entries WHERE stream = ? AND key = ? AND ts = ? AND id = ?",
+                (stream, key, ts, entry_id),
+            ).fetchone()
+        if row is None:
+            return f" AND ts {op} ?", [ts]
+        return f" AND (ts, seq) {op} (?, ?)", [ts, row[0]]
+
+    def read_log(
+        self,
+        stream: str,
+        key: str,
+        *,
+        after: Optional[LogCursor] = None,
+        before: Optional[LogCursor] = None,
+        limit: Optional[int] = None,
+        descending: bool = False,
+    ) -> List[Record]:
+        conn = self._conn()
+        sql = "SELECT body FROM log_entries WHERE stream = ? AND key = ?"
+        params: list = [stream, key]
+        for cursor, op in ((after, ">"), (before, "<")):
+            if cursor is not None:
+                condition, values = self._log_bound(conn, stream, key, cursor, op)
+                sql += condition
+                params.extend(values)
+        sql += " ORDER BY ts DESC, seq DESC" if descending else " ORDER BY ts, seq"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [json.loads(body) for (body,) in conn.execute(sql, params)]
+
+    def drop_log(self, stream: str, key: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM log_entries WHERE stream = ? AND key = ?", (stream, key))
+
+    def trim_log(self, stream: str, key: str, before: LogCursor) -> None:
+        with self._transaction() as conn:
+            self._delete_log_before(conn, stream, key, before[0])
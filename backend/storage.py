@@ -1,16 +1,36 @@
-"""Storage helpers for JSON files with portable file locking.
+"""The storage layer: collections of records behind a pluggable backend.
 
-This module centralizes all disk interactions so the rest of the app can
-trust atomic, serialized access to the JSON blobs we use as a local data store.
+Route modules talk to collections through the ``get``/``put``/``update``/
+``transaction``/... helpers at the bottom, which dispatch to the ``Backend``
+picked by RELINK_STORAGE: ``JsonBackend`` (one file per collection, the
+default) or ``sqlite_backend.SqliteBackend``. Both give records versions for
+compare-and-swap updates, commit multi-collection transactions atomically
+(the JSON engine through group commits and a write-ahead log), number every
+commit in a per-collection change log, keep registered secondary indexes in
+step with commits and notify subscribed listeners. Append-only logs (chat
+messages, change logs) sit alongside in ``logstore``.
+
+Below the backends are the file helpers: portable file locks, atomic writes
+in the configured ``formats``, and a stat-stamped cache of parsed files.
 """
 from __future__ import annotations
 
-import json
+import copy
+import hashlib
+import itertools
+import logging
 import os
-from contextlib import contextmanager
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
 from tempfile import NamedTemporaryFile
-from typing import Any, Iterable
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence
+
+from . import formats, recordfile, schemas
+
+log = logging.getLogger(__name__)
 
 IS_WINDOWS = os.name == "nt"
 
@@ -20,6 +40,51 @@ else:  # pragma: no cover - skipped on Windows
     import fcntl
 
 DEFAULT_DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+CACHE_ENABLED = os.environ.get("RELINK_CACHE", "1") != "0"
+# back-off bounds (seconds) while another process holds a file lock
+LOCK_POLL_MIN = 0.0005
+LOCK_POLL_MAX = 0.01
+# every collection's commits are numbered in the log ``changes/<collection>``
+CHANGE_STREAM = "changes"
+# commits kept in a change log; older ones are compacted away every so often
+CHANGELOG_RETAIN = int(os.environ.get("RELINK_CHANGELOG_RETAIN", 10000))
+CHANGELOG_COMPACT_EVERY = 1000
+# write-ahead entries of multi-collection commits, under the data dir
+WAL_DIR = "wal"
+# updates take one of this many in-process locks, picked by record id
+LOCK_STRIPES = int(os.environ.get("RELINK_LOCK_STRIPES", 64))
+# compare-and-swap attempts before an update gives up on a busy record
+UPDATE_RETRIES = 16
+
+Stamp = tuple[int, int, int]
+Record = Dict[str, Any]
+
+
+class Snapshot:
+    """
+    Parsed collection contents plus the stamp they were read at.
+
+    ``derived`` holds lookup structures computed from ``data``; they live and
+    die with the snapshot, so a newer stamp automatically rebuilds them.
+    """
+
+    __slots__ = ("stamp", "data", "derived")
+
+    def __init__(self, stamp: Hashable, data: Any):
+        self.stamp = stamp
+        self.data = data
+        self.derived: Dict[str, Any] = {}
+
+    def derive(self, name: str, builder: Callable[[Any], Any]) -> Any:
+        value = self.derived.get(name)
+        if value is None:
+            value = self.derived[name] = builder(self.data)
+        return value
+
+
+_cache: dict[Path, Snapshot] = {}
+_cache_lock = threading.Lock()
+_process_locks: Dict[Path, threading.Lock] = {}
 
 
 def get_data_dir() -> Path:
@@ -38,12 +103,45 @@ def _ensure_file(path: Path) -> None:
         path.write_text("[]", encoding="utf-8")
 
 
+def _process_lock(lock_file: Path) -> threading.Lock:
+    lock = _process_locks.get(lock_file)
+    if lock is None:
+        with _cache_lock:
+            lock = _process_locks.setdefault(lock_file, threading.Lock())
+    return lock
+
+
+def _flock(handle) -> None:
+    # Poll instead of blocking in flock(): a blocked syscall would stall every
+    # green thread on this OS thread. Other threads of this process are already
+    # kept out by the process lock, so only other processes make us wait here.
+    delay = LOCK_POLL_MIN
+    while True:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            time.sleep(delay)
+            delay = min(delay * 2, LOCK_POLL_MAX)
+
+
 @contextmanager
 def with_lock(path: Path):
-    """Acquire an exclusive lock on ``path`` via a sibling ``.lock`` file."""
+    """
+    Acquire an exclusive lock on ``path`` via a sibling ``.lock`` file.
+
+    A per-path lock is taken first, so within one process only a single
+    thread (or green thread, under the gevent server) ever waits on the file.
+    """
     lock_file = Path(f"{path}.lock")
     lock_file.parent.mkdir(parents=True, exist_ok=True)
 
+    with _process_lock(lock_file), _os_lock(lock_file):
+        yield
+
+
+@contextmanager
+def _os_lock(lock_file: Path):
     if IS_WINDOWS:
         lock_file.touch(exist_ok=True)
         with open(lock_file, "r+", encoding="utf-8") as handle:
@@ -59,44 +157,1127 @@ def with_lock(path: Path):
                 msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
     else:
         with open(lock_file, "w", encoding="utf-8") as handle:
-            fcntl.flock(handle, fcntl.LOCK_EX)
+            _flock(handle)
             try:
                 yield
             finally:
                 fcntl.flock(handle, fcntl.LOCK_UN)
 
 
+def _stamp_of(stat: os.stat_result) -> Stamp:
+    # os.replace swaps the inode, so (mtime, size, inode) changes on every write
+    # even when two writes land within the filesystem's timestamp granularity.
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _view(target: Path, data: Any) -> Any:
+    """
+    Wrap top-level collections so shared cache entries can't be appended to.
+
+    Records of the collections ``schemas`` has a type for are held as that
+    type rather than as dicts.
+    """
+    return tuple(schemas.as_records(target.stem, data)) if isinstance(data, list) else data
+
+
+def _remember(target: Path, stamp: Stamp, data: Any) -> Snapshot:
+    snapshot = Snapshot(stamp, _view(target, data))
+    with _cache_lock:
+        _cache[target] = snapshot
+    return snapshot
+
+
 def read_json(path: Path) -> Any:
     """Load JSON data from ``path`` after ensuring it exists."""
     path = get_data_dir() / path
     _ensure_file(path)
-    with path.open("r", encoding="utf-8") as handle:
-        return json.load(handle)
+    return formats.decode(path.read_bytes())
+
+
+def read_cached(path: Path) -> Any:
+    """
+    Return the parsed contents of ``path`` from the in-process cache.
+
+    The file is only re-parsed when its stat stamp changes, so hot read paths
+    pay for a ``stat`` instead of a full ``json.load``. The result is shared
+    between callers and must be treated as read-only; use ``read_json`` when a
+    private, mutable copy is needed.
+    """
+    return cached_snapshot(path).data
+
+
+def cached_snapshot(path: Path) -> Snapshot:
+    """Like ``read_cached`` but returns the whole ``Snapshot`` (stamp + derived)."""
+    target = get_data_dir() / path
+    _ensure_file(target)
+    entry = _cache.get(target) if CACHE_ENABLED else None
+    if entry is not None and entry.stamp == _stamp_of(os.stat(target)):
+        return entry
+    with target.open("rb") as handle:
+        stamp = _stamp_of(os.fstat(handle.fileno()))
+        data = formats.decode(handle.read())
+    if not CACHE_ENABLED:
+        return Snapshot(stamp, _view(target, data))
+    return _remember(target, stamp, data)
+
+
+def invalidate_cache(path: Path | None = None) -> None:
+    """Drop cached entries for ``path`` (or everything when omitted)."""
+    with _cache_lock:
+        if path is None:
+            _cache.clear()
+        else:
+            _cache.pop(get_data_dir() / path, None)
+
 
+def write_json(path: Path, payload: Any) -> Stamp:
+    """
+    Atomically write ``payload`` to ``path`` using a temp file; returns its stamp.
 
-def write_json(path: Path, payload: Any) -> None:
-    """Atomically write ``payload`` to ``path`` using a temp file."""
+    The encoding is the one ``formats`` configures for the file (compact JSON
+    unless set otherwise); readers detect it, whatever it is. Files picked
+    for memory-mapped reads also get their record index (see ``recordfile``).
+    """
     target = get_data_dir() / path
     target.parent.mkdir(parents=True, exist_ok=True)
-    with NamedTemporaryFile("w", delete=False, dir=target.parent, encoding="utf-8") as tmp:
-        json.dump(payload, tmp, ensure_ascii=False, indent=2)
+    fmt = formats.format_for(path)
+    spans = None
+    if recordfile.wants_index(path) and isinstance(payload, (list, tuple)):
+        data, offsets = fmt.dump_records(payload)
+        spans = [(record["id"], offset, length) for record, (offset, length) in zip(payload, offsets)]
+    else:
+        data = fmt.dump(payload)
+    with NamedTemporaryFile("wb", delete=False, dir=target.parent) as tmp:
+        tmp.write(data)
         tmp.flush()
         os.fsync(tmp.fileno())
+        stamp = _stamp_of(os.fstat(tmp.fileno()))
         tmp_path = Path(tmp.name)
+    if spans is not None:
+        recordfile.write_index(target, stamp, spans)
     os.replace(tmp_path, target)
+    if CACHE_ENABLED:
+        # write-through: the payload we just persisted is exactly what the next
+        # reader would parse, so skip the round trip through disk.
+        _remember(target, stamp, payload)
+    return stamp
 
 
-def update_json(path: Path, transform: Any) -> Any:
-    """Read, transform, and persist ``path`` under a lock."""
-    target = get_data_dir() / path
-    with with_lock(target):
-        data = read_json(path)
-        new_data = transform(data)
-        write_json(path, new_data)
-    return new_data
+def blob_path(digest: str) -> Path:
+    """Location of the content-addressed blob ``digest`` (sha256 hex)."""
+    return get_data_dir() / "blobs" / digest[:2] / digest
+
+
+def put_blob(data: bytes) -> str:
+    """Store ``data`` once under its sha256 and return the digest."""
+    digest = hashlib.sha256(data).hexdigest()
+    target = blob_path(digest)
+    if target.exists():
+        return digest
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile("wb", delete=False, dir=target.parent) as tmp:
+        tmp.write(data)
+        tmp.flush()
+        os.fsync(tmp.fileno())
+        tmp_path = Path(tmp.name)
+    # identical bytes always land on the same name, so a concurrent writer
+    # racing us here replaces the blob with an identical copy
+    os.replace(tmp_path, target)
+    return digest
 
 
 def load_seed(paths: Iterable[tuple[str, Any]]) -> None:
-    """Utility used by the seeding script to overwrite multiple files."""
+    """Utility used by the seeding script to overwrite multiple collections."""
     for relative, payload in paths:
-        write_json(Path(relative), payload)
+        replace_all(Path(relative).stem, payload)
+
+
+def _index_by_id(records: Sequence[Record]) -> Dict[str, Record]:
+    return {record["id"]: record for record in records}
+
+
+# (ts, id) position in a log; a None id is the boundary of second ``ts``
+LogCursor = tuple[int, Optional[str]]
+
+# (old, new) record pairs describing one commit; ``old`` is None for inserts
+# and ``new`` is None for deletes.
+Changes = List[tuple[Optional[Record], Optional[Record]]]
+
+
+def change_entries(seq: int, changes: Optional[Changes]) -> List[Record]:
+    """
+    Change log lines for commit ``seq``: ``{"id", "ts": seq, "op"}`` with op
+    ``put`` or ``delete`` per record, or a single ``reset`` when the whole
+    collection was replaced.
+    """
+    if changes is None:
+        return [{"id": "*", "ts": seq, "op": "reset"}]
+    return [
+        {"id": (new if new is not None else old)["id"], "ts": seq, "op": "put" if new is not None else "delete"}
+        for old, new in changes
+    ]
+
+
+class Index:
+    """
+    Secondary index over one collection.
+
+    Subclasses implement ``clear``/``add``/``remove``. Storage rebuilds an index
+    from a snapshot when it falls out of step with the collection and otherwise
+    feeds it every change committed through this process, so lookups never
+    rescan the collection.
+    """
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def add(self, record: Record) -> None:
+        raise NotImplementedError
+
+    def remove(self, record: Record) -> None:
+        raise NotImplementedError
+
+    def build(self, records: Iterable[Record]) -> None:
+        self.clear()
+        for record in records:
+            self.add(record)
+
+
+_index_factories: Dict[str, Dict[str, Callable[[], Index]]] = {}
+_listeners: Dict[str, List[Callable[[Optional[Changes]], None]]] = {}
+
+
+def register_index(collection: str, name: str, factory: Callable[[], Index]) -> None:
+    """Declare an index that every backend maintains for ``collection``."""
+    _index_factories.setdefault(collection, {})[name] = factory
+
+
+def subscribe(collection: str, listener: Callable[[Optional[Changes]], None]) -> None:
+    """
+    Call ``listener(changes)`` after every commit to ``collection`` made by
+    this process; ``changes`` is None when the whole collection was replaced.
+    """
+    _listeners.setdefault(collection, []).append(listener)
+
+
+class VersionConflict(Exception):
+    """A record's ``version`` moved on between reading and writing it."""
+
+
+def _version_of(record: Optional[Record]) -> Optional[int]:
+    return None if record is None else record.get("version", 0)
+
+
+def _apply_records(
+    records: List[Record], images: Iterable[tuple[str, Optional[Record]]]
+) -> tuple[List[Record], Changes]:
+    """Upsert (or, for a None image, delete) records by id; returns the new list and what changed."""
+    positions = {record["id"]: idx for idx, record in enumerate(records)}
+    removed = set()
+    changes: Changes = []
+    for record_id, record in images:
+        idx = positions.get(record_id)
+        old = records[idx] if idx is not None else None
+        if old == record:
+            continue
+        if record is None:
+            removed.add(idx)
+            del positions[record_id]
+        elif idx is None:
+            positions[record_id] = len(records)
+            records.append(record)
+        else:
+            records[idx] = record
+        changes.append((old, record))
+    if removed:
+        records = [record for idx, record in enumerate(records) if idx not in removed]
+    return records, changes
+
+
+class Transaction:
+    """
+    Reads and writes staged by one ``Backend.transaction`` attempt.
+
+    Reads see the transaction's own writes. Every record read is checked
+    again at commit, so the transaction only commits if none of them changed
+    in the meantime.
+    """
+
+    def __init__(self, backend: "Backend"):
+        self._backend = backend
+        # (collection, id) -> version read, or None for a missing record
+        self.reads: Dict[tuple[str, str], Optional[int]] = {}
+        # collection -> id -> record to store, or None to delete
+        self.staged: Dict[str, Dict[str, Optional[Record]]] = {}
+
+    @property
+    def collections(self) -> List[str]:
+        return sorted({collection for collection, _ in self.reads} | set(self.staged))
+
+    def get(self, collection: str, record_id: str) -> Optional[Record]:
+        staged = self.staged.get(collection, {})
+        if record_id in staged:
+            return staged[record_id]
+        record = self._backend.get(collection, record_id)
+        self.reads.setdefault((collection, record_id), _version_of(record))
+        return record
+
+    def put(self, collection: str, record: Record) -> Record:
+        self.staged.setdefault(collection, {})[record["id"]] = record
+        return record
+
+    def update(
+        self, collection: str, record_id: str, fn: Callable[[Record], Optional[Record]]
+    ) -> Optional[Record]:
+        """Like ``Backend.update``, staged until the transaction commits."""
+        current = self.get(collection, record_id)
+        if current is None:
+            return None
+        changed = fn(copy.deepcopy(current))
+        if changed is None:
+            return current
+        changed["version"] = current.get("version", 0) + 1
+        return self.put(collection, changed)
+
+    def delete(self, collection: str, record_id: str) -> Optional[Record]:
+        current = self.get(collection, record_id)
+        if current is not None:
+            self.staged.setdefault(collection, {})[record_id] = None
+        return current
+
+    def check(self, current: Callable[[str, str], Optional[Record]]) -> None:
+        """Raise ``VersionConflict`` if a record read has changed since."""
+        for (collection, record_id), version in self.reads.items():
+            if _version_of(current(collection, record_id)) != version:
+                raise VersionConflict(f"{collection}/{record_id} changed")
+
+
+class _IndexState:
+    __slots__ = ("index", "stamp", "lock")
+
+    def __init__(self, index: Index):
+        self.index = index
+        self.stamp: Hashable = None
+        self.lock = threading.RLock()
+
+
+class Backend:
+    """
+    Collection-oriented storage engine.
+
+    Records are JSON-friendly dicts keyed by their ``id``. Reads may be served
+    from shared snapshots, so callers treat returned records as read-only and
+    make changes through ``put``/``update``/``delete``.
+    """
+
+    name = "base"
+
+    def __init__(self) -> None:
+        self._index_states: Dict[tuple[str, str], _IndexState] = {}
+        self._index_states_lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(max(1, LOCK_STRIPES))]
+        # commits waiting for listeners, in commit order (see ``_announce``)
+        self._notices: deque[tuple[str, Optional[Changes]]] = deque()
+        self._notices_lock = threading.Lock()
+        self._delivering = False
+
+    def stamp(self, collection: str) -> Hashable:
+        """Cheap token that changes whenever ``collection`` does."""
+        raise NotImplementedError
+
+    def snapshot(self, collection: str) -> Snapshot:
+        raise NotImplementedError
+
+    def all_records(self, collection: str) -> Sequence[Record]:
+        return self.snapshot(collection).data
+
+    def get(self, collection: str, record_id: str) -> Optional[Record]:
+        return self.snapshot(collection).derive("by_id", _index_by_id).get(record_id)
+
+    def query(self, collection: str, **equals: Any) -> List[Record]:
+        """Records whose top-level fields equal every keyword given."""
+        items = equals.items()
+        return [
+            record
+            for record in self.all_records(collection)
+            if all(record.get(key) == value for key, value in items)
+        ]
+
+    def put(self, collection: str, record: Record) -> Record:
+        """Insert ``record``, replacing any existing record with the same id."""
+        raise NotImplementedError
+
+    def update(
+        self,
+        collection: str,
+        record_id: str,
+        fn: Callable[[Record], Optional[Record]],
+        *,
+        expected_version: Optional[int] = None,
+    ) -> Optional[Record]:
+        """
+        Atomically read-modify-write one record.
+
+        ``fn`` gets a private copy of the current record and returns the record
+        to store, or ``None`` to leave it untouched. Returns the stored record,
+        or ``None`` when no record has ``record_id``.
+
+        Stored records carry a ``version`` that every update bumps. ``fn`` runs
+        outside the collection's write lock and the result is only written if
+        the version is still the one it read (compare-and-swap), so ``fn`` may
+        be called again and must not rely on side effects of an earlier call.
+        Updates to the same record within a process queue on a striped lock
+        instead of spinning. With ``expected_version`` a mismatch raises
+        ``VersionConflict`` rather than retrying.
+        """
+        with self._stripes[hash((collection, record_id)) % len(self._stripes)]:
+            for _ in range(UPDATE_RETRIES):
+                current = self.get(collection, record_id)
+                if current is None:
+                    return None
+                version = current.get("version", 0)
+                if expected_version is not None and version != expected_version:
+                    raise VersionConflict(f"{collection}/{record_id} is at version {version}")
+                changed = fn(copy.deepcopy(current))
+                if changed is None:
+                    return current
+                changed["version"] = version + 1
+                try:
+                    return self._swap(collection, record_id, version, changed)
+                except VersionConflict:
+                    if expected_version is not None:
+                        raise
+        raise VersionConflict(f"{collection}/{record_id} kept changing")
+
+    def _swap(self, collection: str, record_id: str, version: int, record: Record) -> Optional[Record]:
+        """
+        Replace the record if it is still at ``version``; raise
+        ``VersionConflict`` if not. Returns ``record``, or None when the record
+        is gone.
+        """
+        raise NotImplementedError
+
+    def transaction(self, fn: Callable[[Transaction], Any]) -> Any:
+        """
+        Run ``fn(txn)`` and commit what it staged across collections at once.
+
+        ``fn`` reads and writes through ``txn`` (``get``/``put``/``update``/
+        ``delete``); nothing is visible to others until it returns, and then
+        all of it is, even across a crash. Like ``update``, ``fn`` may be
+        called again if a record it read changed before the commit. Returns
+        whatever ``fn`` returned; an exception from ``fn`` discards the
+        transaction.
+        """
+        for _ in range(UPDATE_RETRIES):
+            txn = Transaction(self)
+            result = fn(txn)
+            if not txn.staged:
+                return result
+            try:
+                self._commit_transaction(txn)
+            except VersionConflict:
+                continue
+            return result
+        raise VersionConflict("transaction kept conflicting")
+
+    def _commit_transaction(self, txn: Transaction) -> None:
+        """Validate ``txn.reads`` and write ``txn.staged`` atomically."""
+        raise NotImplementedError
+
+    def recover(self) -> int:
+        """Finish commits a crash interrupted; returns how many there were."""
+        return 0
+
+    def delete(self, collection: str, record_id: str) -> Optional[Record]:
+        raise NotImplementedError
+
+    def delete_where(self, collection: str, predicate: Callable[[Record], bool]) -> int:
+        raise NotImplementedError
+
+    def replace_all(self, collection: str, records: Sequence[Record]) -> None:
+        raise NotImplementedError
+
+    def append_log(self, stream: str, key: str, records: Sequence[Record], *, sync: bool = True) -> None:
+        """
+        Append ``records`` (each with ``id`` and integer ``ts``) to one log.
+
+        Logs are append-only sequences kept apart from the collections, e.g.
+        the messages of one chat. Entries are ordered by ``ts``, then by
+        append order.
+        """
+        raise NotImplementedError
+
+    def append_logs(
+        self, stream: str, batches: Dict[str, Sequence[Record]], *, sync: bool = True
+    ) -> None:
+        """Append to several logs of ``stream`` at once, syncing to disk once at the end."""
+        for key, records in batches.items():
+            self.append_log(stream, key, records, sync=sync)
+
+    def read_log(
+        self,
+        stream: str,
+        key: str,
+        *,
+        after: Optional[LogCursor] = None,
+        before: Optional[LogCursor] = None,
+        limit: Optional[int] = None,
+        descending: bool = False,
+    ) -> List[Record]:
+        """
+        Entries of one log strictly between two ``(ts, id)`` cursors.
+
+        A cursor with a ``None`` id marks the boundary of that second, so
+        ``after=(ts, None)`` means "newer than ``ts``". Returns up to ``limit``
+        entries, oldest first, or the newest ones newest first with
+        ``descending``.
+        """
+        raise NotImplementedError
+
+    def drop_log(self, stream: str, key: str) -> None:
+        raise NotImplementedError
+
+    def trim_log(self, stream: str, key: str, before: LogCursor) -> None:
+        """Forget entries older than ``before``; backends may keep a few of them."""
+        raise NotImplementedError
+
+    def _log_commit(self, collection: str, changes: Optional[Changes]) -> None:
+        """Number one commit in the change log; call it holding the collection's write lock."""
+        last = self.read_log(CHANGE_STREAM, collection, limit=1, descending=True)
+        seq = last[0]["ts"] + 1 if last else 1
+        self.append_log(CHANGE_STREAM, collection, change_entries(seq, changes))
+        if seq % CHANGELOG_COMPACT_EVERY == 0 and seq > CHANGELOG_RETAIN:
+            self.trim_log(CHANGE_STREAM, collection, (seq - CHANGELOG_RETAIN + 1, None))
+
+    def changes_since(
+        self, collection: str, since: int, limit: Optional[int] = None
+    ) -> tuple[int, Optional[List[Record]]]:
+        """
+        ``(seq, entries)``: the latest commit number of ``collection`` and the
+        change log entries after commit ``since``, oldest first.
+
+        ``entries`` is None when the log can't answer: ``since`` is 0, newer
+        than the log (which was dropped or belongs to another engine), older
+        than its compacted start, more than ``limit`` entries back, or the
+        collection was replaced wholesale since. Callers then start over from
+        a full snapshot.
+        """
+        last = self.read_log(CHANGE_STREAM, collection, limit=1, descending=True)
+        seq = last[0]["ts"] if last else 0
+        if since <= 0 or since > seq:
+            return seq, None
+        first = self.read_log(CHANGE_STREAM, collection, limit=1)
+        if since < first[0]["ts"] - 1:
+            return seq, None
+        entries = self.read_log(
+            CHANGE_STREAM,
+            collection,
+            after=(since, None),
+            before=(seq + 1, None),
+            limit=None if limit is None else limit + 1,
+        )
+        if (limit is not None and len(entries) > limit) or any(entry["op"] == "reset" for entry in entries):
+            return seq, None
+        return seq, entries
+
+    def _index_state(self, collection: str, name: str) -> _IndexState:
+        key = (collection, name)
+        state = self._index_states.get(key)
+        if state is None:
+            with self._index_states_lock:
+                state = self._index_states.get(key)
+                if state is None:
+                    state = self._index_states[key] = _IndexState(_index_factories[collection][name]())
+        return state
+
+    @contextmanager
+    def indexed(self, collection: str, name: str):
+        """Yield the up-to-date index ``name``; hold it only for the lookup."""
+        state = self._index_state(collection, name)
+        with state.lock:
+            if state.stamp is None or state.stamp != self.stamp(collection):
+                snapshot = self.snapshot(collection)
+                state.index.build(snapshot.data)
+                state.stamp = snapshot.stamp
+            yield state.index
+
+    def _committed(
+        self, collection: str, before: Hashable, after: Hashable, changes: Optional[Changes]
+    ) -> None:
+        """Advance in-step indexes past a commit, then notify listeners."""
+        self._announce(collection, self._advance(collection, before, after, changes))
+        self._deliver()
+
+    def _advance(
+        self, collection: str, before: Hashable, after: Hashable, changes: Optional[Changes]
+    ) -> Optional[Changes]:
+        """Advance in-step indexes past a commit; returns the changes as indexed.
+
+        Indexes that were not in step with ``before`` are marked stale and
+        rebuild lazily on their next lookup.
+        """
+        if changes is not None:
+            # indexes hold the same record types as the snapshots they mirror
+            changes = [(old, schemas.as_record(collection, new)) for old, new in changes]
+        for (indexed_collection, _), state in list(self._index_states.items()):
+            if indexed_collection != collection:
+                continue
+            with state.lock:
+                if state.stamp == after:
+                    continue
+                if changes is None or state.stamp != before:
+                    state.stamp = None
+                    continue
+                for old, new in changes:
+                    if old is not None:
+                        state.index.remove(old)
+                    if new is not None:
+                        state.index.add(new)
+                state.stamp = after
+        return changes
+
+    def _announce(self, collection: str, changes: Optional[Changes]) -> None:
+        """Queue a commit for listeners; called under the commit's locks, so the queue is in commit order."""
+        with self._notices_lock:
+            self._notices.append((collection, changes))
+
+    def _deliver(self) -> None:
+        """
+        Hand queued commits to listeners, once the caller's locks are released.
+
+        Whichever thread finds nobody delivering drains the queue in order; the
+        others return at once, so a slow listener (a blocked bus, say) delays
+        later notifications but never later writes. Listener errors are logged:
+        the commit is already on disk and can't be undone.
+        """
+        while True:
+            with self._notices_lock:
+                if self._delivering or not self._notices:
+                    return
+                self._delivering = True
+                collection, changes = self._notices.popleft()
+            try:
+                for listener in _listeners.get(collection, ()):
+                    try:
+                        listener(changes)
+                    except Exception:
+                        log.exception("Listener for %s failed", collection)
+            finally:
+                with self._notices_lock:
+                    self._delivering = False
+
+
+class _CommitRequest:
+    __slots__ = ("collections", "transform", "full_rewrite", "done", "error")
+
+    def __init__(
+        self,
+        collections: Sequence[str],
+        transform: Callable[[Dict[str, List[Record]]], Dict[str, Changes]],
+        full_rewrite: bool = False,
+    ):
+        self.collections = collections
+        self.transform = transform
+        self.full_rewrite = full_rewrite
+        self.done = False
+        self.error: Optional[BaseException] = None
+
+
+class _CommitQueue:
+    """Commits waiting to be written; ``leader`` is held by the thread writing them."""
+
+    __slots__ = ("lock", "leader", "pending")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.leader = threading.Lock()
+        self.pending: List[_CommitRequest] = []
+
+
+def _find(records: Sequence[Record], record_id: str) -> Optional[Record]:
+    return next((record for record in records if record["id"] == record_id), None)
+
+
+def _adopt(collection: str, records: List[Record], changes: Changes) -> tuple[List[Record], Changes]:
+    """Swap the dicts a commit wrote for ``collection``'s record type, in its list and changes alike."""
+    record_type = schemas.RECORD_TYPES.get(collection)
+    if record_type is None:
+        return records, changes
+    converted: Dict[int, Record] = {}
+    adopted: Changes = []
+    for old, new in changes:
+        if type(new) is dict:
+            record = record_type.from_dict(new)
+            converted[id(new)] = record
+            new = record
+        adopted.append((old, new))
+    if converted:
+        records = [converted.get(id(record), record) for record in records]
+    return records, adopted
+
+
+def _fsync_dir(directory: Path) -> None:
+    if IS_WINDOWS:  # pragma: no cover - directories can't be opened there
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class JsonBackend(Backend):
+    """One ``<collection>.json`` file per collection, rewritten under a lock."""
+
+    name = "json"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._logs: Dict[Path, Any] = {}
+        self._queue = _CommitQueue()
+        self._wal_seq = itertools.count()
+        # data file -> its memory-mapped record file, for RELINK_MMAP collections
+        self._mapped: Dict[Path, Any] = {}
+
+    @staticmethod
+    def _path(collection: str) -> Path:
+        return Path(f"{collection}.json")
+
+    def stamp(self, collection: str) -> Hashable:
+        target = get_data_dir() / self._path(collection)
+        _ensure_file(target)
+        return _stamp_of(os.stat(target))
+
+    def snapshot(self, collection: str) -> Snapshot:
+        return cached_snapshot(self._path(collection))
+
+    def get(self, collection: str, record_id: str) -> Optional[Record]:
+        path = self._path(collection)
+        if recordfile.wants_index(path):
+            # a parsed snapshot that is still current beats decoding again;
+            # otherwise read just this record instead of parsing the file
+            target = get_data_dir() / path
+            cached = _cache.get(target) if CACHE_ENABLED else None
+            try:
+                stamp: Optional[Stamp] = _stamp_of(os.stat(target))
+            except FileNotFoundError:
+                stamp = None
+            if cached is None or cached.stamp != stamp:
+                mapped = self._record_file(target, stamp)
+                if mapped is not None:
+                    return mapped.get(record_id)
+        return super().get(collection, record_id)
+
+    def _record_file(self, target: Path, stamp: Optional[Stamp]) -> Optional[recordfile.RecordFile]:
+        mapped = self._mapped.get(target)
+        if mapped is None or mapped.stamp != stamp:
+            mapped = recordfile.open_record_file(target)
+            if mapped is None:
+                return None
+            self._mapped[target] = mapped
+        return mapped
+
+    def _commit(
+        self,
+        collection: str,
+        transform: Callable[[List[Record]], Optional[Changes]],
+        *,
+        full_rewrite: bool = False,
+    ) -> None:
+        """
+        Apply ``transform`` to a private copy of the record list and persist it.
+
+        Under the lock the cached snapshot is known to be current, so the list
+        is copied from it instead of re-parsing the file; ``transform`` must
+        copy any record it changes. It returns the changes it made (an empty
+        list skips the write entirely).
+        """
+
+        def _single(lists: Dict[str, List[Record]]) -> Dict[str, Changes]:
+            return {collection: transform(lists[collection]) or []}
+
+        self._enqueue(_CommitRequest((collection,), _single, full_rewrite))
+
+    def _commit_transaction(self, txn: Transaction) -> None:
+        def _apply(lists: Dict[str, List[Record]]) -> Dict[str, Changes]:
+            txn.check(lambda collection, record_id: _find(lists[collection], record_id))
+            made = {}
+            for collection, images in txn.staged.items():
+                lists[collection], made[collection] = _apply_records(lists[collection], images.items())
+            return made
+
+        self._enqueue(_CommitRequest(txn.collections, _apply))
+
+    def _enqueue(self, request: _CommitRequest) -> None:
+        """
+        Commit ``request``, grouped with whatever else is waiting.
+
+        Whichever thread gets the queue first applies every request behind it
+        in one pass: each file involved is locked and rewritten once, so
+        concurrent writers share the lock and the fsync. An exception from a
+        transform fails only that caller's commit.
+        """
+        queue = self._queue
+        with queue.lock:
+            queue.pending.append(request)
+        with queue.leader:
+            if not request.done:
+                with queue.lock:
+                    batch, queue.pending = queue.pending, []
+                self._commit_batch(batch)
+        # outside the file locks and the queue, so listeners can't hold up writers
+        self._deliver()
+        if request.error is not None:
+            raise request.error
+
+    @contextmanager
+    def _locked(self, collections: Iterable[str]):
+        # always in name order, so two multi-file commits can't deadlock
+        with ExitStack() as stack:
+            for collection in sorted(collections):
+                stack.enter_context(with_lock(get_data_dir() / self._path(collection)))
+            yield
+
+    def _commit_batch(self, batch: List[_CommitRequest]) -> None:
+        try:
+            self.recover()
+            collections = sorted({collection for request in batch for collection in request.collections})
+            with self._locked(collections):
+                snapshots = {collection: cached_snapshot(self._path(collection)) for collection in collections}
+                lists = {collection: list(snapshot.data) for collection, snapshot in snapshots.items()}
+                changes: Dict[str, Changes] = {collection: [] for collection in collections}
+                rewritten = set()
+                atomic = False
+                for request in batch:
+                    try:
+                        made = request.transform(lists)
+                    except Exception as exc:
+                        request.error = exc
+                        continue
+                    for collection, changed in made.items():
+                        changes[collection].extend(changed)
+                    if request.full_rewrite:
+                        rewritten.update(request.collections)
+                    atomic = atomic or sum(1 for changed in made.values() if changed) > 1
+                dirty = [collection for collection in collections if changes[collection] or collection in rewritten]
+                if not dirty:
+                    return
+                for collection in dirty:
+                    lists[collection], changes[collection] = _adopt(collection, lists[collection], changes[collection])
+                logged = {collection: None if collection in rewritten else changes[collection] for collection in dirty}
+                # logged first, so a crash can only leave an entry for an
+                # unwritten change (harmless to readers), never a silent write
+                for collection, changed in logged.items():
+                    self._log_commit(collection, changed)
+                # a request spanning files is only committed once its
+                # write-ahead entry is on disk; the entry is replayed if the
+                # files don't all make it
+                wal = self._write_wal(logged, lists) if atomic else None
+                stamps = {collection: write_json(self._path(collection), lists[collection]) for collection in dirty}
+                if wal is not None:
+                    wal.unlink()
+                    _fsync_dir(wal.parent)
+                for collection, changed in logged.items():
+                    indexed = self._advance(collection, snapshots[collection].stamp, stamps[collection], changed)
+                    self._announce(collection, indexed)
+        except BaseException as exc:
+            for request in batch:
+                if request.error is None:
+                    request.error = exc
+        finally:
+            for request in batch:
+                request.done = True
+
+    def _wal_dir(self) -> Path:
+        return get_data_dir() / WAL_DIR
+
+    def _write_wal(self, logged: Dict[str, Optional[Changes]], lists: Dict[str, List[Record]]) -> Path:
+        entry: Dict[str, Any] = {}
+        for collection, changed in logged.items():
+            if changed is None:
+                entry[collection] = {"replace": lists[collection]}
+                continue
+            images: Dict[str, Optional[Record]] = {}
+            for old, new in changed:
+                images[(new if new is not None else old)["id"]] = new
+            entry[collection] = {"records": list(images.items())}
+        directory = self._wal_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{time.time_ns():020d}-{os.getpid()}-{next(self._wal_seq)}.json"
+        with NamedTemporaryFile("wb", delete=False, dir=directory, suffix=".tmp") as tmp:
+            tmp.write(formats.JSON.dump(entry))
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp.name, path)
+        _fsync_dir(directory)
+        return path
+
+    def recover(self) -> int:
+        """Replay write-ahead entries left behind by a commit that crashed halfway."""
+        directory = self._wal_dir()
+        try:
+            names = sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+        except FileNotFoundError:
+            return 0
+        replayed = 0
+        for name in names:
+            path = directory / name
+            try:
+                entry = formats.decode(path.read_bytes())
+            except FileNotFoundError:
+                continue
+            with self._locked(entry):
+                # its writer may still have been running and finished meanwhile
+                if not path.exists():
+                    continue
+                for collection, part in entry.items():
+                    self._replay(collection, part)
+                path.unlink()
+                _fsync_dir(directory)
+            replayed += 1
+        return replayed
+
+    def _replay(self, collection: str, part: Dict[str, Any]) -> None:
+        path = self._path(collection)
+        snapshot = cached_snapshot(path)
+        if "replace" in part:
+            records, changes = part["replace"], None
+        else:
+            records, changes = _apply_records(list(snapshot.data), part["records"])
+            if not changes:
+                return
+        self._log_commit(collection, changes)
+        after = write_json(path, records)
+        self._committed(collection, snapshot.stamp, after, changes)
+
+    def put(self, collection: str, record: Record) -> Record:
+        def _put(records: List[Record]) -> Changes:
+            for idx, existing in enumerate(records):
+                if existing["id"] == record["id"]:
+                    records[idx] = record
+                    return [(existing, record)]
+            records.append(record)
+            return [(None, record)]
+
+        self._commit(collection, _put)
+        return record
+
+    def _swap(self, collection: str, record_id: str, version: int, record: Record) -> Optional[Record]:
+        stored: Optional[Record] = None
+
+        def _cas(records: List[Record]) -> Changes:
+            nonlocal stored
+            for idx, existing in enumerate(records):
+                if existing["id"] == record_id:
+                    if existing.get("version", 0) != version:
+                        raise VersionConflict(f"{collection}/{record_id} changed")
+                    stored = records[idx] = record
+                    return [(existing, record)]
+            return []
+
+        self._commit(collection, _cas)
+        return stored
+
+    def delete(self, collection: str, record_id: str) -> Optional[Record]:
+        removed: Optional[Record] = None
+
+        def _remove(records: List[Record]) -> Changes:
+            nonlocal removed
+            for idx, existing in enumerate(records):
+                if existing["id"] == record_id:
+                    removed = records.pop(idx)
+                    return [(removed, None)]
+            return []
+
+        self._commit(collection, _remove)
+        return removed
+
+    def delete_where(self, collection: str, predicate: Callable[[Record], bool]) -> int:
+        removed: Changes = []
+
+        def _filter(records: List[Record]) -> Changes:
+            kept = []
+            for record in records:
+                if predicate(record):
+                    removed.append((record, None))
+                else:
+                    kept.append(record)
+            records[:] = kept
+            return removed
+
+        self._commit(collection, _filter)
+        return len(removed)
+
+    def replace_all(self, collection: str, records: Sequence[Record]) -> None:
+        def _replace(current: List[Record]) -> None:
+            current[:] = records
+
+        self._commit(collection, _replace, full_rewrite=True)
+
+    def _log(self, stream: str, key: str):
+        from .logstore import SegmentLog, check_key
+
+        directory = get_data_dir() / "logs" / check_key(stream) / check_key(key)
+        log = self._logs.get(directory)
+        if log is None:
+            with self._index_states_lock:
+                log = self._logs.setdefault(directory, SegmentLog(directory))
+        return log
+
+    def append_log(self, stream: str, key: str, records: Sequence[Record], *, sync: bool = True) -> None:
+        self._log(stream, key).append(records, sync=sync)
+
+    def append_logs(
+        self, stream: str, batches: Dict[str, Sequence[Record]], *, sync: bool = True
+    ) -> None:
+        from .logstore import fsync_paths
+
+        written = [self._log(stream, key).append(records, sync=False) for key, records in batches.items()]
+        if sync:
+            fsync_paths(path for path in written if path is not None)
+
+    def read_log(
+        self,
+        stream: str,
+        key: str,
+        *,
+        after: Optional[LogCursor] = None,
+        before: Optional[LogCursor] = None,
+        limit: Optional[int] = None,
+        descending: bool = False,
+    ) -> List[Record]:
+        return self._log(stream, key).read(after=after, before=before, limit=limit, descending=descending)
+
+    def drop_log(self, stream: str, key: str) -> None:
+        self._log(stream, key).drop()
+
+    def trim_log(self, stream: str, key: str, before: LogCursor) -> None:
+        self._log(stream, key).trim(before)
+
+    def changes_since(
+        self, collection: str, since: int, limit: Optional[int] = None
+    ) -> tuple[int, Optional[List[Record]]]:
+        # commits are logged just before their file is replaced; under the
+        # lock no commit is halfway, so every change up to ``seq`` is readable
+        with with_lock(get_data_dir() / self._path(collection)):
+            return super().changes_since(collection, since, limit)
+
+
+BACKENDS = ("json", "sqlite")
+_backends: Dict[tuple[str, Path], Backend] = {}
+# held while a backend opens, which may replay commits (and take other locks)
+_backends_lock = threading.RLock()
+
+
+def get_backend() -> Backend:
+    """Return the engine selected by RELINK_STORAGE for the active data dir."""
+    kind = os.environ.get("RELINK_STORAGE", "json").lower()
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown RELINK_STORAGE {kind!r}; expected one of {', '.join(BACKENDS)}")
+    key = (kind, get_data_dir())
+    backend = _backends.get(key)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(key)
+            if backend is None:
+                backend = _backends[key] = _open_backend(kind, key[1])
+    return backend
+
+
+def _open_backend(kind: str, data_dir: Path) -> Backend:
+    if kind == "sqlite":
+        from .sqlite_backend import SqliteBackend
+
+        return SqliteBackend(data_dir / "relink.db")
+    backend = JsonBackend()
+    backend.recover()
+    return backend
+
+
+def snapshot(collection: str) -> Snapshot:
+    return get_backend().snapshot(collection)
+
+
+def all_records(collection: str) -> Sequence[Record]:
+    return get_backend().all_records(collection)
+
+
+def version(collection: str) -> Hashable:
+    """
+    Token that changes with every committed write to ``collection``.
+
+    The SQLite backend's version counter, or the JSON file's stat stamp;
+    reading it never loads the collection.
+    """
+    return get_backend().stamp(collection)
+
+
+def get(collection: str, record_id: str) -> Optional[Record]:
+    return get_backend().get(collection, record_id)
+
+
+def query(collection: str, **equals: Any) -> List[Record]:
+    return get_backend().query(collection, **equals)
+
+
+def put(collection: str, record: Record) -> Record:
+    return get_backend().put(collection, record)
+
+
+def transaction(fn: Callable[[Transaction], Any]) -> Any:
+    return get_backend().transaction(fn)
+
+
+def update(
+    collection: str,
+    record_id: str,
+    fn: Callable[[Record], Optional[Record]],
+    *,
+    expected_version: Optional[int] = None,
+) -> Optional[Record]:
+    return get_backend().update(collection, record_id, fn, expected_version=expected_version)
+
+
+def delete(collection: str, record_id: str) -> Optional[Record]:
+    return get_backend().delete(collection, record_id)
+
+
+def delete_where(collection: str, predicate: Callable[[Record], bool]) -> int:
+    return get_backend().delete_where(collection, predicate)
+
+
+def replace_all(collection: str, records: Sequence[Record]) -> None:
+    get_backend().replace_all(collection, records)
+
+
+def append_log(stream: str, key: str, records: Sequence[Record], *, sync: bool = True) -> None:
+    get_backend().append_log(stream, key, records, sync=sync)
+
+
+def append_logs(stream: str, batches: Dict[str, Sequence[Record]], *, sync: bool = True) -> None:
+    get_backend().append_logs(stream, batches, sync=sync)
+
+
+def read_log(
+    stream: str,
+    key: str,
+    *,
+    after: Optional[LogCursor] = None,
+    before: Optional[LogCursor] = None,
+    limit: Optional[int] = None,
+    descending: bool = False,
+) -> List[Record]:
+    return get_backend().read_log(stream, key, after=after, before=before, limit=limit, descending=descending)
+
+
+def drop_log(stream: str, key: str) -> None:
+    get_backend().drop_log(stream, key)
+
+
+def changes_since(collection: str, since: int, limit: Optional[int] = None) -> tuple[int, Optional[List[Record]]]:
+    return get_backend().changes_since(collection, since, limit)
+
+
+def indexed(collection: str, name: str):
+    """Context manager yielding the registered index ``name`` for ``collection``."""
+    return get_backend().indexed(collection, name)
@@ -0,0 +1,65 @@
+"""Incremental sync for clients coming back online.
+
+``GET /api/sync?since=<cursor>`` returns, per synced collection, the records
+created or updated and the ids deleted since the cursor, plus a new cursor.
+The cursor joins each collection's change log number (``storage.changes_since``)
+with dots, e.g. ``"42.7"`` for posts 42 and hazards 7; omit it (or pass 0)
+on first load. A collection whose log can't answer, because it was compacted
+past the cursor or changed too much, comes back as ``"snapshot": true`` with
+every record in ``upserts``, and the client replaces its copy.
+"""
+from __future__ import annotations
+
+import os
+from typing import Dict, List
+
+from flask import Blueprint, jsonify, request
+
+from . import storage
+
+SYNC_COLLECTIONS = ("posts", "hazards")
+# past this many changes a full snapshot is cheaper than the delta
+SYNC_MAX_CHANGES = int(os.environ.get("SYNC_MAX_CHANGES", 1000))
+
+bp = Blueprint("sync", __name__, url_prefix="/api")
+
+
+def _parse_cursor(raw: str) -> List[int]:
+    if not raw or raw == "0":
+        return [0] * len(SYNC_COLLECTIONS)
+    parts = [int(part) for part in raw.split(".")]
+    if len(parts) != len(SYNC_COLLECTIONS) or min(parts) < 0:
+        raise ValueError(raw)
+    return parts
+
+
+def collection_delta(collection: str, since: int) -> tuple[int, Dict]:
+    """``(seq, delta)`` for one collection; see the module docstring."""
+    seq, entries = storage.changes_since(collection, since, limit=SYNC_MAX_CHANGES)
+    if entries is None:
+        return seq, {"snapshot": True, "upserts": list(storage.all_records(collection)), "deletes": []}
+    upserts, deletes = [], []
+    # the log only names what changed; the current record (or its absence)
+    # is the answer, however many times it changed in between
+    for record_id in dict.fromkeys(entry["id"] for entry in entries):
+        record = storage.get(collection, record_id)
+        if record is None:
+            deletes.append(record_id)
+        else:
+            upserts.append(record)
+    return seq, {"snapshot": False, "upserts": upserts, "deletes": deletes}
+
+
+@bp.route("/sync", methods=["GET"])
+def sync():
+    try:
+        cursor = _parse_cursor(request.args.get("since", ""))
+    except ValueError:
+        return jsonify({"error": "Invalid since cursor"}), 400
+    body: Dict = {}
+    seqs = []
+    for collection, since in zip(SYNC_COLLECTIONS, cursor):
+        seq, body[collection] = collection_delta(collection, since)
+        seqs.append(seq)
+    body["cursor"] = ".".join(str(seq) for seq in seqs)
+    return jsonify(body)
@@ -0,0 +1,54 @@
+"""Per-call cost of ``require_auth`` with a linear user scan vs. the id index.
+
+    python -m benchmarks.auth --sizes 100 10000 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import random
+
+from .common import fake_users, load_app, measure, print_table, temp_data_dir
+
+
+def run(sizes, min_time: float) -> None:
+    rows = []
+    for size in sizes:
+        with temp_data_dir():
+            from backend import auth, storage
+
+            app = load_app()
+            users = fake_users(size)
+            storage.replace_all("users", users)
+            rng = random.Random(size)
+            ids = [user["id"] for user in rng.sample(users, min(size, 1000))]
+            id_iter = itertools.cycle(ids)
+
+            def _scan():
+                user_id = next(id_iter)
+                return next(u for u in storage.all_records("users") if u["id"] == user_id)
+
+            with app.test_request_context():
+                from flask import session
+
+                def _require_auth():
+                    session["user_id"] = next(id_iter)
+                    return auth.require_auth()
+
+                _require_auth()  # build the index outside the timed loop
+                scan = measure(_scan, min_time=min_time)
+                indexed = measure(_require_auth, min_time=min_time)
+            rows.append([size, scan["mean_ms"] * 1000, indexed["mean_ms"] * 1000])
+    print_table(["users", "linear scan us", "require_auth (indexed) us"], rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 1_000_000])
+    parser.add_argument("--min-time", type=float, default=1.0, help="Seconds to sample each case")
+    args = parser.parse_args()
+    run(args.sizes, args.min_time)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Write throughput of the JSON and SQLite storage backends as the dataset grows.
+
+    python -m benchmarks.backends --sizes 100 1000 10000 50000
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import os
+import random
+
+from .common import fake_posts, fake_users, measure, print_table, temp_data_dir
+
+
+def run(sizes, min_time: float) -> None:
+    rows = []
+    for size in sizes:
+        for kind in ("json", "sqlite"):
+            with temp_data_dir():
+                os.environ["RELINK_STORAGE"] = kind
+                from backend import storage
+                from backend.schemas import new_id
+
+                users = fake_users(50)
+                posts = fake_posts(size, users)
+                storage.replace_all("posts", posts)
+                rng = random.Random(size)
+                counter = itertools.count()
+
+                def _join(post):
+                    post["members"].append(f"u_bench{next(counter)}")
+                    return post
+
+                def _insert():
+                    template = dict(rng.choice(posts), id=new_id("p"))
+                    storage.put("posts", template)
+
+                inserts = measure(_insert, min_time=min_time)
+                joins = measure(
+                    lambda: storage.update("posts", rng.choice(posts)["id"], _join), min_time=min_time
+                )
+                reads = measure(lambda: storage.get("posts", rng.choice(posts)["id"]), min_time=min_time)
+                rows.append([size, kind, inserts["per_sec"], joins["per_sec"], reads["per_sec"]])
+    os.environ.pop("RELINK_STORAGE", None)
+    print_table(["posts", "backend", "inserts/s", "joins/s", "gets/s"], rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000, 50_000])
+    parser.add_argument("--min-time", type=float, default=2.0, help="Seconds to sample each case")
+    args = parser.parse_args()
+    run(args.sizes, args.min_time)
+
+
+if __name__ == "__main__":
+    main()
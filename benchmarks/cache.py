@@ -0,0 +1,46 @@
+"""Requests/second for GET /api/posts and /api/me with and without the read cache.
+
+    python -m benchmarks.cache --sizes 1000 10000 100000
+"""
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+from .common import fake_posts, fake_users, load_app, measure, print_table, temp_data_dir
+
+
+def run(sizes, min_time: float) -> None:
+    rows = []
+    for size in sizes:
+        with temp_data_dir():
+            from backend import storage
+
+            app = load_app()
+            users = fake_users(max(1, size // 10))
+            storage.write_json(Path("users.json"), users)
+            storage.write_json(Path("posts.json"), fake_posts(size, users))
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess["user_id"] = users[-1]["id"]
+
+            for label, enabled in (("before (no cache)", False), ("after (cached)", True)):
+                storage.CACHE_ENABLED = enabled
+                storage.invalidate_cache()
+                posts = measure(lambda: client.get("/api/posts"), min_time=min_time)
+                me = measure(lambda: client.get("/api/me"), min_time=min_time)
+                rows.append([size, label, posts["per_sec"], me["per_sec"]])
+            storage.CACHE_ENABLED = True
+    print_table(["posts", "mode", "GET /api/posts req/s", "GET /api/me req/s"], rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--min-time", type=float, default=2.0, help="Seconds to sample each case")
+    args = parser.parse_args()
+    run(args.sizes, args.min_time)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Chat send throughput and broadcast latency with N concurrent socket clients.
+
+    python -m benchmarks.chat --clients 50 --messages 200 --room-size 5
+
+Every client joins one chat room and sends messages from its own thread; the
+time for an ``emit`` to return is the time until the broadcast reached the
+room. ``inline`` persists each message before broadcasting (the old path),
+``batch`` and ``message`` use the write-behind queue with one fsync per group
+commit or per message. ``drained/s`` also counts waiting for the queue to
+reach disk.
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import threading
+import time
+
+from .common import fake_users, load_app, print_table, temp_data_dir
+
+MODES = ("inline", "batch", "message")
+
+
+class _InlineWriter:
+    """Persist-then-broadcast, as before the write-behind queue."""
+
+    def submit(self, chat_id, message):
+        from backend import storage
+
+        storage.append_log("messages", chat_id, [message])
+
+    def sync(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _connect(app, socketio, user_id, chat_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+    io = socketio.test_client(app, namespace="/chat", flask_test_client=client)
+    io.emit("join_room", {"chat_id": chat_id}, namespace="/chat")
+    io.get_received("/chat")
+    return io
+
+
+def run_mode(mode: str, clients: int, messages: int, room_size: int, flush_ms: float) -> list:
+    with temp_data_dir():
+        from backend import chat, storage
+        from backend.app import socketio
+
+        app = load_app()
+        users = fake_users(clients)
+        storage.replace_all("users", users)
+        rooms = [users[i : i + room_size] for i in range(0, clients, room_size)]
+        storage.replace_all(
+            "chats",
+            [
+                {"id": f"c_{n}", "post_id": f"p_{n}", "member_ids": [user["id"] for user in room]}
+                for n, room in enumerate(rooms)
+            ],
+        )
+        previous = chat.writer
+        chat.writer = (
+            _InlineWriter() if mode == "inline" else chat.MessageWriter(flush_ms, chat.CHAT_MAX_BATCH, mode)
+        )
+        try:
+            ios = [
+                _connect(app, socketio, user["id"], f"c_{n}")
+                for n, room in enumerate(rooms)
+                for user in room
+            ]
+            latencies: list = []
+            lock = threading.Lock()
+            start = threading.Barrier(len(ios) + 1)
+
+            def _sender(io, chat_id):
+                mine = []
+                start.wait()
+                for i in range(messages):
+                    t0 = time.perf_counter()
+                    io.emit("message", {"chat_id": chat_id, "text": f"msg {i}"}, namespace="/chat")
+                    mine.append(time.perf_counter() - t0)
+                    if i % 50 == 0:
+                        io.get_received("/chat")  # keep the receive queues short
+                with lock:
+                    latencies.extend(mine)
+
+            threads = []
+            for idx, io in enumerate(ios):
+                thread = threading.Thread(target=_sender, args=(io, f"c_{idx // room_size}"))
+                thread.start()
+                threads.append(thread)
+            start.wait()
+            t0 = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            sent = time.perf_counter() - t0
+            chat.writer.sync()
+            drained = time.perf_counter() - t0
+            chat.writer.close()
+            for io in ios:
+                io.disconnect(namespace="/chat")
+        finally:
+            chat.writer = previous
+        total = len(latencies)
+        stored = sum(len(storage.read_log("messages", f"c_{n}", limit=10**9)) for n in range(len(rooms)))
+        assert stored == total, f"{mode}: stored {stored} of {total} messages"
+        latencies.sort()
+        return [
+            mode,
+            total,
+            total / sent,
+            total / drained,
+            statistics.median(latencies) * 1000,
+            latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=200, help="Messages sent per client")
+    parser.add_argument("--room-size", type=int, default=5, help="Clients per chat room")
+    parser.add_argument("--flush-ms", type=float, default=5.0, help="Write-behind max latency")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+    rows = [run_mode(mode, args.clients, args.messages, args.room_size, args.flush_ms) for mode in args.modes]
+    print_table(["mode", "messages", "sent/s", "drained/s", "p50 broadcast ms", "p99 broadcast ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
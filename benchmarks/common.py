@@ -0,0 +1,98 @@
+"""Shared helpers for the benchmark scripts."""
+from __future__ import annotations
+
+import os
+import random
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List
+
+
+@contextmanager
+def temp_data_dir() -> Iterator[Path]:
+    """Point the backend at a throwaway data directory for the duration."""
+    previous = os.environ.get("RELINK_DATA_DIR")
+    with tempfile.TemporaryDirectory(prefix="relink-bench-") as tmp:
+        os.environ["RELINK_DATA_DIR"] = tmp
+        try:
+            yield Path(tmp)
+        finally:
+            if previous is None:
+                os.environ.pop("RELINK_DATA_DIR", None)
+            else:
+                os.environ["RELINK_DATA_DIR"] = previous
+
+
+def load_app():
+    """Import the Flask app with rate limiting effectively disabled."""
+    os.environ.setdefault("RATE_LIMIT", str(10**9))
+    from backend.app import app
+
+    app.config.update(TESTING=True)
+    return app
+
+
+def fake_users(count: int, seed: int = 1) -> List[Dict]:
+    from backend.schemas import user_schema
+
+    rng = random.Random(seed)
+    return [
+        user_schema(f"user{i}@bench.rel.ink", f"User {i}", f"$2b$12${rng.getrandbits(64):016x}")
+        for i in range(count)
+    ]
+
+
+def fake_posts(count: int, creators: List[Dict], seed: int = 2) -> List[Dict]:
+    from backend.schemas import post_schema
+
+    rng = random.Random(seed)
+    posts = []
+    for i in range(count):
+        creator = creators[i % len(creators)]["id"]
+        posts.append(
+            post_schema(
+                creator,
+                f"Offer {i}",
+                "Benchmark offer with a short description.",
+                rng.randint(1, 20),
+                {"lat": rng.uniform(-60, 70), "lng": rng.uniform(-180, 180)},
+            )
+        )
+    return posts
+
+
+def measure(fn: Callable[[], object], *, min_time: float = 1.0, min_runs: int = 3) -> Dict[str, float]:
+    """Call ``fn`` repeatedly and report per-call latency and throughput."""
+    samples: List[float] = []
+    started = time.perf_counter()
+    while len(samples) < min_runs or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    mean = statistics.fmean(samples)
+    return {
+        "runs": len(samples),
+        "mean_ms": mean * 1000,
+        "p50_ms": statistics.median(samples) * 1000,
+        "per_sec": 1 / mean if mean else float("inf"),
+    }
+
+
+def print_table(headers: List[str], rows: List[List[object]]) -> None:
+    cells = [[str(h) for h in headers]] + [[_fmt(v) for v in row] for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    for idx, row in enumerate(cells):
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
+        if idx == 0:
+            print("  ".join("-" * width for width in widths))
+
+
+def _fmt(value: object) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
@@ -0,0 +1,57 @@
+"""Serialize/parse time and file size of each storage format on a generated post dataset.
+
+    python -m benchmarks.formats --posts 100000
+"""
+from __future__ import annotations
+
+import argparse
+
+from backend import formats
+
+from .common import fake_posts, fake_users, measure, print_table
+
+
+def candidates():
+    yield "pretty (stdlib, old default)", formats.JsonFormat("pretty", indent=True, use_orjson=False)
+    yield "json (stdlib)", formats.JsonFormat(use_orjson=False)
+    if formats.orjson is not None:
+        yield "pretty (orjson)", formats.JsonFormat("pretty", indent=True)
+        yield "json (orjson)", formats.JsonFormat()
+    if formats.msgpack is not None:
+        yield "msgpack", formats.MSGPACK
+
+
+def run(post_count: int, min_time: float) -> None:
+    posts = fake_posts(post_count, fake_users(50))
+    rows = []
+    baseline = None
+    for label, fmt in candidates():
+        data = fmt.dump(posts)
+        assert formats.decode(data) == posts
+        dump = measure(lambda: fmt.dump(posts), min_time=min_time)
+        load = measure(lambda: fmt.load(data), min_time=min_time)
+        baseline = baseline or (dump["mean_ms"], load["mean_ms"], len(data))
+        rows.append(
+            [
+                label,
+                dump["mean_ms"],
+                load["mean_ms"],
+                len(data) / 1_000_000,
+                baseline[0] / dump["mean_ms"],
+                baseline[1] / load["mean_ms"],
+                len(data) / baseline[2],
+            ]
+        )
+    print_table(["format", "dump ms", "parse ms", "MB", "dump x", "parse x", "size ratio"], rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=100_000)
+    parser.add_argument("--min-time", type=float, default=2.0, help="Seconds to sample each case")
+    args = parser.parse_args()
+    run(args.posts, args.min_time)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Latency of the ``near=`` radius query: linear haversine scan vs. the grid index.
+
+    python -m benchmarks.geo --sizes 1000 10000 100000 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import random
+import time
+
+from backend.geo import GridIndex, haversine_km
+
+from .common import measure, print_table
+
+# a few dense "disaster areas" plus a worldwide sprinkle
+HOTSPOTS = [(51.05, -114.07), (29.76, -95.37), (-33.87, 151.21), (35.68, 139.69)]
+
+
+def make_posts(count: int, rng: random.Random):
+    posts = []
+    for i in range(count):
+        if rng.random() < 0.8:
+            lat, lng = rng.choice(HOTSPOTS)
+            lat, lng = lat + rng.gauss(0, 1.5), lng + rng.gauss(0, 1.5)
+        else:
+            lat, lng = rng.uniform(-60, 70), rng.uniform(-180, 180)
+        posts.append({"id": f"p_{i:07d}", "created_at": i, "location": {"lat": lat, "lng": lng}})
+    return posts
+
+
+def linear_scan(posts, lat, lng, km):
+    return [
+        post
+        for post in posts
+        if haversine_km(lat, lng, post["location"]["lat"], post["location"]["lng"]) <= km
+    ]
+
+
+def run(sizes, km: float, min_time: float) -> None:
+    rows = []
+    for size in sizes:
+        rng = random.Random(size)
+        posts = make_posts(size, rng)
+        index = GridIndex("location")
+        started = time.perf_counter()
+        index.build(posts)
+        build_ms = (time.perf_counter() - started) * 1000
+        queries = [(lat + rng.gauss(0, 0.5), lng + rng.gauss(0, 0.5)) for lat, lng in HOTSPOTS]
+        query_iter = itertools.cycle(queries)
+
+        hits = len(index.within(*queries[0], km))
+        assert hits == len(linear_scan(posts, *queries[0], km))
+        scan = measure(lambda: linear_scan(posts, *next(query_iter), km), min_time=min_time)
+        indexed = measure(lambda: index.within(*next(query_iter), km), min_time=min_time)
+        rows.append(
+            [size, hits, scan["mean_ms"], indexed["mean_ms"], scan["mean_ms"] / indexed["mean_ms"], build_ms]
+        )
+    print_table(["posts", "hits", "scan ms", "index ms", "speedup", "index build ms"], rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--km", type=float, default=25.0)
+    parser.add_argument("--min-time", type=float, default=1.0, help="Seconds to sample each case")
+    args = parser.parse_args()
+    run(args.sizes, args.km, args.min_time)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Latency of hazard map (``bbox=``) and point-in-hazard queries: linear scan vs. the circle grid.
+
+    python -m benchmarks.hazards --sizes 10000 100000
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import random
+import time
+
+from backend.geo import CircleGridIndex, distance_to_box_km, haversine_km
+
+from .common import measure, print_table
+from .geo import HOTSPOTS
+
+
+def make_hazards(count: int, rng: random.Random):
+    hazards = []
+    for i in range(count):
+        if rng.random() < 0.8:
+            lat, lng = rng.choice(HOTSPOTS)
+            lat, lng = lat + rng.gauss(0, 3), lng + rng.gauss(0, 3)
+        else:
+            lat, lng = rng.uniform(-60, 70), rng.uniform(-180, 180)
+        # mostly local incidents, the odd regional storm
+        radius_m = rng.randint(200_000, 800_000) if rng.random() < 0.01 else rng.randint(500, 20_000)
+        hazards.append({"id": f"h_{i:07d}", "center": {"lat": lat, "lng": lng}, "radius_m": radius_m})
+    return hazards
+
+
+def scan_box(hazards, box):
+    return [
+        hazard
+        for hazard in hazards
+        if distance_to_box_km(hazard["center"]["lat"], hazard["center"]["lng"], box) <= hazard["radius_m"] / 1000
+    ]
+
+
+def scan_point(hazards, lat, lng):
+    return [
+        hazard
+        for hazard in hazards
+        if haversine_km(lat, lng, hazard["center"]["lat"], hazard["center"]["lng"]) <= hazard["radius_m"] / 1000
+    ]
+
+
+def run(sizes, span_deg: float, min_time: float) -> None:
+    rows = []
+    for size in sizes:
+        rng = random.Random(size)
+        hazards = make_hazards(size, rng)
+        index = CircleGridIndex("center", "radius_m")
+        started = time.perf_counter()
+        index.build(hazards)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        points = [(lat + rng.gauss(0, 1), lng + rng.gauss(0, 1)) for lat, lng in HOTSPOTS]
+        boxes = [(lat - span_deg / 2, lng - span_deg, lat + span_deg / 2, lng + span_deg) for lat, lng in points]
+        box_hits = len(index.intersecting(boxes[0]))
+        assert box_hits == len(scan_box(hazards, boxes[0]))
+        point_hits = len(index.containing(*points[0]))
+        assert point_hits == len(scan_point(hazards, *points[0]))
+
+        box_iter, point_iter = itertools.cycle(boxes), itertools.cycle(points)
+        cases = [
+            ("bbox", box_hits, lambda: scan_box(hazards, next(box_iter)), lambda: index.intersecting(next(box_iter))),
+            (
+                "containing",
+                point_hits,
+                lambda: scan_point(hazards, *next(point_iter)),
+                lambda: index.containing(*next(point_iter)),
+            ),
+        ]
+        for name, hits, scan_fn, index_fn in cases:
+            scan = measure(scan_fn, min_time=min_time)
+            indexed = measure(index_fn, min_time=min_time)
+            rows.append(
+                [size, name, hits, scan["mean_ms"], indexed["mean_ms"], scan["mean_ms"] / indexed["mean_ms"], build_ms]
+            )
+    print_table(["hazards", "query", "hits", "scan ms", "index ms", "speedup", "index build ms"], rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--span-deg", type=float, default=2.0, help="Height of the map viewport in degrees")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Seconds to sample each case")
+    args = parser.parse_args()
+    run(args.sizes, args.span_deg, args.min_time)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Throughput of concurrent ``POST /api/posts/<id>/join`` requests on different posts.
+
+    python -m benchmarks.joins --threads 1 4 16 --posts 1000
+
+Each thread signs in as its own user and joins its own slice of the posts, so
+no two requests touch the same offer (or chat); any waiting between them is
+down to the storage engine's locking.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import threading
+import time
+
+from .common import fake_posts, fake_users, load_app, print_table, temp_data_dir
+
+
+def run_case(kind: str, threads: int, post_count: int) -> list:
+    with temp_data_dir():
+        os.environ["RELINK_STORAGE"] = kind
+        from backend import storage
+        from backend.schemas import chat_schema
+
+        app = load_app()
+        users = fake_users(threads)
+        storage.replace_all("users", users)
+        creators = fake_users(10, seed=2)
+        posts = fake_posts(post_count, creators)
+        for post in posts:
+            post["capacity"] = threads + 1
+        storage.replace_all("posts", posts)
+        storage.replace_all("chats", [chat_schema(post["id"], post["members"], post["chat_id"]) for post in posts])
+
+        start = threading.Barrier(threads + 1)
+        failures = []
+
+        def _joiner(user, mine):
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session["user_id"] = user["id"]
+            start.wait()
+            for post in mine:
+                response = client.post(f"/api/posts/{post['id']}/join")
+                if response.status_code != 200:
+                    failures.append(response.status_code)
+
+        workers = [
+            threading.Thread(target=_joiner, args=(user, posts[n::threads])) for n, user in enumerate(users)
+        ]
+        for worker in workers:
+            worker.start()
+        start.wait()
+        started = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        assert not failures, failures
+        joined = sum(len(post["members"]) - 1 for post in storage.all_records("posts"))
+        assert joined == post_count, joined
+    os.environ.pop("RELINK_STORAGE", None)
+    return [kind, threads, post_count, post_count / elapsed, elapsed * 1000 / post_count]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--posts", type=int, default=1000, help="Offers in the dataset, one join each")
+    parser.add_argument("--backends", nargs="+", default=["json", "sqlite"])
+    args = parser.parse_args()
+    rows = [run_case(kind, threads, args.posts) for kind in args.backends for threads in args.threads]
+    print_table(["backend", "threads", "joins", "joins/s", "ms/join"], rows)
+
+
+if __name__ == "__main__":
+    main()
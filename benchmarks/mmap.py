@@ -0,0 +1,80 @@
+"""Cold start, lookup latency and RSS of single-post reads: parsed snapshot vs. memory-mapped records.
+
+    python -m benchmarks.mmap --posts 100000 500000
+
+Each case runs in a fresh interpreter against the same data directory, the
+way a newly started worker would serve ``GET /api/posts/<id>``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from .common import fake_posts, fake_users, print_table, temp_data_dir
+
+_PROBE = """
+import json, resource, sys, time
+from backend import storage
+ids = json.load(sys.stdin)
+started = time.perf_counter()
+assert storage.get("posts", ids[0]) is not None
+first_ms = (time.perf_counter() - started) * 1000
+started = time.perf_counter()
+for record_id in ids:
+    storage.get("posts", record_id)
+per_get_us = (time.perf_counter() - started) / len(ids) * 1e6
+try:
+    # peak RSS of this image; ru_maxrss would include the parent we were forked from
+    with open("/proc/self/status") as status:
+        peak_mb = next(int(line.split()[1]) for line in status if line.startswith("VmHWM")) / 1024
+except OSError:
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps([first_ms, per_get_us, peak_mb]))
+"""
+
+_WRITE = """
+import json, sys
+from backend import storage
+storage.replace_all("posts", json.load(sys.stdin))
+"""
+
+
+def _probe(data_dir, ids, mmap: bool) -> list:
+    env = dict(os.environ, RELINK_DATA_DIR=str(data_dir), RELINK_MMAP="posts" if mmap else "")
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE], input=json.dumps(ids), env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout)
+
+
+def run(sizes, lookups: int) -> None:
+    rows = []
+    for size in sizes:
+        with temp_data_dir() as data_dir:
+            posts = fake_posts(size, fake_users(50))
+            # written once with the index; the plain reader simply ignores it
+            env = dict(os.environ, RELINK_MMAP="posts")
+            subprocess.run(
+                [sys.executable, "-c", _WRITE], input=json.dumps(posts), env=env, text=True, check=True
+            )
+            megabytes = (data_dir / "posts.json").stat().st_size / 1_000_000
+            ids = [posts[(n * 7919) % size]["id"] for n in range(lookups)]
+            for mode, mmap in (("parsed", False), ("mmap", True)):
+                first_ms, per_get_us, rss_mb = _probe(data_dir, ids, mmap)
+                rows.append([size, megabytes, mode, first_ms, per_get_us, rss_mb])
+    print_table(["posts", "file MB", "read mode", "first get ms", "get us", "peak RSS MB"], rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, nargs="+", default=[100_000, 500_000])
+    parser.add_argument("--lookups", type=int, default=10_000)
+    args = parser.parse_args()
+    run(args.posts, args.lookups)
+
+
+if __name__ == "__main__":
+    main()
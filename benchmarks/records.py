@@ -0,0 +1,75 @@
+"""Memory per cached record: parsed dicts vs. the ``__slots__`` record types.
+
+    python -m benchmarks.records --records 1000000
+
+Each kind of record is encoded once, then parsed the way a snapshot is read;
+"dict" keeps the parsed dicts, "slots" converts them with ``from_dict`` the
+way the storage cache does under ``RELINK_SLOT_RECORDS=1``. Bytes are everything the parsed collection
+holds on to (records, lists, strings), as counted by tracemalloc.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from backend import formats, schemas
+
+from .common import fake_posts, fake_users, print_table
+
+
+def fake_messages(count: int, users, seed: int = 3) -> list:
+    rng = random.Random(seed)
+    return [
+        schemas.message_schema(users[rng.randrange(len(users))]["id"], f"Message {i} about the offer")
+        for i in range(count)
+    ]
+
+
+def _held(data: bytes, record_type) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        records = formats.JSON.load(data)
+        if record_type is not None:
+            records = [record_type.from_dict(record) for record in records]
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def run(count: int) -> None:
+    users = fake_users(200)
+    datasets = [
+        ("post", schemas.Post, fake_posts(count, users)),
+        ("message", schemas.Message, fake_messages(count, users)),
+    ]
+    rows = []
+    for kind, record_type, records in datasets:
+        data = formats.JSON.dump(records)
+        del records
+        loaded = formats.JSON.load(data)
+        started = time.perf_counter()
+        converted = [record_type.from_dict(record) for record in loaded]
+        convert_us = (time.perf_counter() - started) / count * 1e6
+        assert converted == loaded
+        del loaded, converted
+        as_dicts = _held(data, None)
+        as_slots = _held(data, record_type)
+        rows.append([kind, count, "dict", as_dicts / count, as_dicts / 1_000_000, 0.0])
+        rows.append([kind, count, "slots", as_slots / count, as_slots / 1_000_000, convert_us])
+    print_table(["record", "records", "held as", "bytes/record", "total MB", "from_dict us"], rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=1_000_000)
+    args = parser.parse_args()
+    run(args.records)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Dev server (threaded Werkzeug) vs. ``backend.serve`` (gevent) under load.
+
+    python -m benchmarks.serve --sockets 1000 --threads 32 --duration 5
+
+For each mode a server is started on a scratch data dir. HTTP throughput of
+``GET /api/posts?limit=20`` from ``--threads`` keep-alive clients is measured
+on its own, then again while ``--sockets`` raw Engine.IO WebSockets are held
+open. Needs ``gevent``, ``gevent-websocket`` and ``websocket-client``.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from .common import fake_posts, fake_users, print_table, temp_data_dir
+
+ROOT = Path(__file__).resolve().parents[1]
+MODES = {
+    "dev": lambda port: [sys.executable, "-m", "backend.app"],
+    "gevent": lambda port: [sys.executable, "-m", "backend.serve", "--port", str(port), "--max-connections", "5000"],
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start(mode: str) -> tuple:
+    port = _free_port()
+    env = {**os.environ, "PORT": str(port), "RATE_LIMIT": str(10**9)}
+    proc = subprocess.Popen(
+        MODES[mode](port), cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"{url}/health", timeout=1)
+            return proc, url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    proc.kill()
+    raise SystemExit(f"{mode} server did not start")
+
+
+def _http_load(url: str, threads: int, duration: float) -> dict:
+    latencies: list = []
+    errors = [0]
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+
+    def _client():
+        session = requests.Session()
+        mine = []
+        while time.monotonic() < stop:
+            t0 = time.perf_counter()
+            try:
+                session.get(f"{url}/api/posts?limit=20", timeout=10).raise_for_status()
+                mine.append(time.perf_counter() - t0)
+            except requests.RequestException:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=_client) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    latencies.sort()
+    return {
+        "per_sec": len(latencies) / duration,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else float("nan"),
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "errors": errors[0],
+    }
+
+
+def _open_sockets(url: str, count: int) -> tuple:
+    import websocket
+
+    target = url.replace("http://", "ws://") + "/socket.io/?EIO=4&transport=websocket"
+
+    def _open(_):
+        try:
+            ws = websocket.create_connection(target, timeout=20)
+            return ws if ws.recv().startswith("0") else None
+        except Exception:
+            return None
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        sockets = [ws for ws in pool.map(_open, range(count)) if ws is not None]
+    return sockets, time.perf_counter() - t0
+
+
+def run_mode(mode: str, sockets: int, threads: int, duration: float) -> list:
+    proc, url = _start(mode)
+    try:
+        idle = _http_load(url, threads, duration)
+        held, connect_s = _open_sockets(url, sockets)
+        loaded = _http_load(url, threads, duration)
+        for ws in held:
+            ws.close()
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return [
+        mode,
+        idle["per_sec"],
+        idle["p99_ms"],
+        f"{len(held)}/{sockets}",
+        connect_s,
+        loaded["per_sec"],
+        loaded["p99_ms"],
+        idle["errors"] + loaded["errors"],
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sockets", type=int, default=1000, help="WebSockets held open during the second run")
+    parser.add_argument("--threads", type=int, default=32, help="Concurrent HTTP clients")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per HTTP run")
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+    rows = []
+    with temp_data_dir():
+        from backend import storage
+
+        users = fake_users(50)
+        storage.replace_all("users", users)
+        storage.replace_all("posts", fake_posts(args.posts, users))
+        for mode in args.modes:
+            rows.append(run_mode(mode, args.sockets, args.threads, args.duration))
+    print_table(
+        [
+            "mode",
+            "http req/s",
+            "p99 ms",
+            "sockets open",
+            "connect s",
+            "req/s with sockets",
+            "p99 ms with sockets",
+            "errors",
+        ],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 import { useEffect, useRef, useState } from 'react';
 import { io } from 'socket.io-client';
 import { Avatar, AvatarFallback, AvatarImage } from '@/components/ui/avatar';
+import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import sendMsgIcon from '@/../icons/sendMsg.png';
 
+const PAGE_SIZE = 50;
+
 const socket = io('/chat', {
   autoConnect: false,
   withCredentials: true,
@@ -11,16 +14,36 @@ const socket = io('/chat', {
 
 export default function ChatWindow({ chatId, api, user }) {
   const [messages, setMessages] = useState([]);
+  const [olderCursor, setOlderCursor] = useState(null);
   const [text, setText] = useState('');
   const listRef = useRef(null);
+  const keepScrollRef = useRef(false);
 
   useEffect(() => {
     if (!chatId) {
       return;
     }
-    api(`/chats/${chatId}/messages`).then(({ messages: existing }) => setMessages(existing));
+    setMessages([]);
+    setOlderCursor(null);
+    api(`/chats/${chatId}/messages?order=desc&limit=${PAGE_SIZE}`).then(({ messages: latest, next_cursor }) => {
+      setMessages(latest.reverse());
+      setOlderCursor(next_cursor);
+    });
   }, [chatId, api]);
 
+  const loadOlder = () => {
+    if (!olderCursor) {
+      return;
+    }
+    api(`/chats/${chatId}/messages?order=desc&limit=${PAGE_SIZE}&before=${encodeURIComponent(olderCursor)}`).then(
+      ({ messages: older, next_cursor }) => {
+        keepScrollRef.current = true;
+        setMessages((prev) => [...older.reverse(), ...prev]);
+        setOlderCursor(next_cursor);
+      },
+    );
+  };
+
   useEffect(() => {
     if (!chatId) {
       return undefined;
@@ -43,6 +66,10 @@ export default function ChatWindow({ chatId, api, user }) {
   }, [chatId]);
 
   useEffect(() => {
+    if (keepScrollRef.current) {
+      keepScrollRef.current = false;
+      return;
+    }
     if (listRef.current) {
       listRef.current.scrollTop = listRef.current.scrollHeight;
     }
@@ -64,6 +91,13 @@ export default function ChatWindow({ chatId, api, user }) {
   return (
     <div className="flex flex-col h-full">
       <div ref={listRef} className="flex-1 overflow-y-auto p-4 space-y-4">
+        {olderCursor && (
+          <div className="flex justify-center">
+            <Button type="button" variant="link" size="sm" onClick={loadOlder}>
+              Load earlier messages
+            </Button>
+          </div>
+        )}
         {messages.map((msg) => (
           <div
             key={msg.id}
@@ -0,0 +1,57 @@
+import { useEffect, useRef } from 'react'
+import { io } from 'socket.io-client'
+
+const socket = io('/live', {
+  autoConnect: false,
+  withCredentials: true,
+})
+
+// Apply one create/update/delete delta from the live stream to a list of records.
+export const applyChange = (list, change) => {
+  const rest = list.filter((item) => item.id !== change.id)
+  if (change.op === 'delete') return rest
+  if (change.op === 'update' && rest.length !== list.length) {
+    return list.map((item) => (item.id === change.id ? change.record : item))
+  }
+  return [...rest, change.record]
+}
+
+// Stream deltas for `collection` ("posts" or "hazards") into `onChange`.
+// `area` is a {bbox: [minLat, minLng, maxLat, maxLng]} or {lat, lng, km}
+// subscription; leave it out to hear about every change. `onReset` runs when
+// the server replaced the collection or after a reconnect, when changes may
+// have been missed and the list should be fetched again.
+export const useLiveChanges = (collection, onChange, onReset, area) => {
+  const handlers = useRef({ onChange, onReset })
+  handlers.current = { onChange, onReset }
+  const areaKey = JSON.stringify(area || {})
+
+  useEffect(() => {
+    let subscribed = false
+    const subscribe = () => {
+      if (subscribed) handlers.current.onReset?.()
+      subscribed = true
+      socket.emit('subscribe', JSON.parse(areaKey))
+    }
+    const handleChange = (change) => {
+      if (change.collection === collection) handlers.current.onChange(change)
+    }
+    const handleReset = ({ collection: name }) => {
+      if (name === collection) handlers.current.onReset?.()
+    }
+
+    socket.on('connect', subscribe)
+    socket.on('change', handleChange)
+    socket.on('reset', handleReset)
+    if (socket.connected) {
+      subscribe()
+    } else {
+      socket.connect()
+    }
+    return () => {
+      socket.off('connect', subscribe)
+      socket.off('change', handleChange)
+      socket.off('reset', handleReset)
+    }
+  }, [collection, areaKey])
+}
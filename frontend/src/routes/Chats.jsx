@@ -10,9 +10,8 @@ export default function Chats({ api, user }) {
   const [leaving, setLeaving] = useState(false);
 
   const loadMembership = useCallback(() => {
-    api('/posts')
-      .then(({ posts: list }) => {
-        const mine = list.filter((post) => post.members.includes(user.id));
+    api(`/posts?member_id=${encodeURIComponent(user.id)}&fields=title,capacity,members,chat_id`)
+      .then(({ posts: mine }) => {
         setPosts(mine);
         setActive((prev) => {
           if (!mine.length) {
@@ -1,6 +1,7 @@
 import { useEffect, useState } from 'react';
 import { Link } from 'react-router-dom';
 import PostCard from '../components/PostCard.jsx';
+import { applyChange, useLiveChanges } from '../lib/live.js';
 import { Button } from '@/components/ui/button';
 
 export default function Feed({ api, user }) {
@@ -16,6 +17,8 @@ export default function Feed({ api, user }) {
     loadPosts();
   }, [api]);
 
+  useLiveChanges('posts', (change) => setPosts((prev) => applyChange(prev, change)), loadPosts);
+
   const join = (postId) => {
     api(`/posts/${postId}/join`, { method: 'POST' })
       .then((updated) => {
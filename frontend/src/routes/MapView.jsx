@@ -1,6 +1,7 @@
 import { useCallback, useEffect, useRef, useState } from 'react';
 import L from 'leaflet';
 import HazardLegend, { HAZARD_COLORS } from '../components/HazardLegend.jsx';
+import { applyChange, useLiveChanges } from '../lib/live.js';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Input } from '@/components/ui/input';
@@ -16,6 +17,17 @@ const EVENT_COLORS = {
   Floods: '#2563eb',
 };
 
+const wrapLng = (lng) => ((((lng + 180) % 360) + 360) % 360) - 180;
+
+// Leaflet bounds as the API's [minLat, minLng, maxLat, maxLng]; panning past
+// the antimeridian leaves minLng > maxLng, which the API reads as a wrap.
+const boundsToBbox = (bounds) => {
+  const south = Math.max(bounds.getSouth(), -90);
+  const north = Math.min(bounds.getNorth(), 90);
+  if (bounds.getEast() - bounds.getWest() >= 360) return [south, -180, north, 180];
+  return [south, wrapLng(bounds.getWest()), north, wrapLng(bounds.getEast())].map((value) => Number(value.toFixed(4)));
+};
+
 export default function MapView({ api }) {
   const mapRef = useRef(null);
   const mapInstance = useRef(null);
@@ -23,7 +35,10 @@ export default function MapView({ api }) {
   const hotspotLayer = useRef(null);
   const regionLayer = useRef(null);
   const eventLayer = useRef(null);
+  // the hazard last focused, so reloading the viewport around it doesn't refocus
+  const focusedHazard = useRef(null);
   const [hazards, setHazards] = useState([]);
+  const [viewport, setViewport] = useState(null);
   const [hotspots, setHotspots] = useState([]);
   const [areas, setAreas] = useState([]);
   const [events, setEvents] = useState([]);
@@ -57,10 +72,18 @@ export default function MapView({ api }) {
   );
 
   const loadHazards = useCallback(() => {
-    api('/hazards')
+    if (!viewport) return;
+    api(`/hazards?bbox=${viewport.join(',')}`)
       .then(({ hazards: list }) => setHazards(list))
       .catch((err) => console.error(err));
-  }, [api]);
+  }, [api, viewport]);
+
+  useLiveChanges(
+    'hazards',
+    (change) => setHazards((prev) => applyChange(prev, change)),
+    loadHazards,
+    viewport && { bbox: viewport },
+  );
 
   const loadStaticDisasterData = useCallback(() => {
     api('/disaster/map')
@@ -100,6 +123,10 @@ export default function MapView({ api }) {
     regionLayer.current = L.layerGroup().addTo(mapInstance.current);
     eventLayer.current = L.layerGroup().addTo(mapInstance.current);
 
+    const updateViewport = () => setViewport(boundsToBbox(mapInstance.current.getBounds()));
+    mapInstance.current.on('moveend', updateViewport);
+    updateViewport();
+
     const resizeObserver = new ResizeObserver(() => {
       mapInstance.current?.invalidateSize();
     });
@@ -133,7 +160,10 @@ export default function MapView({ api }) {
 
     if (hazards.length) {
       const latest = hazards[hazards.length - 1];
-      focusOn(latest.center.lat, latest.center.lng, 12);
+      if (latest.id !== focusedHazard.current) {
+        focusedHazard.current = latest.id;
+        focusOn(latest.center.lat, latest.center.lng, 12);
+      }
     }
   }, [hazards, focusOn]);
 
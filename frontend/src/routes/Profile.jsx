@@ -15,7 +15,7 @@ export default function Profile({ user, api }) {
   const [removing, setRemoving] = useState(false);
 
   useEffect(() => {
-    api('/posts').then(({ posts }) => setPosts(posts.filter((post) => post.creator_id === user.id)));
+    api(`/posts?creator_id=${encodeURIComponent(user.id)}`).then(({ posts }) => setPosts(posts));
   }, [api, user.id]);
 
   const queueTakeDown = (postId) => {
@@ -10,7 +10,7 @@ MODULES = [
     "backend.posts",
     "backend.chat",
     "backend.hazards",
-    "backend.news",
+    "backend.disasters",
     "backend.app",
 ]
 
@@ -33,3 +33,11 @@ def client(tmp_path, monkeypatch):
 @pytest.fixture
 def data_dir(tmp_path):
     return Path(tmp_path)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv("RELINK_DATA_DIR", str(tmp_path))
+    import backend.storage as storage
+
+    return importlib.reload(storage)
@@ -65,3 +65,229 @@ def test_join_adds_member_to_chat(client):
     chats = get_storage().read_json(Path("chats.json"))
     chat = next(chat for chat in chats if chat["id"] == chat_id)
     assert joined["id"] in chat["member_ids"]
+
+
+def test_join_flow_on_sqlite_backend(client, monkeypatch):
+    monkeypatch.setenv("RELINK_STORAGE", "sqlite")
+    register(client, "owner@rel.ink")
+    post_id = create_post(client).get_json()["id"]
+    client.post("/api/auth/logout")
+    joined = register(client, "member@rel.ink").get_json()
+    assert client.post(f"/api/posts/{post_id}/join").status_code == 200
+
+    storage = get_storage()
+    post = storage.get("posts", post_id)
+    assert joined["id"] in post["members"]
+    assert joined["id"] in storage.get("chats", post["chat_id"])["member_ids"]
+    assert not (storage.get_data_dir() / "posts.json").exists()
+
+
+def test_posts_pagination_filters_and_projection(client):
+    owner = register(client, "owner@rel.ink").get_json()
+    created = [create_post(client, capacity=1).get_json()["id"] for _ in range(5)]
+    client.post("/api/auth/logout")
+    guest = register(client, "guest@rel.ink").get_json()
+    client.post(f"/api/posts/{created[1]}/join")
+    create_post(client)
+
+    seen, cursor = [], None
+    while True:
+        query = "/api/posts?limit=2&creator_id=" + owner["id"] + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(query).get_json()
+        seen += [post["id"] for post in body["posts"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(created) and len(seen) == len(created)
+
+    mine = client.get(f"/api/posts?member_id={guest['id']}").get_json()["posts"]
+    assert len(mine) == 2 and created[1] in [post["id"] for post in mine]
+
+    open_offers = client.get(f"/api/posts?creator_id={owner['id']}&has_capacity=true").get_json()["posts"]
+    assert created[1] not in [post["id"] for post in open_offers] and len(open_offers) == 4
+
+    slim = client.get("/api/posts?limit=1&order=desc&fields=title").get_json()["posts"]
+    assert set(slim[0]) == {"id", "title"}
+    assert client.get("/api/posts?limit=1&cursor=bogus").status_code == 400
+
+
+def test_email_lookup_is_case_insensitive_and_sees_new_users(client):
+    first = register(client, "first@rel.ink").get_json()
+    client.post("/api/auth/logout")
+    second = register(client, "second@rel.ink").get_json()
+    assert register(client, "SECOND@rel.ink").status_code == 400
+
+    client.post("/api/auth/logout")
+    resp = client.post("/api/auth/login", json={"email": "First@Rel.ink", "password": "password123"})
+    assert resp.get_json()["id"] == first["id"]
+    assert client.get("/api/me").get_json()["user"]["id"] == first["id"]
+    assert second["id"] != first["id"]
+
+
+def test_principal_cache_hits_and_invalidates_on_user_change(client):
+    user = register(client).get_json()
+    client.get("/api/me")
+    client.get("/api/me")
+    stats = client.get("/metrics").get_json()["principal_cache"]
+    assert stats["hits"] >= 1 and stats["size"] == 1
+
+    def _rename(record):
+        record["name"] = "Renamed"
+        return record
+
+    get_storage().update("users", user["id"], _rename)
+    me = client.get("/api/me").get_json()["user"]
+    assert me["name"] == "Renamed"
+    assert "password_hash" not in me
+
+
+def test_chat_messages_go_to_the_log(client, data_dir):
+    from backend.app import app, socketio
+
+    register(client, "owner@rel.ink")
+    create_post(client)
+    post = client.get("/api/posts").get_json()["posts"][0]
+    chat_id = post["chat_id"]
+
+    io = socketio.test_client(app, namespace="/chat", flask_test_client=client)
+    io.emit("message", {"chat_id": chat_id, "text": "hello"}, namespace="/chat")
+    io.emit("message", {"chat_id": chat_id, "text": "again"}, namespace="/chat")
+
+    messages = client.get(f"/api/chats/{chat_id}/messages").get_json()["messages"]
+    assert [m["text"] for m in messages] == ["hello", "again"]
+    chats = get_storage().read_json(Path("chats.json"))
+    assert "messages" not in chats[0]
+    assert list((data_dir / "logs" / "messages" / chat_id).glob("*.jsonl"))
+
+    later = client.get(f"/api/chats/{chat_id}/messages?after={messages[-1]['ts']}").get_json()
+    assert later["messages"] == []
+    # time-ordered ids carry their second, so an id alone is a cursor
+    by_id = client.get(f"/api/chats/{chat_id}/messages?after={messages[0]['id']}").get_json()
+    assert [m["text"] for m in by_id["messages"]] == ["again"]
+    assert client.get(f"/api/chats/{chat_id}/messages?after=m_1a2b3c4d").status_code == 400
+
+    client.delete(f"/api/posts/{post['id']}")
+    assert not (data_dir / "logs" / "messages" / chat_id).exists()
+
+
+def test_chat_history_is_paged_by_cursor(client):
+    register(client, "owner@rel.ink")
+    create_post(client)
+    chat_id = client.get("/api/posts").get_json()["posts"][0]["chat_id"]
+    storage = get_storage()
+    # the same second for every message, so only the cursor id separates pages
+    storage.append_log(
+        "messages", chat_id, [{"id": f"m_{n:02d}", "user_id": "u", "text": str(n), "ts": 100} for n in range(5)]
+    )
+    # a chat from before the message log keeps its messages inline
+    storage.update("chats", chat_id, lambda chat: {**chat, "messages": [{"id": "m_old", "text": "old", "ts": 50}]})
+
+    url = f"/api/chats/{chat_id}/messages"
+    first = client.get(f"{url}?limit=2").get_json()
+    assert [m["text"] for m in first["messages"]] == ["old", "0"]
+    second = client.get(f"{url}?limit=2&after={first['next_cursor']}").get_json()
+    assert [m["text"] for m in second["messages"]] == ["1", "2"]
+    assert "messages" not in storage.get("chats", chat_id)
+
+    latest = client.get(f"{url}?limit=4&order=desc").get_json()
+    assert [m["text"] for m in latest["messages"]] == ["4", "3", "2", "1"]
+    rest = client.get(f"{url}?limit=4&order=desc&before={latest['next_cursor']}").get_json()
+    assert [m["text"] for m in rest["messages"]] == ["0", "old"]
+    assert rest["next_cursor"] is None
+    # a bare ts excludes that whole second, whichever side it bounds
+    assert [m["text"] for m in client.get(f"{url}?before=100").get_json()["messages"]] == ["old"]
+    assert [m["text"] for m in client.get(f"{url}?after=50").get_json()["messages"]] == ["0", "1", "2", "3", "4"]
+    assert client.get(f"{url}?limit=0").status_code == 400
+
+
+def test_list_endpoints_answer_304_from_storage_versions(client, monkeypatch):
+    register(client, "owner@rel.ink")
+    create_post(client)
+    first = client.get("/api/posts?limit=5")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.headers["Cache-Control"] == "no-cache"
+    assert client.get("/api/posts").headers["ETag"] != etag  # the query is part of the tag
+
+    storage = get_storage()
+    backend = storage.get_backend()
+    with monkeypatch.context() as patched:
+        # a 304 must not load the collection
+        patched.setattr(type(backend), "snapshot", lambda *args: 1 / 0)
+        again = client.get("/api/posts?limit=5", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.headers["ETag"] == etag and not again.data
+
+    create_post(client)
+    changed = client.get("/api/posts?limit=5", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and len(changed.get_json()["posts"]) == 2
+
+    hazards = client.get("/api/hazards")
+    assert client.get("/api/hazards", headers={"If-None-Match": hazards.headers["ETag"]}).status_code == 304
+    areas = client.get("/api/disaster/areas")
+    assert client.get("/api/disaster/areas", headers={"If-None-Match": areas.headers["ETag"]}).status_code == 304
+
+
+def test_hazard_reads_never_write_and_expire_in_memory(client, data_dir, monkeypatch):
+    import time
+
+    from backend import hazards
+
+    register(client, "reporter@rel.ink")
+    now = int(time.time())
+    storage = get_storage()
+    storage.replace_all(
+        "hazards",
+        [
+            {"id": "h_old", "created_at": now - hazards.HAZARD_MAX_AGE - 10},
+            {"id": "h_new", "created_at": now - 60},
+        ],
+    )
+    stamp = (data_dir / "hazards.json").stat().st_mtime_ns
+    first = client.get("/api/hazards")
+    assert [h["id"] for h in first.get_json()["hazards"]] == ["h_new"]
+    assert (data_dir / "hazards.json").stat().st_mtime_ns == stamp
+
+    # h_new ages out without any write: the ETag must change anyway
+    monkeypatch.setattr(hazards, "HAZARD_MAX_AGE", 30)
+    aged = client.get("/api/hazards", headers={"If-None-Match": first.headers["ETag"]})
+    assert aged.status_code == 200 and aged.get_json()["hazards"] == []
+
+    sweeper = hazards.ExpirySweeper(0.01)
+    sweeper.start()
+    try:
+        deadline = time.monotonic() + 5
+        while storage.all_records("hazards") and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        sweeper.stop()
+    assert storage.all_records("hazards") == ()
+
+
+def test_sync_returns_changes_since_cursor(client):
+    register(client, "owner@rel.ink")
+    first = client.get("/api/sync").get_json()
+    assert first["posts"] == {"snapshot": True, "upserts": [], "deletes": []}
+
+    create_post(client)
+    post = client.get("/api/posts").get_json()["posts"][0]
+    client.post(
+        "/api/hazards",
+        json={"type": "fire", "center": {"lat": 51.05, "lng": -114.07}, "radius_m": 500},
+    )
+    # nothing was logged before the first cursor, so it still loads everything
+    assert first["cursor"] == "0.0"
+    delta = client.get(f"/api/sync?since={first['cursor']}").get_json()
+    assert [p["id"] for p in delta["posts"]["upserts"]] == [post["id"]]
+    assert len(delta["hazards"]["upserts"]) == 1
+
+    create_post(client)
+    delta = client.get(f"/api/sync?since={delta['cursor']}").get_json()
+    assert delta["posts"]["snapshot"] is False and len(delta["posts"]["upserts"]) == 1
+    post = delta["posts"]["upserts"][0]
+
+    client.delete(f"/api/posts/{post['id']}")
+    after_delete = client.get(f"/api/sync?since={delta['cursor']}").get_json()
+    assert after_delete["posts"] == {"snapshot": False, "upserts": [], "deletes": [post["id"]]}
+    assert after_delete["hazards"] == {"snapshot": False, "upserts": [], "deletes": []}
+
+    assert client.get("/api/sync?since=abc").status_code == 400
+    assert client.get("/api/sync?since=1").status_code == 400
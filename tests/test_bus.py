@@ -0,0 +1,108 @@
+import os
+import queue
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+import requests
+import socketio
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_worker(env):
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "backend.app"],
+        cwd=ROOT,
+        env={**env, "PORT": str(port)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{url}/health", timeout=1).ok:
+                return proc, url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    proc.kill()
+    pytest.fail("backend worker did not start")
+
+
+def _chat_client(url, session, events):
+    client = socketio.Client(http_session=session)
+    client.on("message", lambda data: events.put(data), namespace="/chat")
+    client.on("joined", lambda data: events.put(data), namespace="/chat")
+    client.connect(url, namespaces=["/chat"], transports=["polling"])
+    return client
+
+
+@pytest.fixture
+def workers(tmp_path):
+    from backend.bus import LocalBroker
+
+    broker = LocalBroker(str(tmp_path / "bus.sock")).start()
+    env = {
+        **os.environ,
+        "RELINK_DATA_DIR": str(tmp_path),
+        "SOCKETIO_BUS": f"local://{broker.path}",
+        "RATE_LIMIT": "100000",
+    }
+    procs = []
+    try:
+        for _ in range(2):
+            proc, url = _start_worker(env)
+            procs.append((proc, url))
+        yield [url for _, url in procs]
+    finally:
+        for proc, _ in procs:
+            proc.terminate()
+            proc.wait(timeout=10)
+        broker.close()
+
+
+def test_room_message_reaches_client_on_other_worker(workers):
+    first, second = workers
+    session = requests.Session()
+    session.post(f"{first}/api/auth/register", json={"email": "o@rel.ink", "name": "O", "password": "password123"})
+    session.post(
+        f"{first}/api/posts",
+        json={"title": "Meals", "description": "Hot", "capacity": 2, "location": {"lat": 1, "lng": 1}},
+    )
+    chat_id = session.get(f"{first}/api/posts").json()["posts"][0]["chat_id"]
+
+    sent, received = queue.Queue(), queue.Queue()
+    sender = _chat_client(first, session, sent)
+    listener = _chat_client(second, session, received)
+    try:
+        for client, events in ((sender, sent), (listener, received)):
+            client.emit("join_room", {"chat_id": chat_id}, namespace="/chat")
+            assert events.get(timeout=5) == {"chat_id": chat_id}
+
+        # the second worker subscribes to the bus in the background; resend
+        # until it is listening
+        for attempt in range(10):
+            sender.emit("message", {"chat_id": chat_id, "text": f"hello {attempt}"}, namespace="/chat")
+            try:
+                message = received.get(timeout=1)
+                break
+            except queue.Empty:
+                continue
+        else:
+            pytest.fail("message never reached the other worker")
+        assert message["chat_id"] == chat_id
+        assert message["message"]["text"].startswith("hello")
+    finally:
+        sender.disconnect()
+        listener.disconnect()
@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+
+@pytest.fixture(params=["batch", "message"])
+def writer(request, store):
+    from backend import chat
+
+    message_writer = chat.MessageWriter(flush_ms=50, max_batch=100, fsync=request.param)
+    yield message_writer
+    message_writer.close()
+
+
+def test_writer_group_commits_messages_across_chats(writer, store):
+    threads = [
+        threading.Thread(
+            target=lambda n=n: [
+                writer.submit(f"c_{n % 3}", {"id": f"m_{n}_{i}", "ts": i, "text": "hi"}) for i in range(20)
+            ]
+        )
+        for n in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.sync()
+
+    for chat_id in ("c_0", "c_1", "c_2"):
+        assert len(store.read_log("messages", chat_id, limit=1000)) == 40
+    stats = writer.stats()
+    assert stats["written"] == 120 and stats["pending"] == 0
+    assert stats["batches"] < 120
+
+
+def test_writer_flushes_on_close(store):
+    from backend import chat
+
+    writer = chat.MessageWriter(flush_ms=10_000, max_batch=1000)
+    writer.submit("c_1", {"id": "m_1", "ts": 1})
+    writer.close()
+    assert [m["id"] for m in store.read_log("messages", "c_1")] == ["m_1"]
+    with pytest.raises(RuntimeError):
+        writer.submit("c_1", {"id": "m_2", "ts": 2})
+
+
+def test_inline_messages_move_once_when_the_update_is_retried(store, monkeypatch):
+    from backend import chat
+
+    store.put("chats", {"id": "c_1", "member_ids": [], "messages": [{"id": "m_old", "ts": 1}]})
+    backend = store.get_backend()
+    swap = backend._swap
+    conflicts = [store.VersionConflict("c_1 changed")]
+
+    def _flaky(*args):
+        if conflicts:
+            raise conflicts.pop()
+        return swap(*args)
+
+    monkeypatch.setattr(backend, "_swap", _flaky)
+    assert chat.move_inline_messages("c_1") == 1
+    assert not conflicts  # the update did retry
+    assert [m["id"] for m in store.read_log("messages", "c_1")] == ["m_old"]
+    assert "messages" not in store.get("chats", "c_1")
+    assert chat.move_inline_messages("c_1") == 0
+
+
+def test_inline_messages_survive_a_failed_move(store, monkeypatch):
+    from backend import chat
+
+    inline = [{"id": "m_1", "ts": 1}, {"id": "m_2", "ts": 2}]
+    store.put("chats", {"id": "c_1", "member_ids": [], "messages": inline})
+
+    def _down(*args, **kwargs):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(chat.storage, "append_log", _down)
+        with pytest.raises(OSError):
+            chat.move_inline_messages("c_1")
+    assert store.get("chats", "c_1")["messages"] == inline
+
+    # a crash after the append but before the strip: the retry adds nothing twice
+    store.append_log("messages", "c_1", inline[:1])
+    assert chat.move_inline_messages("c_1") == 1
+    assert [m["id"] for m in store.read_log("messages", "c_1")] == ["m_1", "m_2"]
+    assert "messages" not in store.get("chats", "c_1")
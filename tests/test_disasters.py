@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+def eonet_payload(*titles):
+    return {
+        "events": [
+            {
+                "id": f"EONET_{n}",
+                "title": title,
+                "link": f"https://eonet.test/{n}",
+                "categories": [{"title": "Wildfires"}],
+                "geometry": [{"date": f"2024-01-0{n + 1}T00:00:00Z", "coordinates": [-114.0, 51.0]}],
+            }
+            for n, title in enumerate(titles)
+        ]
+    }
+
+
+class StubEonet:
+    """Local stand-in for NASA's EONET API."""
+
+    def __init__(self):
+        self.payload = eonet_payload("Fire A")
+        self.delay = 0.0
+        self.status = 200
+        self.hits = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.hits += 1
+                time.sleep(stub.delay)
+                body = json.dumps(stub.payload).encode()
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/events"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def eonet():
+    stub = StubEonet()
+    yield stub
+    stub.server.shutdown()
+
+
+def _titles(events):
+    return [event["title"] for event in events]
+
+
+def test_concurrent_cold_misses_share_one_upstream_fetch(store, eonet):
+    from backend.disasters import EventFeed
+
+    eonet.delay = 0.3
+    feed = EventFeed(eonet.url, refresh=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(feed.events()[0])) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert eonet.hits == 1
+    assert [_titles(events) for events in results] == [["Fire A"]] * 8
+
+
+def test_stale_events_are_served_while_revalidating(store, eonet):
+    from backend.disasters import EventFeed
+
+    feed = EventFeed(eonet.url, refresh=60)
+    assert _titles(feed.events()[0]) == ["Fire A"]
+
+    eonet.payload = eonet_payload("Fire A", "Fire B")
+    eonet.delay = 0.2
+    feed.refresh_interval = 0  # everything is stale now
+    started = time.perf_counter()
+    assert _titles(feed.events()[0]) == ["Fire A"]
+    assert time.perf_counter() - started < 0.15
+    deadline = time.monotonic() + 5
+    while feed.fetches < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sorted(_titles(feed.events()[0])) == ["Fire A", "Fire B"]
+
+
+def test_warm_restart_uses_disk_copy_when_upstream_is_down(store, eonet):
+    from backend.disasters import EventFeed
+
+    EventFeed(eonet.url, refresh=60).events()
+    eonet.status = 503
+    restarted = EventFeed(eonet.url, refresh=60)
+    events, fetched_at = restarted.events()
+    assert _titles(events) == ["Fire A"] and fetched_at > 0
+    assert EventFeed("http://127.0.0.1:9/unreachable", refresh=60, timeout=1).events()[0] == events
+
+
+def test_events_endpoint_uses_the_feed(client, eonet, monkeypatch):
+    from backend import disasters
+
+    monkeypatch.setattr(disasters, "feed", disasters.EventFeed(eonet.url, refresh=60))
+    body = client.get("/api/disaster/events").get_json()
+    assert _titles(body["events"]) == ["Fire A"]
+    client.get("/api/disaster/events")
+    assert eonet.hits == 1
+
+    eonet.status = 500
+    monkeypatch.setattr(disasters, "feed", disasters.EventFeed(eonet.url + "?cold", refresh=60))
+    monkeypatch.setattr(disasters, "EONET_CACHE_FILE", disasters.Path("missing.json"))
+    assert client.get("/api/disaster/events").status_code == 502
@@ -0,0 +1,236 @@
+import random
+
+import pytest
+
+from backend import geo
+from backend.geo import GridIndex, PointSet, haversine_km
+
+
+def _points(rng, count):
+    return [
+        {"id": f"p_{i}", "location": {"lat": rng.uniform(-90, 90), "lng": rng.uniform(-180, 180)}}
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("km", [5, 300, 3000, 15000])
+def test_grid_index_matches_linear_scan(km):
+    rng = random.Random(km)
+    points = _points(rng, 2000)
+    index = GridIndex("location", cell_deg=1.0)
+    index.build(points)
+    centres = [(89.9, 10), (-89.5, -170), (0, 179.9), (12, -179.95)]
+    centres += [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(20)]
+    for lat, lng in centres:
+        expected = {
+            p["id"]
+            for p in points
+            if haversine_km(lat, lng, p["location"]["lat"], p["location"]["lng"]) <= km
+        }
+        assert {record["id"] for _, record in index.within(lat, lng, km)} == expected
+
+
+def test_grid_index_add_and_remove():
+    index = GridIndex("location")
+    post = {"id": "p_1", "location": {"lat": 51.05, "lng": -114.07}}
+    index.add(post)
+    assert [record["id"] for _, record in index.within(51.0, -114.0, 25)] == ["p_1"]
+    index.remove(post)
+    assert index.within(51.0, -114.0, 25) == []
+    assert len(index) == 0
+
+
+def _create(client, title, lat, lng):
+    return client.post(
+        "/api/posts",
+        json={
+            "title": title,
+            "description": "Supplies",
+            "capacity": 2,
+            "location": {"lat": lat, "lng": lng},
+        },
+    ).get_json()
+
+
+def test_near_query_follows_creates_and_deletes(client):
+    client.post(
+        "/api/auth/register",
+        json={"email": "owner@rel.ink", "name": "Owner", "password": "password123"},
+    )
+    far = _create(client, "Far", 51.20, -114.07)
+    close = _create(client, "Close", 51.05, -114.07)
+    _create(client, "Elsewhere", 10, 10)
+
+    posts = client.get("/api/posts?near=51.05,-114.07&km=25&sort=distance").get_json()["posts"]
+    assert [post["id"] for post in posts] == [close["id"], far["id"]]
+    assert posts[0]["distance_km"] == 0
+    assert 16 < posts[1]["distance_km"] < 17
+
+    # listing order pages by cursor like the unfiltered listing does
+    near = "/api/posts?near=51.05,-114.07&km=25&limit=1"
+    first = client.get(near).get_json()
+    assert [post["id"] for post in first["posts"]] == [far["id"]] and first["next_cursor"]
+    second = client.get(f"{near}&cursor={first['next_cursor']}").get_json()
+    assert [post["id"] for post in second["posts"]] == [close["id"]] and second["next_cursor"] is None
+    latest = client.get(f"{near}&order=desc").get_json()
+    assert [post["id"] for post in latest["posts"]] == [close["id"]]
+    assert client.get(f"{near}&sort=distance&cursor={first['next_cursor']}").status_code == 400
+
+    client.delete(f"/api/posts/{close['id']}")
+    posts = client.get("/api/posts?near=51.05,-114.07&km=25").get_json()["posts"]
+    assert [post["id"] for post in posts] == [far["id"]]
+    assert "distance_km" not in client.get("/api/posts").get_json()["posts"][0]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def vector_mode(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(geo, "np", None)
+    return request.param
+
+
+def test_batch_distances_and_containment_match_scalar(vector_mode):
+    rng = random.Random(5)
+    posts = _points(rng, 60)
+    hazards = [
+        {"id": f"h_{i}", "center": p["location"], "radius_m": rng.randint(100_000, 3_000_000)}
+        for i, p in enumerate(_points(rng, 15))
+    ]
+    points = PointSet.from_records(posts, "location")
+    circles = PointSet.from_records(hazards, "center", "radius_m", radius_scale=0.001)
+
+    matrix = geo.distance_matrix(points, circles)
+    inside = geo.containment(points, circles, chunk=7)
+    for i, post in enumerate(posts):
+        for j, hazard in enumerate(hazards):
+            expected = haversine_km(
+                post["location"]["lat"], post["location"]["lng"],
+                hazard["center"]["lat"], hazard["center"]["lng"],
+            )
+            assert matrix[i][j] == pytest.approx(expected, abs=1e-6)
+            if abs(expected - hazard["radius_m"] / 1000) > 1e-6:
+                assert (j in inside[i]) == (expected <= hazard["radius_m"] / 1000)
+
+
+def test_at_risk_flags_offers_inside_active_hazards(client):
+    client.post(
+        "/api/auth/register",
+        json={"email": "owner@rel.ink", "name": "Owner", "password": "password123"},
+    )
+    inside = _create(client, "Inside", 51.05, -114.07)
+    _create(client, "Outside", 52.5, -114.07)
+    hazard = client.post(
+        "/api/hazards",
+        json={"type": "fire", "center": {"lat": 51.06, "lng": -114.07}, "radius_m": 5000},
+    ).get_json()
+
+    posts = client.get("/api/posts/at-risk").get_json()["posts"]
+    assert [(post["id"], post["hazard_ids"]) for post in posts] == [(inside["id"], [hazard["id"]])]
+
+
+def _circles(rng, count):
+    circles = []
+    for i, point in enumerate(_points(rng, count)):
+        # mostly local hazards, a few continent-sized ones for the wide list
+        radius_m = rng.randint(1_000_000, 5_000_000) if rng.random() < 0.1 else rng.randint(500, 80_000)
+        circles.append({"id": f"h_{i}", "center": point["location"], "radius_m": radius_m})
+    return circles
+
+
+def test_distance_to_box_matches_dense_sampling():
+    rng = random.Random(11)
+    boxes = [(40, -10, 50, 10), (-20, 170, 10, -170), (60, -180, 89, 180), (-5, 100, 5, 140)]
+    for box in boxes:
+        min_lat, min_lng, max_lat, max_lng = box
+        width = max_lng - min_lng if min_lng <= max_lng else max_lng + 360 - min_lng
+        samples = [
+            (min_lat + (max_lat - min_lat) * i / 200, min_lng + width * j / 200)
+            for i in range(201)
+            for j in range(201)
+            if i in (0, 200) or j in (0, 200)
+        ]
+        for _ in range(40):
+            lat, lng = rng.uniform(-90, 90), rng.uniform(-180, 180)
+            nearest = geo.distance_to_box_km(lat, lng, box)
+            sampled = min(
+                haversine_km(lat, lng, s_lat, (s_lng + 180) % 360 - 180) for s_lat, s_lng in samples
+            )
+            if nearest > 0:
+                assert nearest <= sampled + 1e-6
+                assert sampled - nearest < 60  # sample spacing along the longest edge
+
+
+@pytest.mark.parametrize("cell_deg", [0.5, 5.0])
+def test_circle_index_matches_linear_scan(cell_deg):
+    rng = random.Random(int(cell_deg * 10))
+    circles = _circles(rng, 1500)
+    index = geo.CircleGridIndex("center", "radius_m", cell_deg=cell_deg, max_cells=64)
+    index.build(circles)
+
+    def _covers(circle, lat, lng):
+        return haversine_km(lat, lng, circle["center"]["lat"], circle["center"]["lng"]) <= circle["radius_m"] / 1000
+
+    points = [(89.99, 0), (-90, 45), (0, 180), (0, -180)]
+    points += [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(300)]
+    for lat, lng in points:
+        expected = {c["id"] for c in circles if _covers(c, lat, lng)}
+        assert {record["id"] for _, record in index.containing(lat, lng)} == expected
+
+    boxes = [(40, -10, 50, 10), (-20, 170, 10, -170), (80, -180, 90, 180), (-90, -180, 90, 180), (0, 0, 0, 0)]
+    for _ in range(40):
+        lat, lng = rng.uniform(-85, 80), rng.uniform(-180, 180)
+        boxes.append((lat, lng, lat + rng.uniform(0, 10), (lng + rng.uniform(0, 30) + 180) % 360 - 180))
+    for box in boxes:
+        expected = {
+            c["id"]
+            for c in circles
+            if geo.distance_to_box_km(c["center"]["lat"], c["center"]["lng"], box) <= c["radius_m"] / 1000
+        }
+        found = [record["id"] for record in index.intersecting(box)]
+        assert len(found) == len(set(found)) and set(found) == expected
+
+
+def test_circle_index_add_and_remove():
+    index = geo.CircleGridIndex()
+    hazard = {"id": "h_1", "center": {"lat": 51.05, "lng": -114.07}, "radius_m": 5000}
+    wide = {"id": "h_2", "center": {"lat": 40, "lng": -100}, "radius_m": 2_000_000}
+    index.add(hazard)
+    index.add(wide)
+    assert [record["id"] for _, record in index.containing(51.06, -114.07)] == ["h_1", "h_2"]
+    index.remove(hazard)
+    index.remove(wide)
+    assert index.containing(51.06, -114.07) == []
+    assert index.intersecting((50, -115, 52, -113)) == []
+    assert len(index) == 0
+
+
+def test_hazard_bbox_and_containing_endpoints(client):
+    client.post(
+        "/api/auth/register",
+        json={"email": "owner@rel.ink", "name": "Owner", "password": "password123"},
+    )
+    calgary = client.post(
+        "/api/hazards",
+        json={"type": "fire", "center": {"lat": 51.05, "lng": -114.07}, "radius_m": 5000},
+    ).get_json()
+    fiji = client.post(
+        "/api/hazards",
+        json={"type": "storm", "center": {"lat": -17.7, "lng": 179.9}, "radius_m": 50000},
+    ).get_json()
+
+    in_box = client.get("/api/hazards?bbox=50,-115,52,-113").get_json()["hazards"]
+    assert [hazard["id"] for hazard in in_box] == [calgary["id"]]
+    across = client.get("/api/hazards?bbox=-20,179.95,-15,-179").get_json()["hazards"]
+    assert [hazard["id"] for hazard in across] == [fiji["id"]]
+    assert len(client.get("/api/hazards").get_json()["hazards"]) == 2
+    for bad in ("1,2,3", "a,b,c,d", "10,0,5,1", "0,0,95,1"):
+        assert client.get(f"/api/hazards?bbox={bad}").status_code == 400
+
+    inside = client.get("/api/hazards/containing?lat=51.06&lng=-114.07").get_json()["hazards"]
+    assert [hazard["id"] for hazard in inside] == [calgary["id"]]
+    assert 1.1 < inside[0]["distance_km"] < 1.12
+    assert client.get("/api/hazards/containing?lat=51.2&lng=-114.07").get_json()["hazards"] == []
+    assert client.get("/api/hazards/containing?lat=91&lng=0").status_code == 400
+    assert client.get("/api/hazards/containing?lat=51").status_code == 400
@@ -0,0 +1,63 @@
+import base64
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+DATA_URL = "data:image/png;base64," + base64.b64encode(PNG).decode()
+
+
+def _login(client):
+    client.post(
+        "/api/auth/register",
+        json={"email": "owner@rel.ink", "name": "Owner", "password": "password123"},
+    )
+
+
+def _create(client):
+    return client.post(
+        "/api/posts",
+        json={
+            "title": "Blankets",
+            "description": "Warm blankets",
+            "capacity": 3,
+            "location": {"lat": 10, "lng": 10},
+            "image": DATA_URL,
+        },
+    ).get_json()
+
+
+def test_post_images_are_stored_once_and_referenced(client):
+    from backend import storage
+
+    _login(client)
+    first, second = _create(client), _create(client)
+    assert first["image"] == second["image"]
+    assert first["image"].startswith("/api/images/")
+    blobs = list((storage.get_data_dir() / "blobs").rglob("*"))
+    assert len([path for path in blobs if path.is_file()]) == 1
+    assert "base64" not in client.get("/api/posts").get_data(as_text=True)
+
+
+def test_image_endpoint_serves_immutable_bytes(client):
+    _login(client)
+    url = _create(client)["image"]
+    resp = client.get(url)
+    assert resp.status_code == 200
+    assert resp.data == PNG
+    assert resp.mimetype == "image/png"
+    assert "immutable" in resp.headers["Cache-Control"]
+    etag = resp.headers["ETag"]
+    assert not etag.startswith("W/")
+
+    cached = client.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert client.get("/api/images/../../users.json").status_code == 404
+
+
+def test_migrate_externalizes_inline_images(store):
+    from backend import migrate
+
+    store.put("posts", {"id": "p_1", "image": DATA_URL})
+    store.put("posts", {"id": "p_2", "image": None})
+    assert migrate.externalize_images() == 1
+    image = store.get("posts", "p_1")["image"]
+    assert image.startswith("/api/images/")
+    assert store.blob_path(image.rsplit("/", 1)[1]).read_bytes() == PNG
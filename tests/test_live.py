@@ -0,0 +1,75 @@
+import random
+
+from backend import geo, live
+
+
+def _events(io, name="change"):
+    return [event["args"][0] for event in io.get_received("/live") if event["name"] == name]
+
+
+def _subscribe(app, socketio, client, area=None):
+    io = socketio.test_client(app, namespace="/live", flask_test_client=client)
+    io.emit("subscribe", area or {}, namespace="/live")
+    assert _events(io, "subscribed")
+    return io
+
+
+def test_geohash_rooms_meet_for_any_point_inside_the_area():
+    rng = random.Random(3)
+    for _ in range(300):
+        lat, lng = rng.uniform(-80, 80), rng.uniform(-180, 180)
+        # from a street-level view up to a continent, so both sides fall back
+        span = rng.choice([0.01, 0.2, 3, 40])
+        box = (lat, lng, min(lat + span, 90), (lng + span * 2 + 180) % 360 - 180)
+        point_lng = (lng + span * 2 * rng.random() + 180) % 360 - 180
+        inside = {"location": {"lat": lat + (box[2] - lat) * rng.random(), "lng": point_lng}}
+        assert live.subscriber_rooms(box) & live.change_rooms(inside, "location", None)
+
+    # a hazard too large for fine cells still reaches a street-level subscriber
+    storm = {"center": {"lat": 51.0, "lng": -114.0}, "radius_m": 400_000}
+    assert live.subscriber_rooms((51.04, -114.1, 51.06, -114.05)) & live.change_rooms(storm, "center", "radius_m")
+    far = {"location": {"lat": -33.87, "lng": 151.21}}
+    assert not live.subscriber_rooms((51.04, -114.1, 51.06, -114.05)) & live.change_rooms(far, "location", None)
+    assert geo.geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+
+def test_live_namespace_pushes_post_and_hazard_deltas(client):
+    from backend.app import app, socketio
+
+    client.post(
+        "/api/auth/register",
+        json={"email": "owner@rel.ink", "name": "Owner", "password": "password123"},
+    )
+    everything = _subscribe(app, socketio, client)
+    calgary = _subscribe(app, socketio, client, {"lat": 51.05, "lng": -114.07, "km": 10})
+    sydney = _subscribe(app, socketio, client, {"bbox": [-34.2, 150.8, -33.6, 151.4]})
+
+    post = client.post(
+        "/api/posts",
+        json={"title": "Meals", "description": "Hot", "capacity": 2, "location": {"lat": 51.05, "lng": -114.07}},
+    ).get_json()
+    created = _events(calgary)
+    assert [(e["collection"], e["op"], e["id"]) for e in created] == [("posts", "create", post["id"])]
+    assert created[0]["record"]["title"] == "Meals"
+    assert [e["id"] for e in _events(everything)] == [post["id"]]
+    assert _events(sydney) == []
+
+    client.delete(f"/api/posts/{post['id']}")
+    assert [(e["op"], e["record"]) for e in _events(calgary)] == [("delete", None)]
+
+    hazard = client.post(
+        "/api/hazards",
+        json={"type": "storm", "center": {"lat": -33.0, "lng": 151.0}, "radius_m": 300_000},
+    ).get_json()
+    assert [(e["collection"], e["id"]) for e in _events(sydney)] == [("hazards", hazard["id"])]
+    assert _events(calgary) == []
+
+    # re-subscribing replaces the previous area
+    sydney.emit("subscribe", {"lat": 51.05, "lng": -114.07}, namespace="/live")
+    client.post(
+        "/api/hazards",
+        json={"type": "fire", "center": {"lat": 51.05, "lng": -114.07}, "radius_m": 500},
+    )
+    assert len(_events(sydney)) == 1
+    sydney.emit("subscribe", {"bbox": [10, 0, 5, 1]}, namespace="/live")
+    assert _events(sydney, "error")
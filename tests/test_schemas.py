@@ -0,0 +1,48 @@
+import itertools
+import operator
+import threading
+
+import pytest
+
+from backend import schemas
+
+
+def test_new_ids_are_unique_and_increasing_across_1m():
+    generate = schemas.IdGenerator()
+    ids = map(generate, itertools.repeat("m", 1_000_000))
+    # strictly increasing, so no id can repeat
+    assert all(itertools.starmap(operator.lt, itertools.pairwise(ids)))
+
+
+def test_ids_sort_by_time_and_stay_distinct_across_threads_and_nodes(monkeypatch):
+    generate = schemas.IdGenerator(node=1)
+    seen = []
+
+    def _mint():
+        seen.append([generate("p") for _ in range(20_000)])
+
+    threads = [threading.Thread(target=_mint) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(itertools.chain.from_iterable(seen))) == 160_000
+    assert all(ids == sorted(ids) for ids in seen)
+
+    assert schemas.IdGenerator(node=3)("p") != schemas.IdGenerator(node=4)("p")
+
+    now = [5_000_000_000]
+    monkeypatch.setattr(schemas.time, "time_ns", lambda: now[0])
+    generate = schemas.IdGenerator(node=2)
+    first = generate("p")
+    now[0] = 4_000_000_000  # the clock steps back
+    second = generate("p")
+    assert first < second and schemas.id_time(second) == 5000
+    generate._counter = schemas.ID_COUNTER_MAX  # a full millisecond borrows the next one
+    third = generate("p")
+    assert schemas.id_time(third) == 5001 and second < third
+    assert schemas.id_time(first) == 5000
+
+    assert schemas.id_time("p_1a2b3c4d") is None  # ids from before carry no time
+    with pytest.raises(ValueError):
+        schemas.IdGenerator(node=2**30)
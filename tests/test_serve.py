@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+GREEN_WRITERS = textwrap.dedent(
+    """
+    from gevent import monkey
+    monkey.patch_all()
+
+    import gevent
+    from backend import storage
+
+    def _bump(post):
+        gevent.sleep(0.001)  # yield to other green threads while holding the lock
+        post["count"] += 1
+        return post
+
+    def _writer(n):
+        for i in range(20):
+            storage.update("posts", "p_1", _bump)
+            storage.append_log("messages", "c_1", [{"id": f"m_{n}_{i}", "ts": i}])
+
+    storage.put("posts", {"id": "p_1", "count": 0})
+    jobs = [gevent.spawn(_writer, n) for n in range(10)]
+    assert gevent.joinall(jobs, timeout=30, raise_error=True) == jobs, "writers stalled"
+    assert storage.get("posts", "p_1")["count"] == 200
+    assert len(storage.read_log("messages", "c_1", limit=1000)) == 200
+    """
+)
+
+
+def test_storage_locks_cooperate_with_green_threads(tmp_path):
+    pytest.importorskip("gevent")
+    env = {**os.environ, "RELINK_DATA_DIR": str(tmp_path)}
+    result = subprocess.run(
+        [sys.executable, "-c", GREEN_WRITERS], cwd=ROOT, env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_serve_rejects_keepalive_shorter_than_socketio_pings():
+    from backend import serve
+
+    with pytest.raises(SystemExit):
+        serve._options(["--keepalive", "30", "--ping-interval", "25", "--ping-timeout", "20"])
+    assert serve._options(["--workers", "3"]).workers == 3
+
+
+def test_serve_gives_each_worker_its_own_id_node(monkeypatch):
+    from backend import serve
+
+    env = {"RELINK_NODE_ID": "7", "PORT": "5050"}
+    assert [serve.worker_env(env, n)["RELINK_NODE_ID"] for n in range(3)] == ["7", "8", "9"]
+    assert serve.worker_env({}, 2) == {}
+    monkeypatch.setenv("RELINK_NODE_ID", str(2**30 - 2))
+    with pytest.raises(SystemExit):
+        serve._options(["--workers", "3"])
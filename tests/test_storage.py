@@ -0,0 +1,397 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+
+POSTS = Path("posts.json")
+
+
+def test_read_cached_reuses_parse_until_file_changes(store, data_dir):
+    store.write_json(POSTS, [{"id": "p_1"}])
+    first = store.read_cached(POSTS)
+    assert store.read_cached(POSTS) is first
+
+    (data_dir / "posts.json").write_text(json.dumps([{"id": "p_2"}]), encoding="utf-8")
+    second = store.read_cached(POSTS)
+    assert second is not first
+    assert [post["id"] for post in second] == ["p_2"]
+
+
+def test_read_json_returns_private_copy(store):
+    store.write_json(POSTS, [{"id": "p_1"}])
+    cached = store.read_cached(POSTS)
+    mine = store.read_json(POSTS)
+    mine.append({"id": "p_2"})
+    assert isinstance(cached, tuple)
+    assert len(store.read_cached(POSTS)) == 1
+
+
+def test_write_json_uses_the_configured_format_and_reads_any(store, data_dir, monkeypatch):
+    from backend import formats
+
+    posts = [{"id": "p_1", "title": "Café", "location": {"lat": 51.05, "lng": -114.07}, "votes": {"1": 2}}]
+    store.write_json(POSTS, posts)
+    raw = (data_dir / "posts.json").read_bytes()
+    assert b"\n" not in raw and json.loads(raw) == posts
+
+    names = ["pretty", "json"] + (["msgpack"] if formats.msgpack is not None else [])
+    for name in names:
+        monkeypatch.setattr(formats, "FILE_FORMATS", {"posts": formats.FORMATS[name]})
+        store.write_json(POSTS, posts)
+        store.invalidate_cache()
+        assert store.read_json(POSTS) == posts
+        assert list(store.read_cached(POSTS)) == posts
+        assert formats.decode(formats.FORMATS[name].dump(posts)) == posts
+    assert formats.decode(formats.JsonFormat(use_orjson=False).dump(posts)) == posts
+    # files written before the codec layer still load
+    (data_dir / "users.json").write_text(json.dumps([{"id": "u_1"}], indent=2), encoding="utf-8")
+    assert store.read_json(Path("users.json")) == [{"id": "u_1"}]
+
+
+def test_mmap_reads_decode_single_records(store, data_dir, monkeypatch):
+    from backend import formats, recordfile
+
+    monkeypatch.setattr(recordfile, "MMAP_FILES", frozenset({"posts"}))
+    backend = store.get_backend()
+    posts = [{"id": f"p_{n}", "title": f"Offer {n}", "members": ["u_1"]} for n in range(50)]
+    for name in ["json", "pretty"] + (["msgpack"] if formats.msgpack is not None else []):
+        monkeypatch.setattr(formats, "FILE_FORMATS", {"posts": formats.FORMATS[name]})
+        backend.replace_all("posts", posts)
+        # a cold reader: nothing parsed in this process yet
+        store.invalidate_cache()
+        assert backend.get("posts", "p_7") == posts[7]
+        assert backend.get("posts", "p_49") == posts[49]
+        assert backend.get("posts", "missing") is None
+        assert data_dir / "posts.json" not in store._cache
+        assert store.read_json(POSTS) == posts
+
+    # an index that doesn't describe the file is ignored
+    (data_dir / "posts.json").write_text(json.dumps([{"id": "p_new"}]), encoding="utf-8")
+    assert backend.get("posts", "p_new") == {"id": "p_new"}
+    assert backend.get("posts", "p_7") is None
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def backend(request, store, monkeypatch):
+    monkeypatch.setenv("RELINK_STORAGE", request.param)
+    return store.get_backend()
+
+
+def test_backend_crud_roundtrip(backend):
+    backend.put("posts", {"id": "p_1", "members": ["u_1"]})
+    backend.put("posts", {"id": "p_2", "members": []})
+    assert backend.get("posts", "p_1")["members"] == ["u_1"]
+    assert [post["id"] for post in backend.all_records("posts")] == ["p_1", "p_2"]
+
+    def _join(post):
+        post["members"].append("u_2")
+        return post
+
+    assert backend.update("posts", "p_1", _join)["members"] == ["u_1", "u_2"]
+    assert backend.update("posts", "missing", _join) is None
+    assert backend.query("posts", members=[]) == [{"id": "p_2", "members": []}]
+
+    assert backend.delete("posts", "p_2")["id"] == "p_2"
+    assert backend.delete_where("posts", lambda post: "u_2" in post["members"]) == 1
+    assert backend.all_records("posts") == ()
+
+
+def test_cached_records_are_dicts_by_default(backend):
+    backend.put("posts", {"id": "p_1", "members": ["u_1"]})
+    [cached] = backend.all_records("posts")
+    assert type(cached) is dict
+
+
+def test_cached_records_are_slot_types_that_read_like_dicts(backend, monkeypatch):
+    import sys
+
+    from backend import formats, schemas
+
+    monkeypatch.setattr(schemas, "RECORD_TYPES", {"posts": schemas.Post, "chats": schemas.Chat})
+    backend.put("posts", {"id": "p_1", "creator_id": "u_1", "members": ["u_1"], "tags": ["food"]})
+    [cached] = backend.all_records("posts")
+    assert isinstance(cached, schemas.Post)
+    assert cached == {"id": "p_1", "creator_id": "u_1", "members": ["u_1"], "tags": ["food"]}
+    assert cached.get("image") is None and "image" not in cached and cached["tags"] == ["food"]
+
+    def _join(post):
+        post["members"].append("u_2")
+        del post["tags"]
+        return post
+
+    backend.update("posts", "p_1", _join)
+    assert cached["members"] == ["u_1"]  # the cached copy is never mutated
+    stored = json.loads(formats.JSON.dump(list(backend.all_records("posts"))))
+    assert stored == [{"id": "p_1", "creator_id": "u_1", "members": ["u_1", "u_2"], "version": 1}]
+
+    chat = schemas.Chat.from_dict({"id": "c_1", "member_ids": ["".join(("u_", "9"))]})
+    assert chat["member_ids"][0] is sys.intern("u_9")
+
+
+def test_concurrent_updates_are_not_lost(backend, store):
+    import threading
+
+    backend.replace_all("posts", [{"id": f"p_{n}", "members": []} for n in range(4)])
+    start = threading.Barrier(8)
+
+    def _worker(worker):
+        def _join(post):
+            post["members"].append(worker)
+            return post
+
+        start.wait()
+        for step in range(10):
+            # two writers per post, plus traffic on the other posts
+            backend.update("posts", f"p_{(worker + step) % 4}", _join)
+
+    threads = [threading.Thread(target=_worker, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    posts = backend.all_records("posts")
+    assert sum(len(post["members"]) for post in posts) == 80
+    assert all(post["version"] == len(post["members"]) for post in posts)
+
+    assert backend.update("posts", "p_0", lambda post: post, expected_version=20)["version"] == 21
+    with pytest.raises(store.VersionConflict):
+        backend.update("posts", "p_0", lambda post: post, expected_version=20)
+    # a failed compare-and-swap leaves the record alone
+    assert backend.get("posts", "p_0")["version"] == 21
+
+    calls = []
+
+    def _racy(post):
+        calls.append(post["version"])
+        if len(calls) == 1:
+            # another writer (say, another process) gets in first
+            backend.put("posts", {**post, "version": 22, "members": ["other"]})
+        post["members"].append("me")
+        return post
+
+    assert backend.update("posts", "p_0", _racy)["members"] == ["other", "me"]
+    assert calls == [21, 22]
+
+
+def test_failing_listener_does_not_fail_a_committed_write(backend, store):
+    heard = []
+
+    def _down(changes):
+        raise OSError("bus down")
+
+    store.subscribe("posts", _down)
+    store.subscribe("posts", heard.append)
+    assert backend.put("posts", {"id": "p_1"}) == {"id": "p_1"}
+    assert backend.transaction(lambda txn: txn.put("posts", {"id": "p_2"}))["id"] == "p_2"
+    assert [post["id"] for post in backend.all_records("posts")] == ["p_1", "p_2"]
+    assert [[new["id"] for _, new in changes] for changes in heard] == [["p_1"], ["p_2"]]
+
+
+def test_blocked_listener_does_not_block_other_writers(backend, store):
+    release = threading.Event()
+    heard = []
+
+    def _slow(changes):
+        heard.append([new["id"] for _, new in changes])
+        release.wait(5)
+
+    store.subscribe("posts", _slow)
+    first = threading.Thread(target=backend.put, args=("posts", {"id": "p_1"}))
+    first.start()
+    try:
+        for _ in range(500):
+            if heard:
+                break
+            time.sleep(0.01)
+        assert heard == [["p_1"]]
+        # the first listener is still blocked; this write must not wait for it
+        assert backend.put("posts", {"id": "p_2"}) == {"id": "p_2"}
+        assert not release.is_set()
+    finally:
+        release.set()
+        first.join()
+    assert heard == [["p_1"], ["p_2"]]
+
+
+def test_transaction_commits_collections_together(backend, store):
+    backend.put("posts", {"id": "p_1", "members": ["u_1"], "chat_id": "c_1"})
+    backend.put("chats", {"id": "c_1", "member_ids": ["u_1"]})
+    attempts = []
+
+    def _join(txn):
+        attempts.append(1)
+        post = txn.update("posts", "p_1", lambda post: {**post, "members": post["members"] + ["u_2"]})
+        txn.update("chats", post["chat_id"], lambda chat: {**chat, "member_ids": chat["member_ids"] + ["u_2"]})
+        if len(attempts) == 1:
+            # a concurrent update to a record this transaction read
+            backend.update("chats", "c_1", lambda chat: {**chat, "member_ids": chat["member_ids"] + ["u_3"]})
+        return post
+
+    assert backend.transaction(_join)["members"] == ["u_1", "u_2"]
+    assert len(attempts) == 2
+    assert backend.get("posts", "p_1")["members"] == ["u_1", "u_2"]
+    assert backend.get("chats", "c_1")["member_ids"] == ["u_1", "u_3", "u_2"]
+
+    def _fail(txn):
+        txn.delete("posts", "p_1")
+        txn.delete("chats", "c_1")
+        raise ValueError("nope")
+
+    with pytest.raises(ValueError):
+        backend.transaction(_fail)
+    assert backend.get("posts", "p_1") and backend.get("chats", "c_1")
+
+    backend.transaction(lambda txn: (txn.delete("posts", "p_1"), txn.delete("chats", "c_1")))
+    assert backend.get("posts", "p_1") is None and backend.get("chats", "c_1") is None
+    # one numbered commit per collection
+    assert [entry["op"] for entry in backend.changes_since("chats", 1)[1]] == ["put", "put", "delete"]
+
+
+def test_json_transaction_is_replayed_after_a_crash(store, data_dir, monkeypatch):
+    backend = store.get_backend()
+    backend.put("posts", {"id": "p_1", "members": ["u_1"]})
+    backend.put("chats", {"id": "c_1", "member_ids": ["u_1"]})
+    real_write = store.write_json
+
+    def _crash_on_posts(path, payload):
+        if str(path) == "posts.json":
+            raise OSError("power cut")
+        return real_write(path, payload)
+
+    def _join(txn):
+        txn.update("chats", "c_1", lambda chat: {**chat, "member_ids": chat["member_ids"] + ["u_2"]})
+        txn.update("posts", "p_1", lambda post: {**post, "members": post["members"] + ["u_2"]})
+
+    monkeypatch.setattr(store, "write_json", _crash_on_posts)
+    with pytest.raises(OSError):
+        backend.transaction(_join)
+    monkeypatch.setattr(store, "write_json", real_write)
+    assert [path.suffix for path in (data_dir / "wal").iterdir()] == [".json"]
+    assert backend.get("posts", "p_1")["members"] == ["u_1"]
+
+    # a fresh process replays the entry when it opens the store
+    store._backends.clear()
+    store.invalidate_cache()
+    fresh = store.get_backend()
+    assert fresh.get("posts", "p_1")["members"] == ["u_1", "u_2"]
+    assert fresh.get("chats", "c_1")["member_ids"] == ["u_1", "u_2"]
+    assert list((data_dir / "wal").iterdir()) == []
+    assert fresh.recover() == 0
+
+
+def test_migrate_copies_json_collections(store, data_dir):
+    from backend import migrate
+    from backend.sqlite_backend import SqliteBackend
+
+    store.write_json(Path("users.json"), [{"id": "u_1", "email": "a@rel.ink"}])
+    store.write_json(Path("posts.json"), [{"id": "p_1"}, {"id": "p_2"}])
+    store.write_json(Path("chats.json"), [{"id": "c_1"}])
+    store.append_log("messages", "c_1", [{"id": "m_1", "ts": 1}])
+    assert migrate.migrate(data_dir) == {"users": 1, "posts": 2, "chats": 1, "messages": 1}
+
+    db = SqliteBackend(data_dir / "relink.db")
+    assert db.get("users", "u_1")["email"] == "a@rel.ink"
+    assert [post["id"] for post in db.all_records("posts")] == ["p_1", "p_2"]
+    assert db.read_log("messages", "c_1") == [{"id": "m_1", "ts": 1}]
+    with pytest.raises(SystemExit):
+        migrate.migrate(data_dir)
+
+
+def test_message_log_appends_and_reads_after(backend):
+    backend.append_log("messages", "c_1", [{"id": "m_9", "ts": 10}, {"id": "m_8", "ts": 20}])
+    backend.append_log("messages", "c_1", [{"id": "m_7", "ts": 20}, {"id": "m_6", "ts": 15}])
+    backend.append_log("messages", "c_2", [{"id": "m_4", "ts": 5}])
+
+    # ordered by ts, ties in append order
+    assert [m["id"] for m in backend.read_log("messages", "c_1")] == ["m_9", "m_6", "m_8", "m_7"]
+    assert [m["id"] for m in backend.read_log("messages", "c_1", after=(15, None))] == ["m_8", "m_7"]
+    assert [m["id"] for m in backend.read_log("messages", "c_1", after=(20, "m_8"))] == ["m_7"]
+    assert [m["id"] for m in backend.read_log("messages", "c_1", before=(20, "m_7"))] == ["m_9", "m_6", "m_8"]
+    latest = backend.read_log("messages", "c_1", limit=2, descending=True)
+    assert [m["id"] for m in latest] == ["m_7", "m_8"]
+    older = backend.read_log("messages", "c_1", before=(20, "m_8"), limit=2, descending=True)
+    assert [m["id"] for m in older] == ["m_6", "m_9"]
+
+    backend.drop_log("messages", "c_1")
+    assert backend.read_log("messages", "c_1") == []
+    assert [m["id"] for m in backend.read_log("messages", "c_2")] == ["m_4"]
+
+
+def test_segment_log_rotates_and_sees_other_writers(data_dir):
+    from backend.logstore import SegmentLog
+
+    directory = data_dir / "logs" / "messages" / "c_1"
+    writer = SegmentLog(directory, segment_bytes=64)
+    reader = SegmentLog(directory, segment_bytes=64)
+    for ts in range(10):
+        writer.append([{"id": f"m_{ts}", "ts": ts, "text": "hello"}])
+    assert len(list(directory.glob("*.jsonl"))) > 1
+
+    # a crashed writer's torn line is skipped by readers and dropped by the next append
+    newest = sorted(directory.glob("*.jsonl"))[-1]
+    with newest.open("ab") as handle:
+        handle.write(b'{"id":"m_torn"')
+    assert [m["ts"] for m in reader.read(after=(6, None))] == [7, 8, 9]
+    reader.append([{"id": "m_10", "ts": 10}])
+    assert [m["id"] for m in writer.read(after=(8, None))] == ["m_9", "m_10"]
+
+
+def test_log_keys_cannot_escape_data_dir(store):
+    with pytest.raises(ValueError):
+        store.append_log("messages", "../users", [{"id": "m_1", "ts": 1}])
+
+
+def test_change_log_numbers_commits_and_compacts(backend, store, monkeypatch):
+    from backend import logstore
+
+    backend.put("posts", {"id": "p_1"})
+    backend.put("posts", {"id": "p_2"})
+    backend.update("posts", "p_1", lambda post: {**post, "title": "x"})
+    backend.update("posts", "p_2", lambda post: None)  # no-op, not a commit
+    backend.delete("posts", "p_2")
+
+    seq, entries = backend.changes_since("posts", 1)
+    assert seq == 4
+    assert [(e["ts"], e["op"], e["id"]) for e in entries] == [
+        (2, "put", "p_2"),
+        (3, "put", "p_1"),
+        (4, "delete", "p_2"),
+    ]
+    assert backend.changes_since("posts", 4) == (4, [])
+    assert backend.changes_since("posts", 0) == (4, None)  # first sync: snapshot
+    assert backend.changes_since("posts", 9) == (4, None)  # from another log: snapshot
+    assert backend.changes_since("posts", 1, limit=2) == (4, None)
+    assert backend.changes_since("chats", 0) == (0, None)
+
+    backend.replace_all("posts", [{"id": "p_3"}])
+    assert backend.changes_since("posts", 4) == (5, None)
+    assert backend.changes_since("posts", 5) == (5, [])
+
+    monkeypatch.setattr(store, "CHANGELOG_RETAIN", 3)
+    monkeypatch.setattr(store, "CHANGELOG_COMPACT_EVERY", 4)
+    monkeypatch.setattr(logstore, "SEGMENT_BYTES", 64)  # json trims whole segments
+    for n in range(10):
+        backend.put("hazards", {"id": f"h_{n}"})
+    seq, entries = backend.changes_since("hazards", 7)
+    assert seq == 10 and [e["id"] for e in entries] == ["h_7", "h_8", "h_9"]
+    assert backend.changes_since("hazards", 1) == (10, None)  # compacted away
+
+
+def test_segment_log_trim_is_seen_by_other_readers(data_dir):
+    from backend.logstore import SegmentLog
+
+    directory = data_dir / "logs" / "changes" / "posts"
+    writer = SegmentLog(directory, segment_bytes=64)
+    reader = SegmentLog(directory, segment_bytes=64)
+    for ts in range(1, 13):
+        writer.append([{"id": f"p_{ts}", "ts": ts}])
+    assert len(reader.read()) == 12
+
+    writer.trim((8, None))
+    kept = [m["ts"] for m in writer.read()]
+    assert kept[-5:] == [8, 9, 10, 11, 12] and len(kept) < 12
+    assert [m["ts"] for m in reader.read()] == kept
+    assert [m["ts"] for m in SegmentLog(directory, segment_bytes=64).read()] == kept